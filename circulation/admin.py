@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Book, BookCopy, Member, Loan, Reservation, Penalty, UserProfile
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from .covers import save_cover
+from .models import ArchivedLoan, Book, BookCopy, Member, Loan, Reservation, Penalty, UserProfile
+from .penalties import ZERO, adjust_balances, outstanding
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -13,6 +17,19 @@ class BookAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'isbn', 'category')
     search_fields = ('title', 'author', 'isbn')
 
+    # Uploads go through circulation.covers, like the API's, so cover_urls
+    # (which the list endpoints serve) follows cover_image edits here too.
+    def save_model(self, request, obj, form, change):
+        upload = form.cleaned_data.get('cover_image') if 'cover_image' in form.changed_data else None
+        if isinstance(upload, UploadedFile):
+            obj.cover_image = form.initial.get('cover_image')
+        elif 'cover_image' in form.changed_data:
+            obj.cover_urls = {}
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if isinstance(upload, UploadedFile):
+                save_cover(obj, upload)
+
 @admin.register(BookCopy)
 class BookCopyAdmin(admin.ModelAdmin):
     list_display = ('book', 'barcode', 'status')
@@ -20,7 +37,7 @@ class BookCopyAdmin(admin.ModelAdmin):
 
 @admin.register(Member)
 class MemberAdmin(admin.ModelAdmin):
-    list_display = ('user', 'library_id', 'max_active_loans')
+    list_display = ('user', 'library_id', 'max_active_loans', 'active_loan_count', 'outstanding_balance')
     search_fields = ('user__username', 'library_id')
 
 @admin.register(Loan)
@@ -28,12 +45,40 @@ class LoanAdmin(admin.ModelAdmin):
     list_display = ('copy', 'member', 'loan_date', 'due_date', 'status')
     list_filter = ('status', 'loan_date', 'due_date')
 
+@admin.register(ArchivedLoan)
+class ArchivedLoanAdmin(admin.ModelAdmin):
+    list_display = ('id', 'copy', 'member', 'loan_date', 'return_date')
+    raw_id_fields = ('copy', 'member')
+
 @admin.register(Reservation)
 class ReservationAdmin(admin.ModelAdmin):
-    list_display = ('book', 'member', 'reserved_at', 'expires_at', 'status')
+    list_display = ('book', 'member', 'reserved_at', 'expires_at', 'status', 'copy')
     list_filter = ('status',)
+    raw_id_fields = ('copy',)
 
 @admin.register(Penalty)
 class PenaltyAdmin(admin.ModelAdmin):
-    list_display = ('member', 'amount', 'reason', 'resolved')
-    list_filter = ('resolved',)
+    list_display = ('member', 'amount', 'reason', 'resolved', 'accruing')
+    list_filter = ('resolved', 'accruing')
+    readonly_fields = ('accruing',)
+
+    # Edits here keep Member.outstanding_balance in step with the penalty rows.
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            deltas = {obj.member_id: outstanding(obj.amount, obj.resolved)}
+            if change:
+                before = Penalty.objects.get(pk=obj.pk)
+                deltas[before.member_id] = deltas.get(before.member_id, ZERO) - outstanding(before.amount, before.resolved)
+            super().save_model(request, obj, form, change)
+            adjust_balances(deltas)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            deltas = {}
+            for member_id, amount, resolved in queryset.values_list('member_id', 'amount', 'resolved'):
+                deltas[member_id] = deltas.get(member_id, ZERO) - outstanding(amount, resolved)
+            super().delete_queryset(request, queryset)
+            adjust_balances(deltas)
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Penalty.objects.filter(pk=obj.pk))
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class CirculationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'circulation'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import ensure_sqlite_triggers
+        post_migrate.connect(ensure_sqlite_triggers, sender=self)
+        from .metrics import install_query_timer
+        connection_created.connect(install_query_timer)
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedLoan, Loan, Penalty
+
+ARCHIVED_FIELDS = ('id', 'copy_id', 'member_id', 'loan_date', 'due_date', 'return_date')
+
+
+def get_archive_after():
+    # How long a returned loan stays in Loan before it is archived.
+    return timezone.timedelta(days=getattr(settings, 'LOAN_ARCHIVE_AFTER_DAYS', 365))
+
+
+def archivable_loans(before):
+    return Loan.objects.filter(status='RETURNED', return_date__lt=before)
+
+
+def archive_loans(before=None, batch_size=1000):
+    # Moves RETURNED loans returned before `before` into ArchivedLoan, oldest
+    # return first through the partial (return_date, id) index, one bounded
+    # batch per transaction. Archived rows leave Loan, so each batch starts
+    # from the front again and a run with nothing to archive reads no rows.
+    # Each loan's penalties switch to the archived row in the same
+    # transaction, so none is lost to the cascade when the loan is deleted.
+    # Returned loans never change again, so nothing needs locking. Returns
+    # (loans, penalties) moved.
+    before = before or timezone.now() - get_archive_after()
+    archived = penalties = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                archivable_loans(before).order_by('return_date', 'id').values_list(*ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rows:
+                return archived, penalties
+            loan_ids = [row[0] for row in rows]
+            ArchivedLoan.objects.bulk_create([ArchivedLoan(**dict(zip(ARCHIVED_FIELDS, row))) for row in rows])
+            penalties += Penalty.objects.filter(loan_id__in=loan_ids).update(archived_loan_id=F('loan_id'), loan=None)
+            Loan.objects.filter(id__in=loan_ids).delete()
+            archived += len(rows)
@@ -0,0 +1,87 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from . import availability, catalog_cache
+from .models import Book, Loan, Member, Reservation
+from .pagination import InvalidCursor, apaginate_keyset, get_page_size, wants_pagination
+from .serializers import BOOK_ROWS, LOAN_ROWS, MEMBER_ROWS, RESERVATION_ROWS, dumps, json_response
+from .streaming import astreaming_json_response, wants_stream
+from .views import BOOK_ORDERINGS, BookListCreateView, MemberView, cached_json_response
+
+# Async versions of the read endpoints, used when ASYNC_READ_VIEWS is on and
+# the app is served over ASGI. Responses match the sync views in views.py;
+# a view waiting on the database no longer holds a worker. Writes are handed
+# to the sync views in a thread.
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncBookListCreateView(View):
+    async def get(self, request):
+        books = BOOK_ROWS.values(Book.objects.all())
+
+        if not wants_pagination(request):
+            return json_response([BOOK_ROWS.row(row) async for row in books.order_by('id')])
+
+        ordering_name = request.GET.get('ordering', 'title')
+        ordering = BOOK_ORDERINGS.get(ordering_name)
+        if ordering is None:
+            return JsonResponse({'error': 'ordering must be one of: ' + ', '.join(BOOK_ORDERINGS)}, status=400)
+
+        async def build_page():
+            rows, next_cursor = await apaginate_keyset(books, ordering, request, BOOK_ROWS.row)
+            return {'results': rows, 'next': next_cursor}
+
+        cache_key = f"books:{ordering_name}:{get_page_size(request)}:{request.GET.get('cursor', '')}"
+        try:
+            page, hit = await catalog_cache.aget_or_build(cache_key, build_page)
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        if hit:
+            rows = page['results']
+            availability.with_counters(rows, await availability.acurrent_counters([row['id'] for row in rows]))
+        return cached_json_response(dumps(page), hit)
+
+    async def post(self, request):
+        return await sync_to_async(BookListCreateView.as_view())(request)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncMemberView(View):
+    async def get(self, request):
+        return json_response([MEMBER_ROWS.row(row) async for row in MEMBER_ROWS.values(Member.objects.all())])
+
+    async def post(self, request):
+        return await sync_to_async(MemberView.as_view())(request)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncLoanListView(View):
+    async def get(self, request):
+        member_id = request.GET.get('member_id')
+
+        loans_query = LOAN_ROWS.values(Loan.objects.order_by('id'))
+        if member_id:
+            loans_query = loans_query.filter(member_id=member_id)
+
+        if wants_stream(request):
+            return astreaming_json_response(loans_query, LOAN_ROWS.row)
+
+        return json_response([LOAN_ROWS.row(row) async for row in loans_query])
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncReservationListView(View):
+    async def get(self, request):
+        member_id = request.GET.get('member_id')
+
+        reservations_query = RESERVATION_ROWS.values(Reservation.objects.order_by('id'))
+        if member_id:
+            reservations_query = reservations_query.filter(member_id=member_id)
+
+        if wants_stream(request):
+            return astreaming_json_response(reservations_query, RESERVATION_ROWS.row)
+
+        return json_response([RESERVATION_ROWS.row(row) async for row in reservations_query])
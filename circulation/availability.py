@@ -0,0 +1,126 @@
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+
+from .models import Book, BookCopy, Reservation
+
+COUNTER_FIELDS = ('total_copies', 'available_copies', 'on_loan_copies', 'pending_reservations')
+STATUS_COUNTERS = {
+    'AVAILABLE': 'available_copies',
+    'ON_LOAN': 'on_loan_copies',
+}
+
+
+def adjust(book_id, **deltas):
+    # Applies counter deltas with a single UPDATE ... SET x = x + n so
+    # concurrent transactions never overwrite each other's changes. Callers
+    # run this in the same transaction as the state change it mirrors.
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        Book.objects.filter(id=book_id).update(**changes)
+
+
+def adjust_many(deltas_by_book):
+    # Applies {book_id: {field: delta}} for many books in a single UPDATE.
+    deltas_by_book = {
+        book_id: {field: delta for field, delta in deltas.items() if delta}
+        for book_id, deltas in deltas_by_book.items()
+    }
+    deltas_by_book = {book_id: deltas for book_id, deltas in deltas_by_book.items() if deltas}
+    if not deltas_by_book:
+        return
+    fields = {field for deltas in deltas_by_book.values() for field in deltas}
+    changes = {
+        field: F(field) + Case(
+            *[When(id=book_id, then=Value(deltas.get(field, 0))) for book_id, deltas in deltas_by_book.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        for field in fields
+    }
+    Book.objects.filter(id__in=list(deltas_by_book)).update(**changes)
+
+
+def status_deltas(old_status, new_status, count=1):
+    deltas = {}
+    if old_status in STATUS_COUNTERS:
+        deltas[STATUS_COUNTERS[old_status]] = -count
+    if new_status in STATUS_COUNTERS:
+        deltas[STATUS_COUNTERS[new_status]] = deltas.get(STATUS_COUNTERS[new_status], 0) + count
+    return deltas
+
+
+def copy_status_changed(book_id, old_status, new_status, count=1):
+    adjust(book_id, **status_deltas(old_status, new_status, count))
+
+
+def current_counters(book_ids):
+    # Returns {book_id: {counter: value}} as stored, by primary key. The
+    # counters change with each checkout, so cached catalog pages get theirs
+    # from here instead of being invalidated.
+    books = Book.objects.filter(id__in=book_ids).values_list('id', *COUNTER_FIELDS)
+    return {row[0]: dict(zip(COUNTER_FIELDS, row[1:])) for row in books}
+
+
+async def acurrent_counters(book_ids):
+    books = Book.objects.filter(id__in=book_ids).values_list('id', *COUNTER_FIELDS)
+    return {row[0]: dict(zip(COUNTER_FIELDS, row[1:])) async for row in books}
+
+
+def with_counters(rows, counters):
+    # Overwrites the counters of serialized book rows in place.
+    for row in rows:
+        row.update(counters.get(row['id'], ()))
+    return rows
+
+
+def computed_counters(book_ids):
+    copies = BookCopy.objects.filter(book_id__in=book_ids).values('book_id').annotate(
+        total_copies=Count('id'),
+        available_copies=Count('id', filter=Q(status='AVAILABLE')),
+        on_loan_copies=Count('id', filter=Q(status='ON_LOAN')),
+    ).order_by()
+    holds = Reservation.objects.filter(book_id__in=book_ids, status='PENDING').values('book_id').annotate(
+        pending_reservations=Count('id'),
+    ).order_by()
+
+    counters = {book_id: dict.fromkeys(COUNTER_FIELDS, 0) for book_id in book_ids}
+    for row in copies:
+        counters[row.pop('book_id')].update(row)
+    for row in holds:
+        counters[row.pop('book_id')].update(row)
+    return counters
+
+
+def refresh(book_ids):
+    # Recomputes the counters of the given books from their rows. Only safe
+    # for books nobody else is circulating yet, e.g. freshly imported ones.
+    counters = computed_counters(list(book_ids))
+    Book.objects.bulk_update(
+        [Book(id=book_id, **values) for book_id, values in counters.items()],
+        COUNTER_FIELDS,
+    )
+
+
+def find_drift(batch_size=1000):
+    # Yields (book_id, stored, expected) for every book whose stored counters
+    # disagree with its copy and reservation rows, one id range at a time.
+    last_id = 0
+    while True:
+        books = list(
+            Book.objects.filter(id__gt=last_id).order_by('id').values('id', *COUNTER_FIELDS)[:batch_size]
+        )
+        if not books:
+            return
+        last_id = books[-1]['id']
+        counters = computed_counters([row['id'] for row in books])
+        for row in books:
+            book_id = row.pop('id')
+            if row != counters[book_id]:
+                yield book_id, row, counters[book_id]
+
+
+def rebuild(batch_size=1000):
+    fixed = 0
+    for book_id, stored, expected in find_drift(batch_size):
+        Book.objects.filter(id=book_id).update(**expected)
+        fixed += 1
+    return fixed
@@ -0,0 +1,247 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, IntegerField, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from . import availability, holds, loan_counts
+from .models import BookCopy, Loan, Reservation
+from .penalties import case_by_id, settle_penalties
+from .services import LOAN_PERIOD, CirculationError, lock_members
+
+OPERATIONS = ('checkout', 'return')
+
+
+def get_max_operations():
+    return getattr(settings, 'LOAN_BATCH_MAX_OPERATIONS', 100)
+
+
+def _parse(operations, default_library_id):
+    parsed = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            parsed.append({'index': index, 'error': 'Operation must be an object'})
+            continue
+        op = operation.get('op')
+        library_id = operation.get('library_id') or default_library_id
+        book_id = operation.get('book_id')
+        if op not in OPERATIONS:
+            parsed.append({'index': index, 'op': op, 'error': 'op must be one of: ' + ', '.join(OPERATIONS)})
+        elif not library_id or not book_id:
+            parsed.append({'index': index, 'op': op, 'error': 'library_id and book_id are required'})
+        else:
+            try:
+                parsed.append({'index': index, 'op': op, 'library_id': library_id, 'book_id': int(book_id)})
+            except (TypeError, ValueError):
+                parsed.append({'index': index, 'op': op, 'error': 'book_id must be an integer'})
+    return parsed
+
+
+def apply_loan_batch(operations, default_library_id=None):
+    # Applies checkout/return operations in order and in one transaction,
+    # returning one result per operation. Everything the operations touch is
+    # loaded up front with a fixed number of set-based queries, the operations
+    # are resolved in memory, and the resulting writes are issued in bulk, so
+    # the query count does not grow with the number of items.
+    if len(operations) > get_max_operations():
+        raise CirculationError(f'At most {get_max_operations()} operations per batch')
+
+    parsed = _parse(operations, default_library_id)
+    valid = [item for item in parsed if 'error' not in item]
+    library_ids = {item['library_id'] for item in valid}
+    book_ids = {item['book_id'] for item in valid}
+    checkout_books = {item['book_id'] for item in valid if item['op'] == 'checkout'}
+    now = timezone.now()
+
+    with transaction.atomic():
+        members = lock_members(library_ids)
+        member_ids = [member.id for member in members.values()]
+
+        # The members are locked, so their counts can be checked and moved in
+        # memory and written back as one delta per member.
+        open_counts = {member.id: member.active_loan_count for member in members.values()}
+
+        open_loans = defaultdict(list)
+        for loan in (
+            Loan.objects.filter(member_id__in=member_ids, copy__book_id__in=book_ids, status__in=Loan.OPEN_STATUSES)
+            .select_related('copy').order_by('id')
+        ):
+            open_loans[(loan.member_id, loan.copy.book_id)].append(loan)
+
+        available = BookCopy.objects.filter(book_id__in=checkout_books, status='AVAILABLE').order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            available = available.select_for_update(skip_locked=True)
+        copy_pool = defaultdict(list)
+        for copy in available:
+            copy_pool[copy.book_id].append(copy)
+
+        # Open holds of the members checking out: a READY one's copy is
+        # theirs to take, a PENDING one is fulfilled by whatever copy they get.
+        pending = {}
+        for reservation in (
+            Reservation.objects.filter(
+                member_id__in=member_ids, book_id__in=checkout_books, status__in=Reservation.OPEN_STATUSES,
+            ).order_by('-id')
+        ):
+            pending[(reservation.member_id, reservation.book_id)] = reservation
+        held_copies = {
+            reservation.id: BookCopy(id=reservation.copy_id, book_id=reservation.book_id, status='RESERVED')
+            for reservation in pending.values() if reservation.status == 'READY' and reservation.copy_id
+        }
+
+        # The heads of the queues of returned books, as many per book as the
+        # batch has operations on it, in one windowed query on the queue index.
+        ops_per_book = Counter(item['book_id'] for item in valid)
+        return_books = {item['book_id'] for item in valid if item['op'] == 'return'}
+        queues = defaultdict(list)
+        if return_books:
+            holds_by_id = {reservation.id: reservation for reservation in pending.values()}
+            for reservation in (
+                Reservation.objects.filter(book_id__in=return_books, status='PENDING', expires_at__gte=now)
+                .annotate(rank=Window(RowNumber(), partition_by=[F('book_id')], order_by=F('id').asc()))
+                .filter(rank__lte=max(ops_per_book[book_id] for book_id in return_books))
+                .order_by('book_id', 'id')
+            ):
+                queues[reservation.book_id].append(holds_by_id.get(reservation.id, reservation))
+
+        new_loans = []
+        returned_loans = []
+        shelved, reserved = [], []
+        ready = []
+        claimed = {'AVAILABLE': [], 'RESERVED': []}
+        fulfilled = {'PENDING': [], 'READY': []}
+        counter_deltas = defaultdict(lambda: defaultdict(int))
+
+        for item in valid:
+            member = members.get(item['library_id'])
+            book_id = item['book_id']
+            if member is None:
+                item['error'] = 'Member not found'
+                continue
+
+            if item['op'] == 'return':
+                loans = open_loans.get((member.id, book_id))
+                if not loans:
+                    item['error'] = 'No active loan found for this book and member'
+                    continue
+                loan = loans.pop(0)
+                loan.return_date = now
+                loan.status = 'RETURNED'
+                returned_loans.append(loan)
+                open_counts[member.id] = max(open_counts[member.id] - 1, 0)
+                # The copy goes to the next hold still waiting, else back on the shelf.
+                waiting = queues[book_id]
+                while waiting and waiting[0].status != 'PENDING':
+                    waiting.pop(0)
+                hold = waiting.pop(0) if waiting else None
+                status = 'RESERVED' if hold else 'AVAILABLE'
+                for field, delta in availability.status_deltas(loan.copy.status, status).items():
+                    counter_deltas[book_id][field] += delta
+                loan.copy.status = status
+                if hold:
+                    hold.status, hold.copy_id, hold.expires_at = 'READY', loan.copy.id, now + holds.get_pickup_period()
+                    held_copies[hold.id] = loan.copy
+                    ready.append(hold)
+                    reserved.append(loan.copy.id)
+                    counter_deltas[book_id]['pending_reservations'] -= 1
+                else:
+                    shelved.append(loan.copy.id)
+                    # A copy returned earlier in the batch can go straight out again.
+                    copy_pool[book_id].append(loan.copy)
+                item['loan'] = loan
+                item['hold'] = hold
+                continue
+
+            reservation = pending.get((member.id, book_id))
+            copy = held_copies.get(reservation.id) if reservation and reservation.status == 'READY' else None
+            if copy is None and not copy_pool.get(book_id):
+                item['error'] = 'No available copies of this book'
+                continue
+            if open_counts[member.id] >= member.max_active_loans:
+                item['error'] = 'Member has reached maximum active loans'
+                continue
+            if copy is None:
+                copy = copy_pool[book_id].pop(0)
+            for field, delta in availability.status_deltas(copy.status, 'ON_LOAN').items():
+                counter_deltas[book_id][field] += delta
+            claimed[copy.status].append(copy.id)
+            copy.status = 'ON_LOAN'
+            loan = Loan(copy=copy, member=member, loan_date=now, due_date=now + LOAN_PERIOD)
+            new_loans.append(loan)
+            open_counts[member.id] += 1
+            if reservation:
+                del pending[(member.id, book_id)]
+                if reservation.status == 'PENDING':
+                    counter_deltas[book_id]['pending_reservations'] -= 1
+                fulfilled[reservation.status].append(reservation.id)
+                reservation.status = 'FULFILLED'
+            item['loan'] = loan
+            item['reservation_fulfilled'] = reservation is not None
+
+        # Returns are written first so copies they free can be claimed below.
+        if returned_loans:
+            # Loans are returned only if still open, so a return that committed
+            # since they were read isn't applied (and charged) twice.
+            if Loan.objects.filter(id__in=[loan.id for loan in returned_loans], status__in=Loan.OPEN_STATUSES).update(
+                status='RETURNED', return_date=now, updated_at=now,
+            ) != len(returned_loans):
+                raise CirculationError('Loans changed during the batch, please retry', status=409)
+            BookCopy.objects.filter(id__in=shelved).update(status='AVAILABLE', updated_at=now)
+            BookCopy.objects.filter(id__in=reserved).update(status='RESERVED', updated_at=now)
+        if ready:
+            if Reservation.objects.filter(id__in=[hold.id for hold in ready], status='PENDING').update(
+                status='READY',
+                copy_id=case_by_id({hold.id: hold.copy_id for hold in ready}, 'copy_id', IntegerField()),
+                expires_at=now + holds.get_pickup_period(),
+            ) != len(ready):
+                raise CirculationError('Holds changed during the batch, please retry', status=409)
+            holds.announce_ready([hold.id for hold in ready])
+        if new_loans:
+            for status, copy_ids in claimed.items():
+                if copy_ids and BookCopy.objects.filter(id__in=copy_ids, status=status).update(
+                    status='ON_LOAN', updated_at=now,
+                ) != len(copy_ids):
+                    raise CirculationError('Copies changed during the batch, please retry', status=409)
+            Loan.objects.bulk_create(new_loans)
+        # Holds are fulfilled only from the state they were read in, so one
+        # expired or cancelled meanwhile can't have its copy passed on as well.
+        for status, reservation_ids in fulfilled.items():
+            if reservation_ids and Reservation.objects.filter(id__in=reservation_ids, status=status).update(
+                status='FULFILLED',
+            ) != len(reservation_ids):
+                raise CirculationError('Holds changed during the batch, please retry', status=409)
+
+        penalties = settle_penalties(returned_loans)
+        for item in valid:
+            if item['op'] == 'return' and 'error' not in item:
+                item['penalty'] = penalties.get(item['loan'].id)
+        availability.adjust_many(counter_deltas)
+        loan_counts.adjust_many({
+            member.id: open_counts[member.id] - member.active_loan_count for member in members.values()
+        })
+
+    return [_result(item) for item in parsed]
+
+
+def _result(item):
+    result = {'index': item['index'], 'op': item.get('op')}
+    if 'error' in item:
+        result.update({'status': 'error', 'error': item['error']})
+        return result
+    loan = item['loan']
+    result.update({'status': 'ok', 'loan_id': loan.id})
+    if item['op'] == 'checkout':
+        result['due_date'] = loan.due_date
+        result['reservation_fulfilled'] = item['reservation_fulfilled']
+    else:
+        if item['penalty']:
+            result['penalty'] = {
+                'penalty_id': item['penalty'].id,
+                'amount': str(item['penalty'].amount),
+                'reason': item['penalty'].reason
+            }
+        if item['hold']:
+            result['hold'] = {'reservation_id': item['hold'].id, 'expires_at': item['hold'].expires_at}
+    return result
@@ -0,0 +1,56 @@
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import override_settings
+
+
+@contextmanager
+def throwaway_database(using='default', keepdb=False, file_backed=False):
+    # Points ``using`` at a freshly migrated test database for the duration of
+    # the block so benchmarks and checks never touch real data. SQLite test
+    # databases live in memory unless ``file_backed`` is set, which is needed
+    # when several threads or processes must share them.
+    connection = connections[using]
+    old_name = connection.settings_dict['NAME']
+    old_test_name = connection.settings_dict['TEST'].get('NAME')
+    if connection.vendor == 'sqlite' and not keepdb:
+        connection.settings_dict['TEST']['NAME'] = (
+            os.path.join(tempfile.mkdtemp(), 'bench.sqlite3') if file_backed else None
+        )
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        # Replicas aren't part of the throwaway database; every read goes to it.
+        with override_settings(DATABASE_REPLICAS=[]):
+            yield connection
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'count': len(samples),
+        'mean': statistics.fmean(samples) if samples else 0.0,
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+    }
@@ -0,0 +1,117 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from .models import CatalogVersion
+
+VERSION_ROW = 1
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def current_version():
+    # A primary-key read per request; the row is shared by every process, so
+    # process-local caches can't miss a bump. The version starts from a
+    # timestamp so a persistent cache that outlives the database never serves
+    # entries written under an older one.
+    version = CatalogVersion.objects.filter(id=VERSION_ROW).values_list('version', flat=True).first()
+    if version is None:
+        version = CatalogVersion.objects.get_or_create(id=VERSION_ROW, defaults={'version': time.time_ns()})[0].version
+    return version
+
+
+async def acurrent_version():
+    version = await CatalogVersion.objects.filter(id=VERSION_ROW).values_list('version', flat=True).afirst()
+    if version is None:
+        version = (await CatalogVersion.objects.aget_or_create(
+            id=VERSION_ROW, defaults={'version': time.time_ns()},
+        ))[0].version
+    return version
+
+
+def _bump_version():
+    if not CatalogVersion.objects.filter(id=VERSION_ROW).update(version=F('version') + 1):
+        current_version()
+
+
+def invalidate():
+    # Every cached catalog payload is keyed by the current version, so bumping
+    # it drops them all at once. Deferred to commit so a concurrent reader
+    # cannot re-cache rows from before the change. Availability counters are
+    # not part of the cached payload (see availability.current_counters), so
+    # only changes to books themselves need this.
+    transaction.on_commit(_bump_version)
+
+
+def _record(hit):
+    with _stats_lock:
+        _stats['hits' if hit else 'misses'] += 1
+
+
+def get_or_build(key, builder):
+    # Returns (value, hit).
+    cache = get_cache()
+    full_key = f'catalog:{current_version()}:{key}'
+    value = cache.get(full_key)
+    hit = value is not None
+    if not hit:
+        value = builder()
+        cache.set(full_key, value, get_timeout())
+    _record(hit)
+    return value, hit
+
+
+async def aget_or_build(key, builder):
+    # Async counterpart of get_or_build; builder is a coroutine function.
+    cache = get_cache()
+    full_key = f'catalog:{await acurrent_version()}:{key}'
+    value = await cache.aget(full_key)
+    hit = value is not None
+    if not hit:
+        value = await builder()
+        await cache.aset(full_key, value, get_timeout())
+    _record(hit)
+    return value, hit
+
+
+def get_many_or_build(prefix, ids, builder):
+    # Returns {id: value} for ids, building only the ones not cached.
+    # builder(missing_ids) must return a dict keyed by id.
+    cache = get_cache()
+    version = current_version()
+    keys = {f'catalog:{version}:{prefix}:{item_id}': item_id for item_id in ids}
+    found = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+    missing = [item_id for item_id in ids if item_id not in found]
+    if missing:
+        built = builder(missing)
+        cache.set_many({f'catalog:{version}:{prefix}:{item_id}': value for item_id, value in built.items()}, get_timeout())
+        found.update(built)
+    with _stats_lock:
+        _stats['hits'] += len(ids) - len(missing)
+        _stats['misses'] += len(missing)
+    return found
+
+
+def stats():
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+        'version': current_version(),
+    }
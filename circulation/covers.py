@@ -0,0 +1,106 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+from .models import Book
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Variant name -> (width, height). Every book with a cover gets one URL per
+# variant plus 'original' in Book.cover_urls.
+THUMBNAIL_SIZES = {
+    'small': (64, 96),
+    'medium': (160, 240),
+    'large': (320, 480),
+}
+LOCAL_COVER_DIR = 'covers'
+
+
+def get_thumbnail_sizes():
+    return getattr(settings, 'COVER_THUMBNAIL_SIZES', THUMBNAIL_SIZES)
+
+
+def use_cloudinary():
+    return getattr(settings, 'COVER_STORAGE', 'cloudinary') == 'cloudinary'
+
+
+def get_local_storage():
+    return FileSystemStorage(location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL)
+
+
+def cloudinary_urls(image):
+    # Cloudinary resizes on its side from URL transformations, so the variants
+    # only need their URLs built once, here, rather than per row in list views.
+    urls = {'original': image.build_url(secure=True)}
+    for name, (width, height) in get_thumbnail_sizes().items():
+        urls[name] = image.build_url(
+            width=width, height=height, crop='fill', fetch_format='auto', quality='auto', secure=True,
+        )
+    return urls
+
+
+def store_local_cover(upload):
+    # Saves the upload and its thumbnails to MEDIA_ROOT. The image is checked
+    # before anything is written, and files written before a later failure are
+    # removed again. Without Pillow the variants fall back to the original.
+    if Image is not None:
+        with Image.open(upload) as image:
+            image.verify()
+        upload.seek(0)
+
+    storage = get_local_storage()
+    stem = uuid.uuid4().hex
+    extension = os.path.splitext(upload.name)[1].lower() or '.jpg'
+    written = [storage.save(f'{LOCAL_COVER_DIR}/{stem}{extension}', upload)]
+    urls = {'original': storage.url(written[0])}
+
+    try:
+        for name, (width, height) in get_thumbnail_sizes().items():
+            urls[name] = urls['original']
+            if Image is None:
+                continue
+            variant = f'{LOCAL_COVER_DIR}/{stem}_{name}.jpg'
+            with storage.open(written[0]) as source, Image.open(source) as image:
+                image = image.convert('RGB')
+                image.thumbnail((width, height))
+                written.append(variant)
+                image.save(storage.path(variant), 'JPEG', quality=85)
+            urls[name] = storage.url(variant)
+    except Exception:
+        for name in written:
+            storage.delete(name)
+        raise
+    return urls
+
+
+def save_cover(book, upload):
+    # Stores an uploaded cover and records the resolved URLs on the book.
+    if use_cloudinary():
+        book.cover_image = upload
+        book.save(update_fields=['cover_image'])
+        book.cover_urls = cloudinary_urls(book.cover_image)
+    else:
+        book.cover_urls = store_local_cover(upload)
+    book.save(update_fields=['cover_urls'])
+    return book.cover_urls
+
+
+def backfill_cloudinary_urls(rebuild_all=False, batch_size=500):
+    # Fills in cover_urls for Cloudinary covers that have none, such as those
+    # uploaded before the field existed when migration 0009 ran without a
+    # cloud name. rebuild_all also rewrites the URLs already stored, e.g.
+    # after COVER_THUMBNAIL_SIZES changes. Returns the number of books updated.
+    books = Book.objects.exclude(cover_image__isnull=True).exclude(cover_image='')
+    if not rebuild_all:
+        books = books.filter(cover_urls={})
+    updated = []
+    for book in books.only('id', 'cover_image').iterator(chunk_size=batch_size):
+        book.cover_urls = cloudinary_urls(book.cover_image)
+        updated.append(book)
+    Book.objects.bulk_update(updated, ['cover_urls'], batch_size=batch_size)
+    return len(updated)
@@ -0,0 +1,139 @@
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+_DONE = object()
+
+# The alias this request's reads go to. Unset outside requests, so the
+# sweeper, management commands and shells always read the primary.
+_read_alias = ContextVar('read_alias', default=DEFAULT_DB_ALIAS)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def get_pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def is_pinned(request):
+    # The pin cookie holds the time it runs out, so an old cookie a client
+    # kept past its max-age doesn't pin it.
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_alias_for(request):
+    replicas = get_replicas()
+    if not replicas or request.method not in SAFE_METHODS or is_pinned(request):
+        return DEFAULT_DB_ALIAS
+    # One replica per request, so a page is never stitched together from
+    # replicas at different points of replication.
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    # Sends reads to the replica the middleware picked for the request and
+    # everything else to the primary. Reads inside a transaction on the
+    # primary stay there, so a write path never reads around its own writes.
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias != DEFAULT_DB_ALIAS and connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    # With DATABASE_REPLICAS configured, lets ReplicaRouter read safe-method
+    # requests from a replica. A request with any other method goes to the
+    # primary and pins its client there for REPLICA_PIN_SECONDS (a cookie),
+    # so the client reads its own writes while the replicas catch up.
+    # Streaming responses keep the request's alias while they are consumed.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        alias = read_alias_for(request)
+        token = _read_alias.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        return self.process_response(request, response, alias)
+
+    async def __acall__(self, request):
+        alias = read_alias_for(request)
+        token = _read_alias.set(alias)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        return self.process_response(request, response, alias)
+
+    def process_response(self, request, response, alias):
+        if request.method not in SAFE_METHODS:
+            seconds = get_pin_seconds()
+            response.set_cookie(PIN_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds, httponly=True, samesite='Lax')
+        response['X-DB-Alias'] = alias
+        if response.streaming and alias != DEFAULT_DB_ALIAS:
+            if response.is_async:
+                response.streaming_content = _aiter_with_alias(response.streaming_content, alias)
+            else:
+                response.streaming_content = _iter_with_alias(response.streaming_content, alias)
+        return response
+
+
+def _iter_with_alias(chunks, alias):
+    # The alias is set around each chunk rather than for the generator's
+    # lifetime, so it never outlives a step in the server's thread.
+    chunks = iter(chunks)
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            chunk = next(chunks, _DONE)
+        finally:
+            _read_alias.reset(token)
+        if chunk is _DONE:
+            return
+        yield chunk
+
+
+async def _aiter_with_alias(chunks, alias):
+    chunks = aiter(chunks)
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            chunk = await anext(chunks, _DONE)
+        finally:
+            _read_alias.reset(token)
+        if chunk is _DONE:
+            return
+        yield chunk
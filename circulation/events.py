@@ -0,0 +1,261 @@
+import asyncio
+import itertools
+import threading
+import uuid
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import CirculationEvent
+from .serializers import dumps
+
+EVENT_TYPES = (
+    'loan.checked_out',
+    'loan.returned',
+    'reservation.created',
+    'reservation.ready',
+    'reservation.cancelled',
+    'reservation.expired',
+)
+# Queued for a subscriber that fell too far behind; it is told to refetch.
+RESET = object()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class InProcessBroadcast:
+    # Fans events out to the SSE streams of this process and keeps the most
+    # recent ones for clients reconnecting with Last-Event-ID. Event ids are
+    # "<epoch>-<sequence>"; the epoch changes on restart so ids from an older
+    # process are recognised as unknown rather than replayed wrongly.
+
+    def __init__(self, buffer_size=1000, queue_size=1000):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+        self._sequence = itertools.count(1)
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._served = False
+
+    def publish(self, event_type, data):
+        # Safe to call from any thread; subscribers are fed on their own loop.
+        with self._lock:
+            event = (f'{self.epoch}-{next(self._sequence)}', event_type, data)
+            self._buffer.append(event)
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has closed.
+                self.unsubscribe(queue)
+        return event
+
+    def _deliver(self, queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESET)
+
+    def subscribe(self):
+        # Must be called from the event loop that will read the queue.
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+            self._served = True
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = {(loop, q) for loop, q in self._subscribers if q is not queue}
+
+    def replay(self, last_event_id):
+        # Returns the buffered events after last_event_id, or None when that
+        # id is unknown or has already left the buffer.
+        epoch, _, sequence = (last_event_id or '').partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        with self._lock:
+            events = list(self._buffer)
+        if events and event_sequence(events[0]) > sequence + 1:
+            return None
+        return [event for event in events if event_sequence(event) > sequence]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def is_active(self):
+        # Events can only reach streams this process serves, so until it has
+        # served one (never, under WSGI or in the sweeper) there is no one to
+        # publish to.
+        return self._served
+
+
+class DatabaseEventLog(InProcessBroadcast):
+    # Publishes to the CirculationEvent table, so events from any process
+    # (the sweeper worker included) reach the streams of every web process.
+    # Each event loop serving streams polls the table every
+    # EVENTS_POLL_SECONDS and fans new rows out to its subscribers. Event ids
+    # are the row ids, so clients resume across processes and restarts; the
+    # sweeper keeps the last EVENTS_BUFFER_SIZE rows. Rows are inserted in
+    # their own autocommit statement once the change has committed, so ids
+    # become visible in order.
+
+    def __init__(self, buffer_size=1000, queue_size=1000):
+        super().__init__(buffer_size, queue_size)
+        self.buffer_size = buffer_size
+        self._pollers = {}
+
+    def publish(self, event_type, data):
+        row = CirculationEvent.objects.create(event_type=event_type, payload=data)
+        return (str(row.id), event_type, data)
+
+    def subscribe(self):
+        queue = super().subscribe()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._pollers:
+                self._pollers[loop] = loop.create_task(self._poll(loop))
+        return queue
+
+    async def _poll(self, loop):
+        interval = getattr(settings, 'EVENTS_POLL_SECONDS', 1)
+        last_id = await sync_to_async(self.latest_id)()
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                with self._lock:
+                    queues = [queue for subscriber_loop, queue in self._subscribers if subscriber_loop is loop]
+                    if not queues:
+                        del self._pollers[loop]
+                        return
+                async for row_id, event_type, payload in (
+                    CirculationEvent.objects.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'event_type', 'payload')[:self.queue_size]
+                ):
+                    last_id = row_id
+                    for queue in queues:
+                        self._deliver(queue, (str(row_id), event_type, payload))
+        except BaseException:
+            with self._lock:
+                self._pollers.pop(loop, None)
+            raise
+
+    def latest_id(self):
+        return CirculationEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def replay(self, last_event_id):
+        if not (last_event_id or '').isdigit():
+            return None
+        sequence = int(last_event_id)
+        oldest = CirculationEvent.objects.order_by('id').values_list('id', flat=True).first()
+        if oldest is not None and oldest > sequence + 1:
+            return None
+        return [
+            (str(row_id), event_type, payload)
+            for row_id, event_type, payload in CirculationEvent.objects.filter(id__gt=sequence).order_by('id')
+            .values_list('id', 'event_type', 'payload')
+        ]
+
+    def is_active(self):
+        # Any process may be serving streams.
+        return True
+
+    def prune(self):
+        cutoff = self.latest_id() - self.buffer_size
+        return CirculationEvent.objects.filter(id__lte=cutoff).delete()[0] if cutoff > 0 else 0
+
+
+def event_sequence(event):
+    return int(event[0].rpartition('-')[2])
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_class = import_string(getattr(settings, 'EVENTS_BACKEND', 'circulation.events.InProcessBroadcast'))
+                _backend = backend_class(buffer_size=getattr(settings, 'EVENTS_BUFFER_SIZE', 1000))
+    return _backend
+
+
+def is_active():
+    # Whether published events can reach anyone; callers skip building
+    # payloads when they can't.
+    return get_backend().is_active()
+
+
+def publish(event_type, data):
+    # Events go out only once the change they describe has committed.
+    backend = get_backend()
+    if not backend.is_active():
+        return
+    # Encoded like the list endpoints, so rows match theirs exactly.
+    payload = dumps(data).decode()
+    transaction.on_commit(lambda: backend.publish(event_type, payload))
+
+
+def prune():
+    # Drops events older than the backend keeps for reconnecting clients.
+    # Returns how many were dropped.
+    backend = get_backend()
+    return backend.prune() if hasattr(backend, 'prune') else 0
+
+
+async def stream(last_event_id=None):
+    # Yields SSE frames: a replay of what the client missed (or a reset when
+    # that can't be known), then live events. Comments keep idle proxies from
+    # closing the connection, and the stream ends after EVENTS_MAX_STREAM_SECONDS
+    # so the browser reconnects (with Last-Event-ID) and dead streams can't
+    # pile up.
+    backend = get_backend()
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT_SECONDS', 15)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, 'EVENTS_MAX_STREAM_SECONDS', 300)
+
+    queue = backend.subscribe()
+    try:
+        yield f'retry: {getattr(settings, "EVENTS_RETRY_MS", 3000)}\n\n'
+        last_sequence = 0
+        if last_event_id:
+            missed = await sync_to_async(backend.replay)(last_event_id)
+            if missed is None:
+                yield format_reset()
+            else:
+                for event in missed:
+                    last_sequence = event_sequence(event)
+                    yield format_event(event)
+
+        while loop.time() < deadline:
+            try:
+                event = await asyncio.wait_for(queue.get(), min(heartbeat, max(deadline - loop.time(), 0)))
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if event is RESET:
+                yield format_reset()
+            elif event_sequence(event) > last_sequence:
+                # Events published while replaying arrive on the queue too.
+                last_sequence = event_sequence(event)
+                yield format_event(event)
+    finally:
+        backend.unsubscribe(queue)
+
+
+def format_event(event):
+    event_id, event_type, payload = event
+    return f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'
+
+
+def format_reset():
+    return 'event: reset\ndata: {}\n\n'
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery
+from django.utils import timezone
+
+from . import availability, events
+from .models import BookCopy, Reservation
+from .serializers import RESERVATION_ROWS
+
+
+def get_hold_period():
+    # How long a hold may wait in the queue.
+    return timezone.timedelta(days=getattr(settings, 'HOLD_PERIOD_DAYS', 7))
+
+
+def get_pickup_period():
+    # How long a READY hold keeps its copy set aside.
+    return timezone.timedelta(days=getattr(settings, 'HOLD_PICKUP_DAYS', 3))
+
+
+def queue(book_id, now=None):
+    # The book's waiting holds in queue order, read from the partial
+    # (book, id) index. Holds already past expires_at are left out, so they
+    # never get a copy in the window before the sweeper expires them.
+    now = now or timezone.now()
+    return Reservation.objects.filter(book_id=book_id, status='PENDING', expires_at__gte=now).order_by('id')
+
+
+def open_hold(member_id, book_id):
+    return (
+        Reservation.objects.filter(book_id=book_id, member_id=member_id, status__in=Reservation.OPEN_STATUSES)
+        .only('id', 'book_id', 'status', 'copy_id').first()
+    )
+
+
+def position(reservation):
+    if reservation.status != 'PENDING':
+        return None
+    return queue(reservation.book_id).filter(id__lte=reservation.id).count()
+
+
+def queue_position(now=None):
+    # Annotation for a hold's place in its book's queue (1 is next), or None
+    # once it has left the queue: a count over the index range ahead of it,
+    # so a lookup never reads the queue itself. Counts the same holds as
+    # queue().
+    ahead = (
+        queue(OuterRef('book_id'), now).filter(id__lte=OuterRef('id')).order_by()
+        .values('book_id').annotate(n=Count('id')).values('n')
+    )
+    return Subquery(ahead)
+
+
+def assign(book_id, copy_id, now):
+    # Makes the head of the book's queue READY with copy_id and returns it, or
+    # None if nobody is waiting. The caller moves the copy to RESERVED and the
+    # counters (pending_reservations -1). A head cancelled or taken by a
+    # concurrent return in between fails the conditional update and the next
+    # one is tried.
+    while True:
+        head = queue(book_id, now).only('id', 'member_id', 'book_id').first()
+        if head is None:
+            return None
+        expires_at = now + get_pickup_period()
+        if Reservation.objects.filter(id=head.id, status='PENDING', expires_at__gte=now).update(
+            status='READY', copy_id=copy_id, expires_at=expires_at,
+        ):
+            head.status, head.copy_id, head.expires_at = 'READY', copy_id, expires_at
+            announce_ready([head.id])
+            return head
+
+
+def announce_ready(reservation_ids):
+    # Rows match /api/reservations/list/, copy and pickup deadline included,
+    # so clients apply them by id instead of refetching the list.
+    if events.is_active():
+        rows = RESERVATION_ROWS.many(RESERVATION_ROWS.values(Reservation.objects.filter(id__in=reservation_ids)))
+        events.publish('reservation.ready', {'reservation_ids': reservation_ids, 'reservations': rows})
+
+
+def shelve(book_id, copy_id, previous_status, now=None):
+    # Puts a copy that has come back (returned, or released by a hold that
+    # ended) at the disposal of the queue: the next hold gets it as RESERVED,
+    # otherwise it is AVAILABLE. A constant number of queries either way.
+    # The copy only moves if it is still in previous_status, so a copy that
+    # went out in the meantime (a hold picked up as it expired) stays out.
+    # Returns the hold it went to, if any.
+    now = now or timezone.now()
+    if not BookCopy.objects.filter(id=copy_id, status=previous_status).update(status='AVAILABLE', updated_at=now):
+        return None
+    hold = assign(book_id, copy_id, now)
+    status = 'RESERVED' if hold else 'AVAILABLE'
+    if hold:
+        BookCopy.objects.filter(id=copy_id).update(status=status, updated_at=now)
+    deltas = availability.status_deltas(previous_status, status)
+    if hold:
+        deltas['pending_reservations'] = -1
+    availability.adjust(book_id, **deltas)
+    return hold
+
+
+def serve_queue(book_id, now=None):
+    # Hands AVAILABLE copies to waiting holds until one or the other runs
+    # out, after a hold is placed or copies are added. Returns the holds made
+    # READY.
+    now = now or timezone.now()
+    ready = []
+    while queue(book_id, now).exists():
+        copy_id = BookCopy.objects.filter(book_id=book_id, status='AVAILABLE').values_list('id', flat=True).first()
+        if copy_id is None:
+            break
+        if not BookCopy.objects.filter(id=copy_id, status='AVAILABLE').update(status='RESERVED', updated_at=now):
+            continue
+        hold = assign(book_id, copy_id, now)
+        if hold is None:
+            BookCopy.objects.filter(id=copy_id).update(status='AVAILABLE', updated_at=now)
+            break
+        availability.adjust(book_id, available_copies=-1, pending_reservations=-1)
+        ready.append(hold)
+    return ready
+
+
+def place(book_id, member_id, now=None):
+    # Joins the book's queue; with a copy on the shelf the hold is READY at
+    # once. Must run inside a transaction.
+    now = now or timezone.now()
+    reservation = Reservation.objects.create(book_id=book_id, member_id=member_id, expires_at=now + get_hold_period())
+    availability.adjust(book_id, pending_reservations=1)
+    for hold in serve_queue(book_id, now):
+        if hold.id == reservation.id:
+            reservation.status, reservation.copy_id, reservation.expires_at = hold.status, hold.copy_id, hold.expires_at
+    return reservation
+
+
+def close(reservation, status, now=None, keep_copy=False):
+    # Ends an open hold (CANCELLED, EXPIRED or FULFILLED) if it is still in
+    # the state it was read in. A READY hold's copy goes on to the next hold
+    # unless keep_copy says it was just picked up. Returns whether the hold
+    # was closed.
+    if not Reservation.objects.filter(id=reservation.id, status=reservation.status).update(status=status):
+        return False
+    if reservation.status == 'PENDING':
+        availability.adjust(reservation.book_id, pending_reservations=-1)
+    elif reservation.copy_id and not keep_copy:
+        shelve(reservation.book_id, reservation.copy_id, 'RESERVED', now)
+    return True
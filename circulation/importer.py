@@ -0,0 +1,187 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count
+
+from . import availability, catalog_cache, holds
+from .models import Book, BookCopy
+from .services import generate_barcode, insert_copies
+
+BOOK_FIELDS = ('title', 'author', 'category', 'about')
+# The longest value each imported CharField accepts. SQLite doesn't enforce
+# max_length, so records are checked here rather than left to the database.
+MAX_LENGTHS = {name: Book._meta.get_field(name).max_length for name in ('isbn', 'title', 'author', 'category')}
+BARCODE_MAX_LENGTH = BookCopy._meta.get_field('barcode').max_length
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def read_records(stream, fmt):
+    # Yields one dict per input record without reading the whole file.
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield InvalidRecord(f'line {line_number}: {e}')
+
+
+def normalize(record):
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRecord('record is not an object')
+    isbn = str(record.get('isbn') or '').strip()
+    title = str(record.get('title') or '').strip()
+    if not isbn or not title:
+        raise InvalidRecord('isbn and title are required')
+    values = {
+        'isbn': isbn,
+        'title': title,
+        'author': str(record.get('author') or '').strip(),
+        'category': str(record.get('category') or '').strip(),
+    }
+    for name, max_length in MAX_LENGTHS.items():
+        if len(values[name]) > max_length:
+            raise InvalidRecord(f'{name} is longer than {max_length} characters for isbn {isbn!r}')
+
+    barcodes = record.get('barcodes') or []
+    if isinstance(barcodes, str):
+        barcodes = barcodes.split(';')
+    barcodes = list(dict.fromkeys(str(barcode).strip() for barcode in barcodes if str(barcode).strip()))
+    for barcode in barcodes:
+        if len(barcode) > BARCODE_MAX_LENGTH:
+            raise InvalidRecord(f'barcode {barcode!r} is longer than {BARCODE_MAX_LENGTH} characters')
+    try:
+        copies = int(record.get('copies') or 0)
+    except (TypeError, ValueError):
+        raise InvalidRecord(f'copies must be an integer for isbn {isbn!r}')
+
+    return {
+        **values,
+        'about': record.get('about') or None,
+        'barcodes': barcodes,
+        # A book ends up with at least this many copies; re-importing the same
+        # record does not add more.
+        'copies': max(copies, len(barcodes)),
+    }
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_chunk(rows):
+    # Upserts books on isbn and tops up their copies, all in one transaction.
+    # Every step is idempotent so a chunk can be replayed after a crash.
+    # stats['barcodes_rejected'] lists listed barcodes that were not created,
+    # and stats['records_rejected'] records whose isbn an earlier row of the
+    # chunk already had (the first one is imported).
+    by_isbn = {}
+    stats = {'books_created': 0, 'books_updated': 0, 'copies_created': 0, 'barcodes_rejected': [], 'records_rejected': []}
+    for row in rows:
+        if row['isbn'] in by_isbn:
+            stats['records_rejected'].append(f"record for isbn {row['isbn']!r}: isbn repeats an earlier record")
+        else:
+            by_isbn[row['isbn']] = row
+
+    with transaction.atomic():
+        existing = {book.isbn: book for book in Book.objects.filter(isbn__in=list(by_isbn))}
+
+        changed = []
+        for isbn, book in existing.items():
+            row = by_isbn[isbn]
+            if any(getattr(book, field) != row[field] for field in BOOK_FIELDS):
+                for field in BOOK_FIELDS:
+                    setattr(book, field, row[field])
+                changed.append(book)
+        if changed:
+            Book.objects.bulk_update(changed, BOOK_FIELDS)
+        stats['books_updated'] = len(changed)
+
+        new_rows = [row for isbn, row in by_isbn.items() if isbn not in existing]
+        Book.objects.bulk_create([
+            Book(isbn=row['isbn'], **{field: row[field] for field in BOOK_FIELDS})
+            for row in new_rows
+        ])
+        stats['books_created'] = len(new_rows)
+        book_ids = dict(Book.objects.filter(isbn__in=list(by_isbn)).values_list('isbn', 'id'))
+
+        added, stats['barcodes_rejected'] = _top_up_copies(by_isbn, book_ids)
+        stats['copies_created'] = sum(added.values())
+
+        # New books are not circulating yet, so their counters can simply be
+        # recomputed; existing ones get deltas like any other copy creation,
+        # and their new copies go to anyone waiting in the hold queue.
+        new_book_ids = [book_ids[row['isbn']] for row in new_rows]
+        if new_book_ids:
+            availability.refresh(new_book_ids)
+        for isbn, book in existing.items():
+            if added.get(book.id):
+                availability.adjust(book.id, total_copies=added[book.id], available_copies=added[book.id])
+                holds.serve_queue(book.id)
+
+    if stats['books_created'] or stats['books_updated']:
+        catalog_cache.invalidate()
+    return stats
+
+
+def _top_up_copies(by_isbn, book_ids):
+    # Creates listed barcodes that don't exist yet, then generated ones until
+    # each book has at least its requested number of copies. A listed barcode
+    # that already belongs to another book is rejected rather than replaced,
+    # since a label is already stuck on that copy. Returns
+    # ({book_id: copies created}, [rejection messages]).
+    listed = [barcode for row in by_isbn.values() for barcode in row['barcodes']]
+    owners = {
+        barcode: (book_id, isbn)
+        for barcode, book_id, isbn in (
+            BookCopy.objects.filter(barcode__in=listed).values_list('barcode', 'book_id', 'book__isbn')
+        )
+    }
+    current = dict(
+        BookCopy.objects.filter(book_id__in=list(book_ids.values()))
+        .values('book_id').annotate(n=Count('id')).order_by().values_list('book_id', 'n')
+    )
+
+    listed_copies, generated_copies = [], []
+    added = {}
+    rejected = []
+    for isbn, row in by_isbn.items():
+        book_id = book_ids[isbn]
+        barcodes = []
+        skipped = 0
+        for barcode in row['barcodes']:
+            owner_id, owner_isbn = owners.get(barcode, (book_id, isbn))
+            if owner_id != book_id:
+                rejected.append(f'barcode {barcode!r} for isbn {isbn!r} already belongs to isbn {owner_isbn!r}')
+                skipped += 1
+            elif barcode not in owners:
+                owners[barcode] = (book_id, isbn)
+                barcodes.append(barcode)
+        listed_copies.extend((book_id, barcode) for barcode in barcodes)
+        missing = row['copies'] - current.get(book_id, 0) - len(barcodes) - skipped
+        generated = [generate_barcode() for _ in range(max(missing, 0))]
+        generated_copies.extend((book_id, barcode) for barcode in generated)
+        if barcodes or generated:
+            added[book_id] = len(barcodes) + len(generated)
+
+    # Listed barcodes were checked above; one taken by a concurrent import
+    # fails the chunk, and replaying it reports the conflict.
+    BookCopy.objects.bulk_create([BookCopy(book_id=book_id, barcode=barcode) for book_id, barcode in listed_copies])
+    insert_copies(generated_copies)
+    return added, rejected
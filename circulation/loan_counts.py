@@ -0,0 +1,68 @@
+from django.db.models import Count, F, IntegerField
+from django.db.models.functions import Greatest
+
+from .models import Loan, Member
+from .penalties import case_by_id
+
+
+def claim(library_id):
+    # Counts one more open loan against the member unless they are at
+    # max_active_loans. The check and the increment are one statement, so
+    # concurrent checkouts cannot both take the last slot. Returns whether
+    # the slot was claimed; the caller's transaction gives it back on failure.
+    return bool(
+        Member.objects.filter(library_id=library_id, active_loan_count__lt=F('max_active_loans'))
+        .update(active_loan_count=F('active_loan_count') + 1)
+    )
+
+
+def release(member_id):
+    # A count that has already drifted to zero stays there rather than going
+    # negative, which active_loan_count (a PositiveIntegerField) cannot hold.
+    Member.objects.filter(id=member_id, active_loan_count__gt=0).update(active_loan_count=F('active_loan_count') - 1)
+
+
+def adjust_many(deltas_by_member):
+    # Applies {member_id: delta} in a single UPDATE, like penalties.adjust_balances.
+    # Counts are clamped at zero, as in release.
+    deltas_by_member = {member_id: delta for member_id, delta in deltas_by_member.items() if delta}
+    if deltas_by_member:
+        Member.objects.filter(id__in=list(deltas_by_member)).update(
+            active_loan_count=Greatest(F('active_loan_count') + case_by_id(deltas_by_member, '0', IntegerField()), 0),
+        )
+
+
+def computed_counts(member_ids):
+    counts = dict.fromkeys(member_ids, 0)
+    counts.update(
+        Loan.objects.filter(member_id__in=member_ids, status__in=Loan.OPEN_STATUSES)
+        .values('member_id').annotate(n=Count('id')).order_by()
+        .values_list('member_id', 'n')
+    )
+    return counts
+
+
+def find_drift(batch_size=1000):
+    # Yields (member_id, stored, expected) for every member whose stored
+    # count disagrees with their open loans.
+    last_id = 0
+    while True:
+        members = list(
+            Member.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'active_loan_count')[:batch_size]
+        )
+        if not members:
+            return
+        last_id = members[-1][0]
+        expected = computed_counts([member_id for member_id, _ in members])
+        for member_id, stored in members:
+            if stored != expected[member_id]:
+                yield member_id, stored, expected[member_id]
+
+
+def rebuild(batch_size=1000):
+    fixed = 0
+    for member_id, stored, expected in find_drift(batch_size):
+        # Only overwrite the value that was read, so a checkout or return
+        # landing in between is not lost; a skipped member shows up next run.
+        fixed += Member.objects.filter(id=member_id, active_loan_count=stored).update(active_loan_count=expected)
+    return fixed
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from circulation import archival
+
+
+class Command(BaseCommand):
+    help = 'Move returned loans older than the cutoff, with their penalty references, into the loan archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=None,
+            help='Archive loans returned more than this many days ago (default: LOAN_ARCHIVE_AFTER_DAYS).',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the loans that would be archived.')
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] is None:
+            age = archival.get_archive_after()
+        elif options['older_than_days'] < 0:
+            raise CommandError('--older-than-days must not be negative.')
+        else:
+            age = timezone.timedelta(days=options['older_than_days'])
+        before = timezone.now() - age
+
+        if options['dry_run']:
+            count = archival.archivable_loans(before).count()
+            self.stdout.write(f'{count} loans returned before {before:%Y-%m-%d %H:%M} would be archived.')
+            return
+
+        loans, penalties = archival.archive_loans(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {loans} loans and moved {penalties} penalty references.'))
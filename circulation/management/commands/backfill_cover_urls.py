@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from circulation import catalog_cache, covers
+
+
+class Command(BaseCommand):
+    help = 'Build the stored cover_urls of Cloudinary covers that have none.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild the URLs of every Cloudinary cover.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not settings.CLOUDINARY_STORAGE.get('CLOUD_NAME'):
+            raise CommandError('Cloudinary is not configured; set CLOUDINARY_CLOUD_NAME first.')
+        updated = covers.backfill_cloudinary_urls(options['all'], options['batch_size'])
+        if updated:
+            catalog_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Stored cover URLs for {updated} books.'))
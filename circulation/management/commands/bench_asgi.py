@@ -0,0 +1,178 @@
+import asyncio
+import importlib
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from circulation.benchmarking import summarize, throwaway_database
+from circulation.models import Member
+from circulation.seeding import seed_dataset
+
+READ_PATHS = ('/api/books/', '/api/books/?page_size=50', '/api/members/', '/api/loans/', '/api/reservations/list/')
+
+
+def use_async_views(enabled):
+    # The read views are picked when the URLconf is imported, so switching
+    # profiles in-process means reloading it.
+    settings.ASYNC_READ_VIEWS = enabled
+    importlib.reload(importlib.import_module('circulation.urls'))
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare sustained throughput of the read endpoints served by a pool of sync WSGI workers '
+        'against the async views under a single ASGI event loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per profile.')
+        parser.add_argument('--workers', type=int, default=4, help='Sync workers, each serving one request at a time.')
+        parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight against the ASGI app.')
+        parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                            help='Simulated network round trip added to every query, as with a remote database.')
+        parser.add_argument('--books', type=int, default=200)
+        parser.add_argument('--members', type=int, default=100)
+        parser.add_argument('--loans', type=int, default=300)
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request (repeatable).')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or list(READ_PATHS)
+        latency = options['db_latency_ms'] / 1000
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+
+        def add_latency(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def install_latency(sender, connection, **kwargs):
+            if latency and add_latency not in connection.execute_wrappers:
+                connection.execute_wrappers.append(add_latency)
+
+        original = getattr(settings, 'ASYNC_READ_VIEWS', False)
+        connection_created.connect(install_latency)
+        # Requests run on many threads, which the in-memory database can't serve.
+        try:
+            with throwaway_database(file_backed=True):
+                seed_dataset(
+                    books=options['books'], copies_per_book=3, members=options['members'],
+                    loans=options['loans'], reservations=options['loans'] // 3,
+                )
+                Member.objects.update(max_active_loans=1000)
+                requests = [paths[i % len(paths)] for i in range(options['requests'])]
+
+                use_async_views(False)
+                results = {'wsgi': self.run_wsgi(requests, options['workers'], host)}
+                use_async_views(True)
+                results['asgi'] = asyncio.run(self.run_asgi(requests, options['concurrency'], host))
+        finally:
+            connection_created.disconnect(install_latency)
+            use_async_views(original)
+
+        self.report(results, options)
+
+    def run_wsgi(self, requests, workers, host):
+        application = get_wsgi_application()
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def call(path):
+            url = urlsplit(path)
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': url.path, 'QUERY_STRING': url.query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': host, 'SERVER_PORT': '443', 'HTTP_HOST': host, 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'https',
+                'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            }
+            status = []
+            start = time.perf_counter()
+            body = b''.join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not status[0].startswith('200'):
+                    errors.append(f'{path}: {status[0]} {body[:200]!r}')
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(call, requests))
+        return self.summary(latencies, errors, time.perf_counter() - start)
+
+    async def run_asgi(self, requests, concurrency, host):
+        # The middleware stack library_checkout/asgi.py serves, without the
+        # sync-only static files middleware.
+        with override_settings(MIDDLEWARE=[
+            name for name in settings.MIDDLEWARE if name != 'whitenoise.middleware.WhiteNoiseMiddleware'
+        ]):
+            application = get_asgi_application()
+        latencies = []
+        errors = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(path):
+            url = urlsplit(path)
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'https', 'path': url.path, 'raw_path': url.path.encode(), 'root_path': '',
+                'query_string': url.query.encode(), 'headers': [(b'host', host.encode())],
+                'server': (host, 443), 'client': ('127.0.0.1', 0),
+            }
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            async with semaphore:
+                start = time.perf_counter()
+                await application(scope, receive, send)
+                latencies.append(time.perf_counter() - start)
+            status = messages[0]['status']
+            if status != 200:
+                body = b''.join(message.get('body', b'') for message in messages[1:])
+                errors.append(f'{path}: {status} {body[:200]!r}')
+
+        start = time.perf_counter()
+        await asyncio.gather(*(call(path) for path in requests))
+        return self.summary(latencies, errors, time.perf_counter() - start)
+
+    def summary(self, latencies, errors, elapsed):
+        stats = {key: value * 1000 if key != 'count' else value for key, value in summarize(latencies).items()}
+        stats.update({'elapsed_s': elapsed, 'throughput_rps': len(latencies) / elapsed, 'errors': len(errors)})
+        for error in errors[:5]:
+            self.stderr.write(error)
+        return stats
+
+    def report(self, results, options):
+        if options['json']:
+            self.stdout.write(json.dumps({'options': {
+                key: options[key] for key in ('requests', 'workers', 'concurrency', 'db_latency_ms')
+            }, 'results': results}, indent=2))
+            return
+        self.stdout.write(
+            f"{options['requests']} requests, {options['workers']} WSGI workers vs {options['concurrency']} "
+            f"in flight on ASGI, {options['db_latency_ms']} ms simulated DB latency"
+        )
+        for label, stats in results.items():
+            self.stdout.write(
+                f"{label}: {stats['throughput_rps']:.0f} req/s, p50 {stats['p50']:.1f} ms, "
+                f"p95 {stats['p95']:.1f} ms, p99 {stats['p99']:.1f} ms, {stats['errors']} errors"
+            )
+        ratio = results['asgi']['throughput_rps'] / results['wsgi']['throughput_rps']
+        self.stdout.write(self.style.SUCCESS(f'ASGI throughput is {ratio:.2f}x WSGI'))
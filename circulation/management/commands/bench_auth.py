@@ -0,0 +1,109 @@
+import json
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import User
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from circulation.auth_tokens import TokenAuthenticationMiddleware, issue_token
+from circulation.benchmarking import summarize, throwaway_database
+from circulation.models import Member, UserProfile
+
+BENCH_PASSWORD = 'bench-password'
+
+
+def role_checked_view(request):
+    # What an authenticated, role-checked view needs from authentication: the
+    # user id and the user type.
+    user = request.user
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    user_type = getattr(user, 'user_type', None)
+    if user_type is None:
+        user_type = UserProfile.objects.get(user_id=user.id).user_type
+    return HttpResponse(user_type)
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request authentication overhead of DB-backed sessions against stateless signed tokens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                            help='Simulated network round trip added to every query, as with a remote database.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        latency = options['db_latency_ms'] / 1000
+
+        def add_latency(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        factory = RequestFactory()
+        with throwaway_database(), override_settings(AUTH_TOKENS_ENABLED=True):
+            user = User.objects.create_user('bench-auth', password=BENCH_PASSWORD)
+            UserProfile.objects.create(user=user, user_type='MEMBER')
+            member = Member.objects.create(user=user, library_id='BENCH-AUTH')
+
+            client = Client()
+            client.force_login(user)
+            session_cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+            token, _ = issue_token(user.id, member.id, 'MEMBER')
+
+            profiles = {
+                'session': (
+                    SessionMiddleware(AuthenticationMiddleware(role_checked_view)),
+                    lambda: self.with_cookie(factory.get('/api/me/'), session_cookie),
+                ),
+                'token': (
+                    TokenAuthenticationMiddleware(role_checked_view),
+                    lambda: factory.get('/api/me/', HTTP_AUTHORIZATION=f'Bearer {token}'),
+                ),
+            }
+            results = {}
+            with connection.execute_wrapper(add_latency) if latency else nullcontext():
+                for label, (handler, build) in profiles.items():
+                    results[label] = self.measure(handler, build, options['requests'])
+
+        self.report(results, options)
+
+    def with_cookie(self, request, session_key):
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = session_key
+        return request
+
+    def measure(self, handler, build, requests):
+        latencies, queries = [], []
+        for _ in range(requests):
+            request = build()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = handler(request)
+                latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+            queries.append(len(captured))
+        stats = {key: value * 1e6 if key != 'count' else value for key, value in summarize(latencies).items()}
+        stats['queries_per_request'] = sum(queries) / len(queries)
+        return stats
+
+    def report(self, results, options):
+        if options['json']:
+            self.stdout.write(json.dumps({'options': {
+                key: options[key] for key in ('requests', 'db_latency_ms')
+            }, 'results': results}, indent=2))
+            return
+        self.stdout.write(f"{options['requests']} requests per profile, {options['db_latency_ms']} ms simulated DB latency")
+        for label, stats in results.items():
+            self.stdout.write(
+                f"{label}: mean {stats['mean']:.1f} us, p50 {stats['p50']:.1f} us, p99 {stats['p99']:.1f} us, "
+                f"{stats['queries_per_request']:.1f} queries/request"
+            )
+        ratio = results['session']['mean'] / results['token']['mean']
+        self.stdout.write(self.style.SUCCESS(f'Token authentication is {ratio:.1f}x cheaper per request'))
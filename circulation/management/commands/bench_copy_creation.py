@@ -0,0 +1,41 @@
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from circulation.benchmarking import throwaway_database, timed
+from circulation.models import Book, BookCopy
+from circulation.services import create_copies
+
+
+def create_copies_one_by_one(book_id, count):
+    # The previous BookCopyListCreateView.post loop, kept as the baseline.
+    created = []
+    for _ in range(count):
+        copy = BookCopy.objects.create(book_id=book_id, barcode=f"COPY-{uuid.uuid4().hex[:8].upper()}")
+        created.append(copy.barcode)
+    return created
+
+
+class Command(BaseCommand):
+    help = 'Compare per-copy latency of one-INSERT-per-copy creation against the batched bulk path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500, help='Copies per run.')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        with throwaway_database():
+            results = {}
+            for label, func in (('per-copy INSERT', create_copies_one_by_one), ('bulk_create', create_copies)):
+                runs = []
+                for i in range(options['repeat']):
+                    book = Book.objects.create(title=f'Bench {label} {i}', author='Bench', isbn=uuid.uuid4().hex[:13], category='Bench')
+                    elapsed, barcodes = timed(func, book.id, count)
+                    assert len(barcodes) == count
+                    runs.append(elapsed)
+                results[label] = min(runs)
+                self.stdout.write(f'{label}: {results[label] / count * 1000:.3f} ms/copy ({count} copies, best of {len(runs)})')
+
+        speedup = results['per-copy INSERT'] / results['bulk_create']
+        self.stdout.write(self.style.SUCCESS(f'bulk_create is {speedup:.1f}x faster per copy'))
@@ -0,0 +1,319 @@
+import json
+import logging
+import random
+import subprocess
+import time
+from itertools import count
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from circulation import urls as circulation_urls
+from circulation.benchmarking import summarize, throwaway_database
+from circulation.models import Book, Loan, Member, Reservation
+from circulation.seeding import seed_dataset
+
+BENCH_PASSWORD = 'bench-password'
+# Routes that can't be measured request/response style.
+SKIPPED_ROUTES = {
+    'circulation-events': 'long-lived event stream, ASGI only',
+}
+
+
+class Fixtures:
+    # Ids sampled from the database that the scenarios draw requests from.
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.unique = count()
+        self.book_ids = list(Book.objects.values_list('id', flat=True))
+        self.titles = list(Book.objects.values_list('title', flat=True)[:1000])
+        self.members = list(Member.objects.values_list('id', 'library_id'))
+        self.open_barcodes = list(
+            Loan.objects.filter(status__in=Loan.OPEN_STATUSES).values_list('copy__barcode', flat=True)
+        )
+        self.pending_reservations = list(Reservation.objects.filter(status='PENDING').values_list('id', flat=True))
+        self.rng.shuffle(self.open_barcodes)
+        self.rng.shuffle(self.pending_reservations)
+
+        suffix = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        self.user = User.objects.create_user(f'bench-{suffix}', password=BENCH_PASSWORD)
+        self.member = Member.objects.create(user=self.user, library_id=f'BENCH-{suffix}', max_active_loans=10 ** 6)
+        self.spare_user_ids = []
+        self.suffix = suffix
+
+    def book(self):
+        return self.rng.choice(self.book_ids)
+
+    def library_id(self):
+        return self.rng.choice(self.members)[1]
+
+    def member_id(self):
+        return self.rng.choice(self.members)[0]
+
+    def next(self):
+        return f'{self.suffix}-{next(self.unique)}'
+
+    def spare_user(self):
+        # Each member-create request needs a user without a member profile.
+        if not self.spare_user_ids:
+            names = [f'bench-spare-{self.next()}' for _ in range(100)]
+            User.objects.bulk_create([User(username=name, password='!') for name in names])
+            self.spare_user_ids = list(User.objects.filter(username__in=names).values_list('id', flat=True))
+        return self.spare_user_ids.pop()
+
+
+def scenarios(fx):
+    # route name -> [(label, request builder)]. A builder returns
+    # (method, path, json body or None, accepted status codes).
+    return {
+        'health-check': [('GET health', lambda: ('get', '/api/health/', None, {200}))],
+        'cache-stats': [('GET cache stats', lambda: ('get', '/api/cache/stats/', None, {200}))],
+        'metrics': [('GET metrics', lambda: ('get', '/api/metrics/', None, {200}))],
+        'book-list-create': [
+            ('GET books (full)', lambda: ('get', '/api/books/', None, {200})),
+            ('GET books (page)', lambda: ('get', '/api/books/?page_size=50&ordering=title', None, {200})),
+            ('POST book', lambda: ('post', '/api/books/', {
+                'title': f'Bench {fx.next()}', 'author': 'Bench', 'isbn': fx.next()[-13:], 'category': 'Bench',
+            }, {201})),
+        ],
+        'book-search': [
+            ('GET search', lambda: ('get', f'/api/books/search/?q={fx.rng.choice(fx.titles).split()[0]}', None, {200})),
+        ],
+        'book-copy-list-create': [
+            ('GET copies', lambda: ('get', f'/api/books/{fx.book()}/copies/', None, {200})),
+            ('POST copies', lambda: ('post', f'/api/books/{fx.book()}/copies/', {'count': 1}, {201})),
+        ],
+        'member-list-create': [
+            ('GET members', lambda: ('get', '/api/members/', None, {200})),
+            ('POST member', lambda: ('post', '/api/members/', {
+                'user_id': fx.spare_user(), 'library_id': f'BENCH-{fx.next()}',
+            }, {201})),
+        ],
+        'me': [('GET me', lambda: ('get', '/api/me/', None, {200}))],
+        'loan-list': [
+            ('GET loans (member)', lambda: ('get', f'/api/loans/?member_id={fx.member_id()}', None, {200})),
+            ('GET loans (all)', lambda: ('get', '/api/loans/', None, {200})),
+        ],
+        'loan-history': [
+            ('GET history (member)', lambda: ('get', f'/api/loans/history/?member_id={fx.member_id()}', None, {200})),
+            ('GET history (page)', lambda: ('get', '/api/loans/history/?page_size=50', None, {200})),
+        ],
+        'loan-checkout': [
+            ('POST checkout', lambda: ('post', '/api/loans/checkout/', {
+                'library_id': fx.member.library_id, 'book_id': fx.book(),
+            }, {201, 400})),
+        ],
+        'loan-return': [
+            ('POST return (barcode)', lambda: ('post', '/api/loans/return/', {
+                'barcode': fx.open_barcodes.pop() if fx.open_barcodes else 'missing',
+            }, {200, 404})),
+        ],
+        'loan-batch': [
+            ('POST batch (10 checkouts)', lambda: ('post', '/api/loans/batch/', {
+                'library_id': fx.member.library_id,
+                'operations': [{'op': 'checkout', 'book_id': fx.book()} for _ in range(10)],
+            }, {200})),
+        ],
+        'reservation-create': [
+            ('POST reservation', lambda: ('post', '/api/reservations/', {
+                'library_id': fx.library_id(), 'book_id': fx.book(),
+            }, {201, 400})),
+        ],
+        'reservation-list': [
+            ('GET reservations (member)', lambda: ('get', f'/api/reservations/list/?member_id={fx.member_id()}', None, {200})),
+            ('GET reservations (all)', lambda: ('get', '/api/reservations/list/', None, {200})),
+        ],
+        'reservation-cancel': [
+            ('POST cancel', lambda: ('post', '/api/reservations/{}/cancel/'.format(
+                fx.pending_reservations.pop() if fx.pending_reservations else 0
+            ), None, {200, 400, 404})),
+        ],
+        'signup': [
+            ('POST signup', lambda: ('post', '/api/signup/', {'username': f'bench-{fx.next()}', 'password': BENCH_PASSWORD}, {201})),
+        ],
+        'signin': [
+            ('POST signin', lambda: ('post', '/api/signin/', {'username': fx.user.username, 'password': BENCH_PASSWORD}, {200})),
+        ],
+        'signout': [('POST signout', lambda: ('post', '/api/signout/', None, {200}))],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every route in circulation/urls.py through the test client: p50/p95/p99 latency, '
+        'queries per request and throughput. Use --output/--compare to track regressions between commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario.')
+        parser.add_argument('--only', action='append', help='Run only scenarios whose label contains this text.')
+        parser.add_argument('--existing', action='store_true',
+                            help='Run against the configured database (e.g. filled by seed_bench) instead of a '
+                                 'throwaway one. Write scenarios modify it.')
+        parser.add_argument('--books', type=int, default=2000)
+        parser.add_argument('--copies-per-book', type=int, default=3)
+        parser.add_argument('--members', type=int, default=1000)
+        parser.add_argument('--loans', type=int, default=20000)
+        parser.add_argument('--reservations', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+        parser.add_argument('--compare', help='JSON report from an earlier run to compare p95 latency against.')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Percent p95 slowdown that counts as a regression (as does half a query more per request).')
+
+    def handle(self, *args, **options):
+        if options['existing']:
+            report = self.run(options, dataset=None)
+        else:
+            with throwaway_database():
+                dataset = seed_dataset(
+                    books=options['books'], copies_per_book=options['copies_per_book'], members=options['members'],
+                    loans=options['loans'], reservations=options['reservations'], seed=options['seed'],
+                )
+                report = self.run(options, dataset)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+        if options['compare']:
+            self.compare(report, options['compare'], options['threshold'])
+
+    def run(self, options, dataset):
+        fx = Fixtures(random.Random(options['seed']))
+        anonymous = Client(HTTP_HOST=self.host())
+        member_client = Client(HTTP_HOST=self.host())
+        member_client.force_login(fx.user)
+        by_route = scenarios(fx)
+
+        results = []
+        missing = []
+        # Rejected requests are expected in some scenarios; don't log each one.
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            self.run_scenarios(options, by_route, anonymous, member_client, results, missing)
+        finally:
+            request_logger.setLevel(previous_level)
+
+        return {
+            'revision': git_revision(),
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': dataset or 'existing',
+            'requests_per_scenario': options['requests'],
+            'missing_scenarios': missing,
+            'results': results,
+        }
+
+    def run_scenarios(self, options, by_route, anonymous, member_client, results, missing):
+        for pattern in circulation_urls.urlpatterns:
+            route = pattern.name
+            if route in SKIPPED_ROUTES:
+                results.append({'route': route, 'scenario': None, 'skipped': SKIPPED_ROUTES[route]})
+                continue
+            if route not in by_route:
+                missing.append(route)
+                continue
+            for label, build in by_route[route]:
+                if options['only'] and not any(text in label for text in options['only']):
+                    continue
+                client = member_client if route == 'me' else anonymous
+                results.append(self.measure(client, route, label, build, options))
+
+    def measure(self, client, route, label, build, options):
+        for _ in range(options['warmup']):
+            self.request(client, build())
+        latencies, queries, errors = [], [], []
+        start = time.perf_counter()
+        for _ in range(options['requests']):
+            method, path, body, accepted = build()
+            with CaptureQueriesContext(connection) as captured:
+                began = time.perf_counter()
+                response = self.request(client, (method, path, body, accepted))
+                latencies.append(time.perf_counter() - began)
+            queries.append(len(captured))
+            if response.status_code not in accepted:
+                errors.append(f'{method.upper()} {path}: {response.status_code}')
+        elapsed = time.perf_counter() - start
+
+        for error in errors[:3]:
+            self.stderr.write(f'{label}: unexpected {error}')
+        stats = summarize(latencies)
+        return {
+            'route': route,
+            'scenario': label,
+            'p50_ms': stats['p50'] * 1000,
+            'p95_ms': stats['p95'] * 1000,
+            'p99_ms': stats['p99'] * 1000,
+            'mean_ms': stats['mean'] * 1000,
+            'queries_per_request': sum(queries) / len(queries) if queries else 0,
+            'max_queries': max(queries, default=0),
+            'throughput_rps': len(latencies) / elapsed if elapsed else 0,
+            'errors': len(errors),
+        }
+
+    def request(self, client, spec):
+        method, path, body, _ = spec
+        if method == 'get':
+            return client.get(path, secure=True)
+        return client.post(path, json.dumps(body) if body is not None else '', content_type='application/json', secure=True)
+
+    def host(self):
+        return next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+
+    def print_report(self, report):
+        self.stdout.write(f"revision {report['revision']}, {report['database']}, dataset {report['dataset']}")
+        self.stdout.write(f"{'scenario':32} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'req/s':>8} {'errors':>6}")
+        for result in report['results']:
+            if result.get('skipped'):
+                self.stdout.write(f"{result['route']:32} skipped: {result['skipped']}")
+                continue
+            self.stdout.write(
+                f"{result['scenario']:32} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} {result['p99_ms']:8.2f} "
+                f"{result['queries_per_request']:8.1f} {result['throughput_rps']:8.0f} {result['errors']:6d}"
+            )
+        for route in report['missing_scenarios']:
+            self.stderr.write(self.style.WARNING(f'No benchmark scenario for route {route!r}'))
+
+    def compare(self, report, baseline_path, threshold):
+        with open(baseline_path) as f:
+            baseline = {result['scenario']: result for result in json.load(f)['results'] if result.get('scenario')}
+        regressions = []
+        for result in report['results']:
+            before = baseline.get(result.get('scenario'))
+            if not before:
+                continue
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            line = (
+                f"{result['scenario']:32} p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms ({change:+.0f}%), "
+                f"queries {before['queries_per_request']:.1f} -> {result['queries_per_request']:.1f}"
+            )
+            if change > threshold or result['queries_per_request'] > before['queries_per_request'] + 0.5:
+                regressions.append(line)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f'{len(regressions)} scenario(s) regressed against {baseline_path}')
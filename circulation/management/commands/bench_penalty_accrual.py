@@ -0,0 +1,89 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from circulation.benchmarking import throwaway_database, timed
+from circulation.models import BookCopy, Loan, Member, Penalty
+from circulation.penalties import find_balance_drift, overdue_charge, overdue_reason
+from circulation.seeding import seed_dataset
+from circulation.sweeper import accrue_penalties
+
+
+def accrue_one_by_one(loans, now):
+    # The obvious per-loan loop, kept as the baseline: look up the accruing
+    # penalty, save it, bump the member's balance.
+    for loan in loans:
+        hours, amount = overdue_charge(loan.due_date, now)
+        with transaction.atomic():
+            penalty = Penalty.objects.filter(loan_id=loan.id, accruing=True).first()
+            previous = penalty.amount if penalty else 0
+            if penalty is None:
+                penalty = Penalty(member_id=loan.member_id, loan_id=loan.id, accruing=True)
+            penalty.amount, penalty.reason = amount, overdue_reason(hours)
+            penalty.save()
+            Member.objects.filter(id=loan.member_id).update(outstanding_balance=F('outstanding_balance') + amount - previous)
+
+
+class Command(BaseCommand):
+    help = 'Time the set-based penalty accrual job over many overdue loans against a per-loan loop.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=100000, help='Overdue loans to accrue.')
+        parser.add_argument('--members', type=int, default=20000)
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'SWEEPER_BATCH_SIZE', 500))
+        parser.add_argument('--baseline-sample', type=int, default=1500,
+                            help='Loans to run the per-loan loop over; its time is scaled to --loans.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        count = options['loans']
+        rng = random.Random(options['seed'])
+        with throwaway_database():
+            seed_dataset(books=-(-count // 3), copies_per_book=3, members=options['members'], loans=0, reservations=0)
+            now = timezone.now()
+            member_ids = list(Member.objects.values_list('id', flat=True))
+            copy_ids = list(BookCopy.objects.values_list('id', flat=True)[:count])
+            Loan.objects.bulk_create([
+                Loan(
+                    copy_id=copy_id, member_id=rng.choice(member_ids), status='OVERDUE',
+                    loan_date=now - timedelta(days=30), due_date=now - timedelta(minutes=rng.randrange(1, 14400)),
+                )
+                for copy_id in copy_ids
+            ], batch_size=5000)
+            BookCopy.objects.filter(id__in=copy_ids).update(status='ON_LOAN')
+            self.stdout.write(f'{len(copy_ids)} overdue loans across {len(member_ids)} members, batch size {options["batch_size"]}')
+
+            runs = (
+                ('first accrual (inserts)', now),
+                ('same hour again (reads only)', now),
+                ('an hour later (updates)', now + timedelta(hours=1)),
+            )
+            for label, at in runs:
+                # The query log is capped; start every measurement empty.
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    elapsed, result = timed(accrue_penalties, at, options['batch_size'])
+                self.stdout.write(
+                    f"{label}: {elapsed:.2f}s, {len(copy_ids) / elapsed:,.0f} loans/s, {len(queries)} queries, "
+                    f"{result['created']} created, {result['updated']} updated"
+                )
+
+            drift = list(find_balance_drift())
+            if drift:
+                raise CommandError(f'{len(drift)} member balances disagree with their penalties.')
+
+            sample = list(Loan.objects.filter(status='OVERDUE').only('id', 'member_id', 'due_date')[:options['baseline_sample']])
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as queries:
+                elapsed, _ = timed(accrue_one_by_one, sample, now + timedelta(hours=2))
+            scaled = elapsed / len(sample) * len(copy_ids)
+            self.stdout.write(
+                f'per-loan loop: {len(sample) / elapsed:,.0f} loans/s ({len(queries) / len(sample):.1f} queries per loan), '
+                f'about {scaled:.1f}s for {len(copy_ids)} loans'
+            )
@@ -0,0 +1,94 @@
+import gc
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test.utils import override_settings
+
+from circulation import serializers
+from circulation.benchmarking import throwaway_database, timed
+from circulation.models import Book, Loan, Reservation
+from circulation.seeding import seed_dataset
+from circulation.serializers import BOOK_ROWS, LOAN_ROWS, RESERVATION_ROWS, cover_image_url, dumps
+
+# payload -> (queryset, serializer, cover key added by the previous views)
+PAYLOADS = {
+    'books': (lambda: Book.objects.order_by('id'), BOOK_ROWS, 'cover_image'),
+    'loans': (lambda: Loan.objects.order_by('id'), LOAN_ROWS, 'copy__book__cover_image'),
+    'reservations': (lambda: Reservation.objects.order_by('id'), RESERVATION_ROWS, 'book__cover_image'),
+}
+
+
+def legacy_rows(queryset, serializer, cover_key):
+    # The previous list views: .values() dicts patched in a Python loop.
+    source = next(iter(serializer.computed.values()))[1]
+    rows = list(queryset.values(*serializer.fields))
+    for row in rows:
+        row[cover_key] = cover_image_url(row[source])
+    return rows
+
+
+def legacy_encode(rows):
+    # JsonResponse's encoder.
+    return json.dumps(rows, cls=DjangoJSONEncoder).encode()
+
+
+def serializer_rows(queryset, serializer, cover_key):
+    return serializer.many(serializer.values(queryset))
+
+
+class Command(BaseCommand):
+    help = 'Compare per-10k-row cost of the row serializers and JSON backends against .values() dicts with DjangoJSONEncoder.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per payload.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        variants = [('values() + DjangoJSONEncoder', legacy_rows, legacy_encode, None)]
+        variants.append(('RowSerializer + json', serializer_rows, dumps, 'json'))
+        if serializers.orjson is not None:
+            variants.append(('RowSerializer + orjson', serializer_rows, dumps, 'orjson'))
+        else:
+            self.stderr.write('orjson is not installed; only the stdlib backend is measured.')
+
+        results = {}
+        with throwaway_database():
+            rows = options['rows']
+            seed_dataset(books=rows, copies_per_book=1, members=max(rows // 10, 1), loans=rows, reservations=rows)
+            for payload, (get_queryset, serializer, cover_key) in PAYLOADS.items():
+                count = get_queryset().count()
+                # Variants take turns within each repeat so drift on a busy
+                # machine affects them all alike.
+                runs = {label: ([], []) for label, *_ in variants}
+                for _ in range(options['repeat']):
+                    for label, build, encode, backend in variants:
+                        gc.collect()
+                        with override_settings(JSON_BACKEND=backend or 'json'):
+                            fetch_time, data = timed(build, get_queryset(), serializer, cover_key)
+                            encode_time, body = timed(encode, data)
+                        runs[label][0].append(fetch_time)
+                        runs[label][1].append(encode_time)
+                scale = 10000 / count * 1000
+                results[payload] = {
+                    label: {
+                        'rows': count,
+                        'fetch_ms_per_10k': min(fetch_runs) * scale,
+                        'encode_ms_per_10k': min(encode_runs) * scale,
+                        'total_ms_per_10k': (min(fetch_runs) + min(encode_runs)) * scale,
+                    }
+                    for label, (fetch_runs, encode_runs) in runs.items()
+                }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for payload, variant_results in results.items():
+            baseline = variant_results['values() + DjangoJSONEncoder']['total_ms_per_10k']
+            self.stdout.write(f"{payload} ({variant_results['values() + DjangoJSONEncoder']['rows']} rows), ms per 10k rows:")
+            for label, stats in variant_results.items():
+                self.stdout.write(
+                    f"  {label:<30} query+rows {stats['fetch_ms_per_10k']:7.1f}  encode {stats['encode_ms_per_10k']:7.1f}  "
+                    f"total {stats['total_ms_per_10k']:7.1f}  ({baseline / stats['total_ms_per_10k']:.1f}x)"
+                )
@@ -0,0 +1,84 @@
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from circulation.db_routing import PIN_COOKIE, ReplicaRoutingMiddleware, get_replicas
+from circulation.models import Book
+
+REPLICA = 'a replica'
+
+
+def read_one_book(request):
+    Book.objects.values_list('id', flat=True).first()
+    return HttpResponse()
+
+
+def read_one_book_in_transaction(request):
+    with transaction.atomic():
+        return read_one_book(request)
+
+
+class Command(BaseCommand):
+    help = 'Check that requests read from the configured replicas and the primary as DATABASE_REPLICA_URLS intends.'
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError('No replicas configured; set DATABASE_REPLICA_URLS.')
+        factory = RequestFactory()
+        aliases = [DEFAULT_DB_ALIAS, *replicas]
+
+        def served_by(view, request):
+            # Runs the request through the middleware and returns the aliases
+            # that ran its queries, plus the response.
+            with ExitStack() as stack:
+                captured = {
+                    alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in aliases
+                }
+                response = ReplicaRoutingMiddleware(view)(request)
+            return [alias for alias, context in captured.items() if len(context)], response
+
+        def with_pin(request, expires):
+            request.COOKIES[PIN_COOKIE] = f'{expires:.3f}'
+            return request
+
+        _, post_response = served_by(read_one_book, factory.post('/api/loans/checkout/'))
+        pin = post_response.cookies.get(PIN_COOKIE)
+        checks = [
+            ('GET reads from a replica', read_one_book, factory.get('/api/books/'), REPLICA),
+            ('POST reads and writes on the primary', read_one_book, factory.post('/api/loans/checkout/'), DEFAULT_DB_ALIAS),
+            ('GET inside a transaction stays on the primary', read_one_book_in_transaction, factory.get('/api/books/'),
+             DEFAULT_DB_ALIAS),
+            ('GET within the pin window reads from the primary', read_one_book,
+             with_pin(factory.get('/api/books/'), time.time() + 60), DEFAULT_DB_ALIAS),
+            ('GET after the pin window reads from a replica', read_one_book,
+             with_pin(factory.get('/api/books/'), time.time() - 1), REPLICA),
+        ]
+
+        failures = 0
+        for label, view, request, expected in checks:
+            try:
+                used, _ = served_by(view, request)
+            except DatabaseError as e:
+                raise CommandError(f'{label}: {e} (is the replica migrated, or a copy of the primary?)')
+            ok = used == [DEFAULT_DB_ALIAS] if expected == DEFAULT_DB_ALIAS else (
+                len(used) == 1 and used[0] in replicas
+            )
+            failures += not ok
+            self.stdout.write(f"{label}: {', '.join(used) or 'no queries'} {'OK' if ok else 'FAILED'}")
+
+        writes_ok = router.db_for_write(Book) == DEFAULT_DB_ALIAS
+        failures += not writes_ok
+        self.stdout.write(f"Writes go to the primary: {'OK' if writes_ok else 'FAILED'}")
+        pin_ok = pin is not None and int(pin['max-age']) > 0
+        failures += not pin_ok
+        self.stdout.write(f"POST pins its client to the primary: {'OK' if pin_ok else 'FAILED'}")
+
+        if failures:
+            raise CommandError(f'{failures} routing checks failed.')
+        self.stdout.write(self.style.SUCCESS(f'Reads are routed across {len(replicas)} replica(s) as configured.'))
@@ -0,0 +1,177 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from circulation import archival, sweeper
+from circulation.benchmarking import throwaway_database
+from circulation.models import BookCopy, Loan, Member, Reservation
+from circulation.seeding import seed_dataset
+
+FULL_SCAN_PATTERNS = {
+    # FTS5 MATCH lookups show up as a SCAN of the virtual table with a match
+    # constraint (":M"); that is the full-text index, not a table scan.
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING\b.*\bINDEX\b)(?!.*\bPRIMARY KEY\b)(?!\S+ VIRTUAL TABLE INDEX \d+:\S*M)(\S+)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\S+)'),
+}
+# Subqueries and window results the plan builds itself; reading those back is
+# not a table scan.
+DERIVED_TABLE = re.compile(r'\b(?:CO-ROUTINE|MATERIALIZE) (\S+)')
+# Only these statements have plans worth checking; inserts and transaction
+# control are skipped.
+PLANNED_STATEMENT = re.compile(r'\s*(SELECT|UPDATE|DELETE)\b', re.IGNORECASE)
+# Literals, so repeats of a statement with other values are explained once.
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Rollback(Exception):
+    pass
+
+
+def hot_paths():
+    # name -> function running one circulation code path: through its URL
+    # where it has one, otherwise through the function its command or the
+    # sweeper calls. The checked queries are captured from these runs, so
+    # they are the ones the code sends rather than copies of them. Unfiltered
+    # list endpoints are full scans by design and are not run.
+    now = timezone.now()
+    loan = Loan.objects.filter(status='ACTIVE').select_related('copy', 'member').order_by('id').first()
+    member = Member.objects.filter(active_loan_count__lt=F('max_active_loans')).order_by('id').first()
+    shelved_book_id = BookCopy.objects.filter(status='AVAILABLE').values_list('book_id', flat=True).first()
+    hold = Reservation.objects.filter(status='PENDING', expires_at__gt=now).order_by('id').first()
+    # Nearly every seeded loan that is still out is long overdue. A sweep just
+    # after the first few fell due touches a handful of members, as a sweep
+    # on a schedule does, instead of the whole seeded backlog.
+    sweep_at = Loan.objects.filter(status='ACTIVE').order_by('due_date').values_list('due_date', flat=True)[20]
+    client = Client()
+
+    def get(url, **params):
+        return client.get(url, params)
+
+    def post(url, data=None):
+        return client.post(url, json.dumps(data or {}), content_type='application/json')
+
+    def pages(url, **params):
+        # The first page and the one its cursor leads to.
+        response = get(url, page_size=20, **params)
+        return response, get(url, page_size=20, cursor=response.json()['next'], **params)
+
+    return {
+        'checkout': lambda: post('/api/loans/checkout/', {'library_id': member.library_id, 'book_id': shelved_book_id}),
+        'return': lambda: post('/api/loans/return/', {'library_id': loan.member.library_id, 'book_id': loan.copy.book_id}),
+        'return_by_barcode': lambda: post('/api/loans/return/', {'barcode': loan.copy.barcode}),
+        'loan_batch': lambda: post('/api/loans/batch/', {'operations': [
+            {'op': 'return', 'library_id': loan.member.library_id, 'book_id': loan.copy.book_id},
+            {'op': 'checkout', 'library_id': member.library_id, 'book_id': shelved_book_id},
+        ]}),
+        'place_hold': lambda: post('/api/reservations/', {'library_id': member.library_id, 'book_id': loan.copy.book_id}),
+        'cancel_hold': lambda: post(f'/api/reservations/{hold.id}/cancel/'),
+        'me': lambda: get('/api/me/', member_id=loan.member_id),
+        'member_loans': lambda: get('/api/loans/', member_id=loan.member_id),
+        'member_reservations': lambda: get('/api/reservations/list/', member_id=hold.member_id),
+        'loan_history': lambda: pages('/api/loans/history/', member_id=loan.member_id),
+        'book_pages_by_title': lambda: pages('/api/books/', ordering='title'),
+        'book_copies': lambda: get(f'/api/books/{loan.copy.book_id}/copies/'),
+        'search': lambda: get('/api/books/search/', q='title 5'),
+        'expire_reservations': sweeper.expire_reservations,
+        'sweep': lambda: sweeper.sweep(now=sweep_at),
+        'archive_loans': archival.archive_loans,
+    }
+
+
+def captured_statements(path):
+    # Runs path in a transaction that is rolled back, so paths that write
+    # leave the seeded data as it was, and returns the distinct statements
+    # it sent that read or change rows.
+    with CaptureQueriesContext(connection) as queries:
+        try:
+            with transaction.atomic():
+                result = path()
+                for response in result if isinstance(result, tuple) else [result]:
+                    if getattr(response, 'status_code', 200) >= 400:
+                        raise CommandError(f'{response.request["PATH_INFO"]} answered {response.status_code}')
+                raise Rollback
+        except Rollback:
+            pass
+    statements = {}
+    for query in queries.captured_queries:
+        if PLANNED_STATEMENT.match(query['sql']):
+            statements.setdefault(LITERAL.sub('?', query['sql']), query['sql'])
+    return list(statements.values())
+
+
+def full_scans(plan, pattern):
+    # Names of the tables the plan reads in full.
+    derived = set(DERIVED_TABLE.findall(plan))
+    return [table for table in pattern.findall(plan) if table not in derived]
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def hot_query_plans():
+    # Yields (path name, sql, plan) for every statement the hot paths send.
+    with override_settings(ALLOWED_HOSTS=['testserver'], CACHES=NO_CACHE):
+        for name, path in hot_paths().items():
+            for sql in captured_statements(path):
+                yield name, sql, explain(sql)
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and fail if any hot circulation query plans a full table scan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=20000)
+        parser.add_argument('--members', type=int, default=5000)
+        parser.add_argument('--loans', type=int, default=100000)
+        parser.add_argument('--reservations', type=int, default=20000)
+        parser.add_argument('--keepdb', action='store_true', help='Reuse an existing test database.')
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Query plan checks are not supported on {connection.vendor}')
+
+        # Plans are checked against a test database so the real one is never
+        # seeded. The paths run through the views, which use the default
+        # database.
+        with throwaway_database(keepdb=options['keepdb']):
+            if not Loan.objects.exists():
+                self.stdout.write('Seeding dataset...')
+                seed_dataset(
+                    books=options['books'],
+                    members=options['members'],
+                    loans=options['loans'],
+                    reservations=options['reservations'],
+                )
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            failures = {}
+            counts = {}
+            for name, sql, plan in hot_query_plans():
+                counts[name] = counts.get(name, 0) + 1
+                full_scan = full_scans(plan, pattern)
+                if full_scan:
+                    failures.setdefault(name, []).append(sql)
+                if options['verbosity'] > 1 or full_scan:
+                    status = self.style.ERROR('FULL SCAN') if full_scan else self.style.SUCCESS('OK')
+                    self.stdout.write(f'{name}: {status}\n    {sql}')
+                    for line in plan.splitlines():
+                        self.stdout.write(f'        {line}')
+            for name, count in counts.items():
+                status = self.style.ERROR('FULL SCAN') if name in failures else self.style.SUCCESS('OK')
+                self.stdout.write(f'{name} ({count} queries): {status}')
+
+        if failures:
+            raise CommandError('Full table scans in: ' + ', '.join(failures))
+        self.stdout.write(self.style.SUCCESS(f'All query plans use indexes on {connection.vendor}.'))
@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from circulation.importer import InvalidRecord, chunked, import_chunk, normalize, read_records
+
+
+class Command(BaseCommand):
+    help = 'Stream books and copies from CSV or JSON-lines into the catalog, upserting on isbn.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Records committed per transaction.')
+        parser.add_argument('--checkpoint', help='Checkpoint file (defaults to <path>.checkpoint).')
+        parser.add_argument('--resume', action='store_true', help='Skip records already committed per the checkpoint.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        checkpoint_path = options['checkpoint'] or (None if path == '-' else f'{path}.checkpoint')
+
+        # The checkpoint records the input as an absolute path, so resuming
+        # from another directory still matches it.
+        source = path if path == '-' else os.path.abspath(path)
+        state = {
+            'path': source, 'records': 0, 'books_created': 0, 'books_updated': 0, 'copies_created': 0,
+            'barcodes_rejected': 0, 'invalid': 0,
+        }
+        if options['resume']:
+            if not checkpoint_path or not os.path.exists(checkpoint_path):
+                raise CommandError('No checkpoint to resume from.')
+            with open(checkpoint_path) as f:
+                saved = json.load(f)
+            if saved.get('path') != source:
+                raise CommandError(f"Checkpoint {checkpoint_path} is for {saved.get('path')!r}, not {source!r}.")
+            state.update(saved)
+            self.stdout.write(f"Resuming after {state['records']} records.")
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            self.run(stream, fmt, options['chunk_size'], state, checkpoint_path)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {state['records']} records: {state['books_created']} books created, "
+            f"{state['books_updated']} updated, {state['copies_created']} copies created, "
+            f"{state['barcodes_rejected']} barcodes rejected, {state['invalid']} invalid."
+        ))
+
+    def run(self, stream, fmt, chunk_size, state, checkpoint_path):
+        records = islice(read_records(stream, fmt), state['records'], None)
+        start = time.perf_counter()
+        imported = 0
+        for chunk in chunked(records, chunk_size):
+            rows = []
+            for position, record in enumerate(chunk, start=state['records'] + 1):
+                try:
+                    rows.append(normalize(record))
+                except InvalidRecord as e:
+                    state['invalid'] += 1
+                    self.stderr.write(f'Skipping record {position}: {e}')
+            if rows:
+                stats = import_chunk(rows)
+                for message in stats.pop('records_rejected'):
+                    state['invalid'] += 1
+                    self.stderr.write(f'Skipping {message}')
+                for message in stats.pop('barcodes_rejected'):
+                    state['barcodes_rejected'] += 1
+                    self.stderr.write(f'Rejected {message}')
+                for key, value in stats.items():
+                    state[key] += value
+
+            # The checkpoint is written only after the chunk has committed;
+            # replaying a chunk after a crash is harmless because imports are
+            # idempotent.
+            state['records'] += len(chunk)
+            imported += len(chunk)
+            if checkpoint_path:
+                self.write_checkpoint(checkpoint_path, state)
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{state['records']} records, {state['books_created']} books created, "
+                f"{state['copies_created']} copies created ({imported / elapsed:.0f} records/s)"
+            )
+
+    def write_checkpoint(self, checkpoint_path, state):
+        tmp_path = f'{checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, checkpoint_path)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from circulation import availability
+
+
+class Command(BaseCommand):
+    help = 'Verify and rebuild the per-book availability counters from copy and reservation rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift; exit non-zero if any is found.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            fixed = availability.rebuild(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt availability counters for {fixed} books.'))
+            return
+
+        drifted = 0
+        for book_id, stored, expected in availability.find_drift(options['batch_size']):
+            drifted += 1
+            self.stdout.write(f'Book {book_id}: stored {stored}, expected {expected}')
+        if drifted:
+            raise CommandError(f'{drifted} books have drifted availability counters.')
+        self.stdout.write(self.style.SUCCESS('Availability counters are consistent.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from circulation import penalties
+
+
+class Command(BaseCommand):
+    help = "Verify and rebuild members' outstanding balances from their unresolved penalties."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift; exit non-zero if any is found.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            fixed = penalties.rebuild_balances(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt outstanding balances for {fixed} members.'))
+            return
+
+        drifted = 0
+        for member_id, stored, expected in penalties.find_balance_drift(options['batch_size']):
+            drifted += 1
+            self.stdout.write(f'Member {member_id}: stored {stored}, expected {expected}')
+        if drifted:
+            raise CommandError(f'{drifted} members have drifted outstanding balances.')
+        self.stdout.write(self.style.SUCCESS('Outstanding balances are consistent.'))
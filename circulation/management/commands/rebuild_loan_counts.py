@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from circulation import loan_counts
+
+
+class Command(BaseCommand):
+    help = "Verify and rebuild members' active loan counts from their open loans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift; exit non-zero if any is found.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            fixed = loan_counts.rebuild(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt active loan counts for {fixed} members.'))
+            return
+
+        drifted = 0
+        for member_id, stored, expected in loan_counts.find_drift(options['batch_size']):
+            drifted += 1
+            self.stdout.write(f'Member {member_id}: stored {stored}, expected {expected}')
+        if drifted:
+            raise CommandError(f'{drifted} members have drifted active loan counts.')
+        self.stdout.write(self.style.SUCCESS('Active loan counts are consistent.'))
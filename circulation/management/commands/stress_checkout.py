@@ -0,0 +1,103 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+from django.db.models import Count
+
+from circulation import loan_counts
+from circulation.benchmarking import throwaway_database
+from circulation.models import BookCopy, Member, Loan
+from circulation.seeding import seed_dataset
+from circulation.services import CirculationError, checkout
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent checkouts against a throwaway database and verify no copy is loaned twice.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=200, help='Checkout attempts per thread.')
+        parser.add_argument('--books', type=int, default=20)
+        parser.add_argument('--copies-per-book', type=int, default=5)
+        parser.add_argument('--members', type=int, default=30)
+
+    def handle(self, *args, **options):
+        # Threads need a file-backed database; the in-memory SQLite test
+        # database fails concurrent writers instead of making them wait.
+        with throwaway_database(file_backed=True):
+            seed_dataset(
+                books=options['books'],
+                copies_per_book=options['copies_per_book'],
+                members=options['members'],
+                loans=0,
+                reservations=0,
+            )
+            book_ids = list(BookCopy.objects.values_list('book_id', flat=True).distinct())
+            library_ids = list(Member.objects.values_list('library_id', flat=True))
+            results = self.run_threads(options, book_ids, library_ids)
+            self.report(results)
+            self.verify()
+
+    def run_threads(self, options, book_ids, library_ids):
+        lock = threading.Lock()
+        results = {'checked_out': 0, 'rejected': 0, 'db_errors': 0, 'elapsed': 0.0}
+
+        def worker(seed):
+            rng = random.Random(seed)
+            counts = {'checked_out': 0, 'rejected': 0, 'db_errors': 0}
+            try:
+                for _ in range(options['attempts']):
+                    try:
+                        checkout(rng.choice(library_ids), rng.choice(book_ids))
+                        counts['checked_out'] += 1
+                    except CirculationError:
+                        counts['rejected'] += 1
+                    except DatabaseError:
+                        counts['db_errors'] += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    for key, value in counts.items():
+                        results[key] += value
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results['elapsed'] = time.perf_counter() - start
+        return results
+
+    def report(self, results):
+        attempts = results['checked_out'] + results['rejected'] + results['db_errors']
+        self.stdout.write(
+            f"{attempts} attempts in {results['elapsed']:.2f}s: "
+            f"{results['checked_out']} checked out, {results['rejected']} rejected, "
+            f"{results['db_errors']} database errors"
+        )
+        self.stdout.write(
+            f"Throughput: {attempts / results['elapsed']:.1f} attempts/s, "
+            f"{results['checked_out'] / results['elapsed']:.1f} checkouts/s"
+        )
+
+    def verify(self):
+        double_loans = Loan.objects.filter(status__in=Loan.OPEN_STATUSES).values('copy').annotate(n=Count('id')).filter(n__gt=1).count()
+        active_loans = Loan.objects.filter(status__in=Loan.OPEN_STATUSES).count()
+        on_loan = BookCopy.objects.filter(status='ON_LOAN').count()
+        over_limit = sum(
+            1 for member in Member.objects.all()
+            if Loan.objects.filter(member=member, status__in=Loan.OPEN_STATUSES).count() > member.max_active_loans
+        )
+        count_drift = len(list(loan_counts.find_drift()))
+        self.stdout.write(f'Copies with more than one active loan: {double_loans}')
+        self.stdout.write(f'Members over their loan limit: {over_limit}')
+        self.stdout.write(f'Members whose active_loan_count drifted: {count_drift}')
+        if double_loans or over_limit or count_drift or active_loans != on_loan:
+            raise CommandError(
+                f'Invariant violated: {double_loans} double loans, {over_limit} members over limit, '
+                f'{count_drift} drifted loan counts, {active_loans} active loans vs {on_loan} copies on loan'
+            )
+        self.stdout.write(self.style.SUCCESS('No double loans.'))
@@ -0,0 +1,46 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from circulation.sweeper import sweep
+
+logger = logging.getLogger('circulation.sweeper')
+
+
+class Command(BaseCommand):
+    help = 'Expire overdue reservations, mark overdue loans and accrue their penalties, once or in a loop.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=getattr(settings, 'SWEEPER_INTERVAL', 60))
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'SWEEPER_BATCH_SIZE', 500))
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            try:
+                result = sweep(options['batch_size'])
+            except Exception:
+                # One failed sweep (a lock timeout, a dropped connection) must
+                # not stop the worker; the next sweep retries whatever this
+                # one left undone.
+                if not options['loop']:
+                    raise
+                logger.exception('Sweep failed, retrying in %s seconds', options['interval'])
+            else:
+                if options['verbosity'] > 1 or any(result.values()):
+                    self.stdout.write(
+                        f"Expired {result['reservations_expired']} reservations, "
+                        f"marked {result['loans_overdue']} loans overdue, "
+                        f"accrued {result['penalties_created']} new and "
+                        f"{result['penalties_updated']} updated penalties."
+                    )
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,204 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse
+
+# Histogram upper bounds. Request and DB time are in seconds.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+UNMATCHED_ROUTE = 'unmatched'
+
+_current = ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+_histograms = {}
+_requests = {}
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+def time_query(execute, sql, params, many, context):
+    # Installed on every connection. The stats object lives in a context
+    # variable, so queries run by async views on worker threads still count
+    # towards the request that issued them.
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - start
+        stats.queries += 1
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def _observe(name, labels, buckets, value):
+    key = (name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms.setdefault(key, [[0] * (len(buckets) + 1), 0.0, buckets])
+    histogram[0][bisect.bisect_left(buckets, value)] += 1
+    histogram[1] += value
+
+
+def record(route, method, status, duration, stats):
+    labels = (('route', route), ('method', method))
+    with _lock:
+        _observe('library_request_duration_seconds', labels, DURATION_BUCKETS, duration)
+        _observe('library_request_db_seconds', labels, DURATION_BUCKETS, stats.db_time)
+        _observe('library_request_queries', labels, QUERY_BUCKETS, stats.queries)
+        key = labels + (('status', str(status)),)
+        _requests[key] = _requests.get(key, 0) + 1
+
+
+def _format_labels(labels):
+    return ','.join('{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"')) for name, value in labels)
+
+
+def render():
+    # Prometheus text exposition format (version 0.0.4).
+    with _lock:
+        histograms = {key: (list(counts), total, buckets) for key, (counts, total, buckets) in _histograms.items()}
+        requests = dict(_requests)
+
+    lines = [
+        '# HELP library_requests_total Requests handled by this process.',
+        '# TYPE library_requests_total counter',
+    ]
+    for labels, value in sorted(requests.items()):
+        lines.append(f'library_requests_total{{{_format_labels(labels)}}} {value}')
+
+    help_text = {
+        'library_request_duration_seconds': 'Time spent handling the request.',
+        'library_request_db_seconds': 'Time spent in database queries per request.',
+        'library_request_queries': 'Database queries per request.',
+    }
+    for name, text in help_text.items():
+        lines += [f'# HELP {name} {text}', f'# TYPE {name} histogram']
+        for (metric, labels), (counts, total, buckets) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            label_text = _format_labels(labels)
+            cumulative = 0
+            for bound, count in zip(buckets, counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_text}}} {total}')
+            lines.append(f'{name}_count{{{label_text}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _requests.clear()
+
+
+def _track(chunks, stats):
+    # Runs the body of a streamed response with the request's stats current,
+    # so the queries it runs (a streamed queryset runs them all) count
+    # towards the request like those of the view.
+    iterator = iter(chunks)
+    while True:
+        token = _current.set(stats)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _current.reset(token)
+        yield chunk
+
+
+async def _atrack(chunks, stats):
+    iterator = aiter(chunks)
+    while True:
+        token = _current.set(stats)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            _current.reset(token)
+        yield chunk
+
+
+class RequestMetricsMiddleware:
+    # Adds a Server-Timing header (db time with the query count, and total
+    # view time) to every response and feeds the per-route histograms served
+    # at /api/metrics/. Works in both sync and async middleware stacks.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, start)
+
+    def finish(self, request, response, stats, start):
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else UNMATCHED_ROUTE
+        # Headers go out before a streamed body, so for those Server-Timing
+        # covers the view alone.
+        duration = time.perf_counter() - start
+        response['Server-Timing'] = (
+            f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries", '
+            f'view;dur={duration * 1000:.2f}'
+        )
+        if not response.streaming:
+            record(route, request.method, response.status_code, duration, stats)
+            return response
+
+        # A streamed body is produced after this returns, so the request is
+        # recorded when the server closes the response, with the body's
+        # queries and time included. Files are left unwrapped so servers can
+        # still send them with sendfile; reading them runs no queries.
+        if not isinstance(response, FileResponse):
+            track = _atrack if response.is_async else _track
+            response.streaming_content = track(response.streaming_content, stats)
+        response._resource_closers.append(
+            lambda: record(route, request.method, response.status_code, time.perf_counter() - start, stats)
+        )
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circulation', '0005_book_title_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookcopy',
+            index=models.Index(fields=['book', 'status'], name='copy_book_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['member', 'status'], name='loan_member_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['copy', 'status'], name='loan_copy_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['due_date'], name='loan_active_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['book', 'member', 'status'], name='res_book_member_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['status', 'expires_at'], name='res_status_expires_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['book'], name='res_pending_book_idx'),
+        ),
+    ]
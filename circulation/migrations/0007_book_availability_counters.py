@@ -0,0 +1,53 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:06
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Book = apps.get_model('circulation', 'Book')
+    BookCopy = apps.get_model('circulation', 'BookCopy')
+    Reservation = apps.get_model('circulation', 'Reservation')
+
+    def count(model, **filters):
+        rows = model.objects.filter(book=OuterRef('pk'), **filters).order_by().values('book')
+        return Coalesce(Subquery(rows.annotate(n=Count('id')).values('n')), 0)
+
+    Book.objects.update(
+        total_copies=count(BookCopy),
+        available_copies=count(BookCopy, status='AVAILABLE'),
+        on_loan_copies=count(BookCopy, status='ON_LOAN'),
+        pending_reservations=count(Reservation, status='PENDING'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circulation', '0006_circulation_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='available_copies',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='on_loan_copies',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='pending_reservations',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='total_copies',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
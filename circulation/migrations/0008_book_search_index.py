@@ -0,0 +1,75 @@
+from django.db import migrations
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(isbn, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(category, '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(about, '')), 'D')"
+)
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE circulation_book_fts USING fts5(
+        title, author, isbn, category, about,
+        content='circulation_book', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER circulation_book_fts_ai AFTER INSERT ON circulation_book BEGIN
+        INSERT INTO circulation_book_fts(rowid, title, author, isbn, category, about)
+        VALUES (new.id, new.title, new.author, new.isbn, new.category, new.about);
+    END
+    """,
+    """
+    CREATE TRIGGER circulation_book_fts_ad AFTER DELETE ON circulation_book BEGIN
+        INSERT INTO circulation_book_fts(circulation_book_fts, rowid, title, author, isbn, category, about)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn, old.category, old.about);
+    END
+    """,
+    """
+    CREATE TRIGGER circulation_book_fts_au AFTER UPDATE OF title, author, isbn, category, about ON circulation_book BEGIN
+        INSERT INTO circulation_book_fts(circulation_book_fts, rowid, title, author, isbn, category, about)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn, old.category, old.about);
+        INSERT INTO circulation_book_fts(rowid, title, author, isbn, category, about)
+        VALUES (new.id, new.title, new.author, new.isbn, new.category, new.about);
+    END
+    """,
+    "INSERT INTO circulation_book_fts(circulation_book_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS circulation_book_fts_au',
+    'DROP TRIGGER IF EXISTS circulation_book_fts_ad',
+    'DROP TRIGGER IF EXISTS circulation_book_fts_ai',
+    'DROP TABLE IF EXISTS circulation_book_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX book_search_idx ON circulation_book USING GIN (({POSTGRES_VECTOR}))')
+    elif vendor == 'sqlite':
+        for statement in SQLITE_FORWARD:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS book_search_idx')
+    elif vendor == 'sqlite':
+        for statement in SQLITE_REVERSE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circulation', '0007_book_availability_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# circulation.covers as of this migration, frozen here so later changes to
+# that module cannot change what the migration writes or break it.
+THUMBNAIL_SIZES = {
+    'small': (64, 96),
+    'medium': (160, 240),
+    'large': (320, 480),
+}
+
+
+def cloudinary_urls(image):
+    urls = {'original': image.build_url(secure=True)}
+    for name, (width, height) in getattr(settings, 'COVER_THUMBNAIL_SIZES', THUMBNAIL_SIZES).items():
+        urls[name] = image.build_url(
+            width=width, height=height, crop='fill', fetch_format='auto', quality='auto', secure=True,
+        )
+    return urls
+
+
+def backfill_cover_urls(apps, schema_editor):
+    # Covers uploaded before this migration are all on Cloudinary; their URLs
+    # can only be built once the cloud name is configured.
+    if not settings.CLOUDINARY_STORAGE.get('CLOUD_NAME'):
+        return
+
+    Book = apps.get_model('circulation', 'Book')
+    books = list(Book.objects.exclude(cover_image__isnull=True).exclude(cover_image=''))
+    for book in books:
+        book.cover_urls = cloudinary_urls(book.cover_image)
+    Book.objects.bulk_update(books, ['cover_urls'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circulation', '0008_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_urls',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(backfill_cover_urls, migrations.RunPython.noop),
+    ]
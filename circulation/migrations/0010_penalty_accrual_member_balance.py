@@ -0,0 +1,46 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:38
+
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_outstanding_balance(apps, schema_editor):
+    Member = apps.get_model('circulation', 'Member')
+    Penalty = apps.get_model('circulation', 'Penalty')
+    unresolved = (
+        Penalty.objects.filter(member_id=OuterRef('pk'), resolved=False)
+        .values('member_id').annotate(total=Sum('amount')).values('total')
+    )
+    Member.objects.update(outstanding_balance=Coalesce(
+        Subquery(unresolved), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circulation', '0009_book_cover_urls'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='outstanding_balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_outstanding_balance, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='penalty',
+            name='accruing',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('status', 'OVERDUE')), fields=['id'], name='loan_overdue_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='penalty',
+            constraint=models.UniqueConstraint(condition=models.Q(('accruing', True)), fields=('loan',), name='penalty_accruing_loan_uniq'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.16 on 2026-10-18 21:05
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_active_loan_count(apps, schema_editor):
+    Member = apps.get_model('circulation', 'Member')
+    Loan = apps.get_model('circulation', 'Loan')
+    open_loans = (
+        Loan.objects.filter(member_id=OuterRef('pk'), status__in=('ACTIVE', 'OVERDUE'))
+        .values('member_id').annotate(n=Count('id')).values('n')
+    )
+    Member.objects.update(active_loan_count=Coalesce(Subquery(open_loans), Value(0), output_field=IntegerField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circulation', '0010_penalty_accrual_member_balance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='active_loan_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_active_loan_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circulation', '0011_member_active_loan_count'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='reservation',
+            name='res_pending_book_idx',
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='copy',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='holds', to='circulation.bookcopy'),
+        ),
+        migrations.AlterField(
+            model_name='reservation',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('READY', 'Ready for pickup'), ('FULFILLED', 'Fulfilled'), ('CANCELLED', 'Cancelled'), ('EXPIRED', 'Expired')], default='PENDING', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['book', 'id'], name='res_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.16 on 2026-10-18 21:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circulation', '0012_reservation_hold_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('loan_date', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('return_date', models.DateTimeField()),
+                ('copy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='circulation.bookcopy')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='circulation.member')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='penalty',
+            name='archived_loan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='circulation.archivedloan'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedloan',
+            index=models.Index(fields=['member', 'id'], name='archived_loan_member_id_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F
+from django.utils import timezone
+
+
+def serve_existing_queues(apps, schema_editor):
+    # Holds placed before the queue existed may wait on books with copies on
+    # the shelf, which a member outside the queue could then take. Give those
+    # copies to the oldest holds, as circulation.holds.serve_queue would.
+    Book = apps.get_model('circulation', 'Book')
+    BookCopy = apps.get_model('circulation', 'BookCopy')
+    Reservation = apps.get_model('circulation', 'Reservation')
+    now = timezone.now()
+    expires_at = now + timezone.timedelta(days=getattr(settings, 'HOLD_PICKUP_DAYS', 3))
+
+    waiting = set(Reservation.objects.filter(status='PENDING').values_list('book_id', flat=True).distinct())
+    shelved = set(BookCopy.objects.filter(status='AVAILABLE').values_list('book_id', flat=True).distinct())
+    for book_id in sorted(waiting & shelved):
+        copy_ids = list(BookCopy.objects.filter(book_id=book_id, status='AVAILABLE').order_by('id').values_list('id', flat=True))
+        hold_ids = list(
+            Reservation.objects.filter(book_id=book_id, status='PENDING', expires_at__gte=now).order_by('id')
+            .values_list('id', flat=True)[:len(copy_ids)]
+        )
+        for hold_id, copy_id in zip(hold_ids, copy_ids):
+            Reservation.objects.filter(id=hold_id).update(status='READY', copy_id=copy_id, expires_at=expires_at)
+            BookCopy.objects.filter(id=copy_id).update(status='RESERVED', updated_at=now)
+        Book.objects.filter(id=book_id).update(
+            available_copies=F('available_copies') - len(hold_ids),
+            pending_reservations=F('pending_reservations') - len(hold_ids),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circulation', '0014_circulation_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(serve_existing_queues, migrations.RunPython.noop),
+    ]
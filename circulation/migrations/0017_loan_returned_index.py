@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-18 21:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('circulation', '0016_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('status', 'RETURNED')), fields=['return_date', 'id'], name='loan_returned_idx'),
+        ),
+    ]
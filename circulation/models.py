@@ -22,9 +22,22 @@ class Book(models.Model):
     category = models.CharField(max_length=100)
     about = models.TextField(blank=True, null=True)
     cover_image = CloudinaryField('image', blank=True, null=True)
+    # Resolved cover URLs ('original' plus one per thumbnail size), written by
+    # circulation.covers when the image is uploaded.
+    cover_urls = models.JSONField(default=dict, blank=True, editable=False)
+    # Availability counters, maintained by circulation.availability.
+    total_copies = models.IntegerField(default=0, editable=False)
+    available_copies = models.IntegerField(default=0, editable=False)
+    on_loan_copies = models.IntegerField(default=0, editable=False)
+    pending_reservations = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -41,6 +54,11 @@ class BookCopy(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['book', 'status'], name='copy_book_status_idx'),
+        ]
+
     def __str__(self):
         return f"{self.book.title} ({self.barcode})"
 
@@ -48,6 +66,10 @@ class Member(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     library_id = models.CharField(max_length=50, unique=True)
     max_active_loans = models.IntegerField(default=5)
+    # Sum of unresolved penalties, kept in step by circulation.penalties.
+    outstanding_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    # Open (ACTIVE or OVERDUE) loans, kept in step by circulation.loan_counts.
+    active_loan_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -59,6 +81,8 @@ class Loan(models.Model):
         ('RETURNED', 'Returned'),
         ('OVERDUE', 'Overdue'),
     ]
+    # Statuses of loans whose copy is still out with the member.
+    OPEN_STATUSES = ('ACTIVE', 'OVERDUE')
     copy = models.ForeignKey(BookCopy, on_delete=models.CASCADE)
     member = models.ForeignKey(Member, on_delete=models.CASCADE)
     loan_date = models.DateTimeField(default=timezone.now)
@@ -68,33 +92,103 @@ class Loan(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['member', 'status'], name='loan_member_status_idx'),
+            models.Index(fields=['copy', 'status'], name='loan_copy_status_idx'),
+            models.Index(fields=['due_date'], condition=models.Q(status='ACTIVE'), name='loan_active_due_idx'),
+            models.Index(fields=['id'], condition=models.Q(status='OVERDUE'), name='loan_overdue_idx'),
+            models.Index(fields=['return_date', 'id'], condition=models.Q(status='RETURNED'), name='loan_returned_idx'),
+        ]
+
     def __str__(self):
         return f"Loan: {self.copy.barcode} to {self.member.user.username}"
 
+class ArchivedLoan(models.Model):
+    # A RETURNED loan moved out of Loan by circulation.archival. It keeps the
+    # loan's id, so references to it (and history cursors) stay valid, and
+    # only the columns the loan history reads.
+    id = models.BigIntegerField(primary_key=True)
+    copy = models.ForeignKey(BookCopy, on_delete=models.CASCADE, related_name='archived_loans')
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='archived_loans')
+    loan_date = models.DateTimeField()
+    due_date = models.DateTimeField()
+    return_date = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['member', 'id'], name='archived_loan_member_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived loan: {self.copy.barcode} to {self.member.user.username}"
+
 class Reservation(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
+        ('READY', 'Ready for pickup'),
         ('FULFILLED', 'Fulfilled'),
         ('CANCELLED', 'Cancelled'),
         ('EXPIRED', 'Expired'),
     ]
+    # PENDING holds wait in their book's queue, oldest id first; a READY hold
+    # has a copy set aside (RESERVED) until it is picked up or expires.
+    OPEN_STATUSES = ('PENDING', 'READY')
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     member = models.ForeignKey(Member, on_delete=models.CASCADE)
+    copy = models.ForeignKey(BookCopy, on_delete=models.SET_NULL, null=True, blank=True, related_name='holds')
     reserved_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['book', 'member', 'status'], name='res_book_member_status_idx'),
+            models.Index(fields=['status', 'expires_at'], name='res_status_expires_idx'),
+            # The hold queue: its head and every queue position are index range reads.
+            models.Index(fields=['book', 'id'], condition=models.Q(status='PENDING'), name='res_queue_idx'),
+        ]
+
     def __str__(self):
         return f"Reservation: {self.book.title} for {self.member.user.username}"
 
 class Penalty(models.Model):
     member = models.ForeignKey(Member, on_delete=models.CASCADE)
     loan = models.ForeignKey(Loan, on_delete=models.CASCADE, null=True, blank=True)
+    # Takes over from loan once the loan is archived.
+    archived_loan = models.ForeignKey(ArchivedLoan, on_delete=models.CASCADE, null=True, blank=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     reason = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     resolved = models.BooleanField(default=False)
     resolved_at = models.DateTimeField(null=True, blank=True)
+    # Set while the loan is still out and the amount keeps growing.
+    accruing = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['loan'], condition=models.Q(accruing=True), name='penalty_accruing_loan_uniq'),
+        ]
 
     def __str__(self):
         return f"Penalty: {self.member.user.username} - {self.amount}"
+
+class CirculationEvent(models.Model):
+    # The shared log behind circulation.events.DatabaseEventLog, so events
+    # published by any process (the sweeper worker included) reach every
+    # web process's streams. Pruned by the sweeper.
+    event_type = models.CharField(max_length=50)
+    payload = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id}"
+
+class CatalogVersion(models.Model):
+    # A single row whose version keys every cached catalog payload (see
+    # circulation.catalog_cache). Kept in the database rather than the cache
+    # so a bump from any process, the importer included, reaches all workers.
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"Catalog version {self.version}"
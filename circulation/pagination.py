@@ -0,0 +1,104 @@
+import base64
+import heapq
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list):
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def get_page_size(request):
+    default = getattr(settings, 'API_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+def keyset_filter(ordering, values):
+    # Builds "(a, b) > (x, y)" as (a > x) OR (a = x AND b > y) so the
+    # database can seek on a composite index over the ordering columns.
+    if len(values) != len(ordering):
+        raise InvalidCursor('Invalid cursor')
+    condition = Q()
+    for i, field in enumerate(ordering):
+        clause = Q(**{f'{field}__gt': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            clause &= Q(**{prev_field: prev_value})
+        condition |= clause
+    return condition
+
+
+def _page_queryset(queryset, ordering, request):
+    page_size = get_page_size(request)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            queryset = queryset.filter(keyset_filter(ordering, decode_cursor(cursor)))
+        except (ValueError, TypeError):
+            raise InvalidCursor('Invalid cursor')
+    return queryset.order_by(*ordering)[:page_size + 1], page_size
+
+
+def _finish_page(rows, ordering, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([rows[-1][field] for field in ordering])
+    return rows, next_cursor
+
+
+def paginate_keyset(queryset, ordering, request, serialize=None):
+    """
+    Returns (rows, next_cursor) for a queryset ordered by ``ordering``. Rows
+    must be dicts (``.values()``), or become dicts through ``serialize``.
+    The last field of ``ordering`` must be unique.
+    """
+    queryset, page_size = _page_queryset(queryset, ordering, request)
+    rows = list(queryset) if serialize is None else list(map(serialize, queryset))
+    return _finish_page(rows, ordering, page_size)
+
+
+def paginate_keyset_merged(querysets, ordering, request, serialize=None):
+    """
+    Like paginate_keyset, over several querysets whose rows never share an
+    ``ordering`` value, read as one sequence. Each queryset reads at most a
+    page past the cursor and the pages are merged.
+    """
+    pages = [_page_queryset(queryset, ordering, request) for queryset in querysets]
+    page_size = pages[0][1]
+    sources = [list(queryset) if serialize is None else list(map(serialize, queryset)) for queryset, _ in pages]
+    merged = heapq.merge(*sources, key=lambda row: [row[field] for field in ordering])
+    return _finish_page(list(islice(merged, page_size + 1)), ordering, page_size)
+
+
+async def apaginate_keyset(queryset, ordering, request, serialize=None):
+    queryset, page_size = _page_queryset(queryset, ordering, request)
+    rows = [row async for row in queryset]
+    return _finish_page(rows if serialize is None else list(map(serialize, rows)), ordering, page_size)
+
+
+def wants_pagination(request):
+    return 'cursor' in request.GET or 'page_size' in request.GET
@@ -0,0 +1,104 @@
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+
+from .models import Book
+
+MAX_TERMS = 10
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Must match the expression of the GIN index created in migration 0008.
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(isbn, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(category, '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(about, '')), 'D')"
+)
+SQLITE_FTS_TABLE = 'circulation_book_fts'
+# bm25 column weights for title, author, isbn, category, about.
+SQLITE_BM25_WEIGHTS = '10.0, 5.0, 10.0, 2.0, 1.0'
+SQLITE_TRIGGERS = {
+    'circulation_book_fts_ai': """
+        CREATE TRIGGER IF NOT EXISTS circulation_book_fts_ai AFTER INSERT ON circulation_book BEGIN
+            INSERT INTO circulation_book_fts(rowid, title, author, isbn, category, about)
+            VALUES (new.id, new.title, new.author, new.isbn, new.category, new.about);
+        END
+    """,
+    'circulation_book_fts_ad': """
+        CREATE TRIGGER IF NOT EXISTS circulation_book_fts_ad AFTER DELETE ON circulation_book BEGIN
+            INSERT INTO circulation_book_fts(circulation_book_fts, rowid, title, author, isbn, category, about)
+            VALUES ('delete', old.id, old.title, old.author, old.isbn, old.category, old.about);
+        END
+    """,
+    'circulation_book_fts_au': """
+        CREATE TRIGGER IF NOT EXISTS circulation_book_fts_au
+        AFTER UPDATE OF title, author, isbn, category, about ON circulation_book BEGIN
+            INSERT INTO circulation_book_fts(circulation_book_fts, rowid, title, author, isbn, category, about)
+            VALUES ('delete', old.id, old.title, old.author, old.isbn, old.category, old.about);
+            INSERT INTO circulation_book_fts(rowid, title, author, isbn, category, about)
+            VALUES (new.id, new.title, new.author, new.isbn, new.category, new.about);
+        END
+    """,
+}
+
+
+def parse_terms(query):
+    return [term.lower() for term in TERM_RE.findall(query or '')][:MAX_TERMS]
+
+
+def search_book_ids(query, limit, offset=0):
+    # Returns book ids ranked best match first. Every term must match, either
+    # as a whole word or as the prefix of one.
+    terms = parse_terms(query)
+    if not terms:
+        return []
+
+    # Raw SQL bypasses the database routers, so ask them where reads go.
+    db = connections[router.db_for_read(Book)]
+    if db.vendor == 'postgresql':
+        sql = (
+            f"SELECT id FROM circulation_book, to_tsquery('simple', %s) query "
+            f"WHERE ({POSTGRES_VECTOR}) @@ query "
+            f"ORDER BY ts_rank({POSTGRES_VECTOR}, query) DESC, id LIMIT %s OFFSET %s"
+        )
+        params = [' & '.join(f'{term}:*' for term in terms), limit, offset]
+    elif db.vendor == 'sqlite':
+        sql = (
+            f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({SQLITE_FTS_TABLE}, {SQLITE_BM25_WEIGHTS}), rowid LIMIT %s OFFSET %s"
+        )
+        params = [' '.join(f'"{term}"*' for term in terms), limit, offset]
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(title__icontains=term) | Q(author__icontains=term) | Q(isbn__icontains=term)
+                | Q(category__icontains=term) | Q(about__icontains=term)
+            )
+        return list(Book.objects.filter(condition).order_by('title', 'id').values_list('id', flat=True)[offset:offset + limit])
+
+    with db.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ensure_sqlite_triggers(using='default', **kwargs):
+    # SQLite migrations that rebuild circulation_book drop its triggers along
+    # with the old table, so they are restored (and the index resynced) after
+    # every migrate run.
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            [f'{SQLITE_FTS_TABLE}%'],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if SQLITE_FTS_TABLE not in existing or existing.issuperset(SQLITE_TRIGGERS):
+            return
+        for statement in SQLITE_TRIGGERS.values():
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
@@ -0,0 +1,117 @@
+import random
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Book, BookCopy, Member, Loan, Reservation, UserProfile
+
+CATEGORIES = ['Fiction', 'Science', 'History', 'Biography', 'Children', 'Poetry', 'Travel', 'Technology']
+
+
+def seed_dataset(books=1000, copies_per_book=3, members=500, loans=5000, reservations=1000,
+                 batch_size=1000, seed=0, using='default'):
+    # Generates a synthetic catalog and circulation history with bulk inserts.
+    # Returns a dict of row counts created per model.
+    with transaction.atomic(using=using):
+        return _seed(books, copies_per_book, members, loans, reservations, batch_size, seed, using)
+
+
+def _seed(books, copies_per_book, members, loans, reservations, batch_size, seed, using):
+    rng = random.Random(seed)
+    now = timezone.now()
+    prefix = f"{rng.getrandbits(24):06X}"
+
+    Book.objects.using(using).bulk_create([
+        Book(
+            title=f"Title {rng.randrange(books * 10)} {i}",
+            author=f"Author {rng.randrange(max(books // 5, 1))}",
+            isbn=f"{prefix}{i:07d}",
+            category=rng.choice(CATEGORIES),
+            total_copies=copies_per_book,
+            available_copies=copies_per_book,
+        )
+        for i in range(books)
+    ], batch_size=batch_size)
+    book_ids = list(Book.objects.using(using).filter(isbn__startswith=prefix).values_list('id', flat=True))
+
+    BookCopy.objects.using(using).bulk_create([
+        BookCopy(book_id=book_id, barcode=f"SEED-{prefix}-{book_id}-{n}")
+        for book_id in book_ids
+        for n in range(copies_per_book)
+    ], batch_size=batch_size)
+    copy_books = dict(BookCopy.objects.using(using).filter(barcode__startswith=f"SEED-{prefix}-").values_list('id', 'book_id'))
+    copy_ids = list(copy_books)
+
+    User.objects.using(using).bulk_create([
+        User(username=f"seed-{prefix}-{i}", password='!')
+        for i in range(members)
+    ], batch_size=batch_size)
+    user_ids = list(User.objects.using(using).filter(username__startswith=f"seed-{prefix}-").values_list('id', flat=True))
+    UserProfile.objects.using(using).bulk_create([UserProfile(user_id=user_id) for user_id in user_ids], batch_size=batch_size)
+    Member.objects.using(using).bulk_create([
+        Member(user_id=user_id, library_id=f"SEED-{prefix}-{user_id}")
+        for user_id in user_ids
+    ], batch_size=batch_size)
+    member_ids = list(Member.objects.using(using).filter(library_id__startswith=f"SEED-{prefix}-").values_list('id', flat=True))
+
+    # Historical loans are returned; the most recent one per copy may still be out.
+    loan_rows = []
+    on_loan = set()
+    for i in range(loans):
+        copy_id = rng.choice(copy_ids)
+        loan_date = now - timezone.timedelta(days=rng.randrange(1, 720), minutes=rng.randrange(1440))
+        due_date = loan_date + timezone.timedelta(days=14)
+        active = copy_id not in on_loan and rng.random() < 0.1
+        if active:
+            on_loan.add(copy_id)
+        loan_rows.append(Loan(
+            copy_id=copy_id,
+            member_id=rng.choice(member_ids),
+            loan_date=loan_date,
+            due_date=due_date,
+            return_date=None if active else loan_date + timezone.timedelta(days=rng.randrange(1, 21)),
+            status='ACTIVE' if active else 'RETURNED',
+        ))
+    Loan.objects.using(using).bulk_create(loan_rows, batch_size=batch_size)
+    on_loan = list(on_loan)
+    for start in range(0, len(on_loan), batch_size):
+        BookCopy.objects.using(using).filter(id__in=on_loan[start:start + batch_size]).update(status='ON_LOAN')
+
+    reservation_rows = [
+        Reservation(
+            book_id=rng.choice(book_ids),
+            member_id=rng.choice(member_ids),
+            expires_at=now + timezone.timedelta(days=rng.randrange(-30, 8)),
+            status=rng.choice(['PENDING', 'PENDING', 'FULFILLED', 'CANCELLED', 'EXPIRED']),
+        )
+        for _ in range(reservations)
+    ]
+    Reservation.objects.using(using).bulk_create(reservation_rows, batch_size=batch_size)
+
+    open_by_member = Counter(row.member_id for row in loan_rows if row.status == 'ACTIVE')
+    Member.objects.using(using).bulk_update([
+        Member(id=member_id, active_loan_count=count) for member_id, count in open_by_member.items()
+    ], ['active_loan_count'], batch_size=batch_size)
+
+    # Keep the availability counters consistent with the generated rows.
+    on_loan_by_book = Counter(copy_books[copy_id] for copy_id in on_loan)
+    pending_by_book = Counter(row.book_id for row in reservation_rows if row.status == 'PENDING')
+    Book.objects.using(using).bulk_update([
+        Book(
+            id=book_id,
+            available_copies=copies_per_book - on_loan_by_book[book_id],
+            on_loan_copies=on_loan_by_book[book_id],
+            pending_reservations=pending_by_book[book_id],
+        )
+        for book_id in set(on_loan_by_book) | set(pending_by_book)
+    ], ['available_copies', 'on_loan_copies', 'pending_reservations'], batch_size=batch_size)
+
+    return {
+        'books': len(book_ids),
+        'copies': len(copy_ids),
+        'members': len(member_ids),
+        'loans': loans,
+        'reservations': reservations,
+    }
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+
+def use_orjson():
+    return orjson is not None and getattr(settings, 'JSON_BACKEND', 'orjson') == 'orjson'
+
+
+def dumps(data):
+    # Returns UTF-8 bytes. orjson writes datetimes natively (full microseconds,
+    # UTC as "Z"); anything it doesn't know, such as Decimal, goes through
+    # DjangoJSONEncoder like it does on the stdlib fallback.
+    if use_orjson():
+        return orjson.dumps(data, default=_encoder.default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return _encoder.encode(data).encode()
+
+
+def json_response(data, status=200):
+    # Unlike JsonResponse, lists are allowed without safe=False.
+    return HttpResponse(dumps(data), content_type='application/json', status=status)
+
+
+def cover_image_url(cover_urls):
+    # Cover URLs are resolved once at upload (see circulation.covers), so
+    # serializing a row is a dict lookup rather than a storage call.
+    return cover_urls.get('original') if cover_urls else None
+
+
+class RowSerializer:
+    """
+    Maps ``values_list(*fields)`` tuples to response dicts keyed by the field
+    names, plus ``computed`` keys (key -> (function, source field)).
+    """
+
+    def __init__(self, fields, computed=None):
+        self.fields = tuple(fields)
+        self.computed = dict(computed or {})
+        # (key, function, index of the source field in a row)
+        self._computed = [
+            (key, function, self.fields.index(source)) for key, (function, source) in self.computed.items()
+        ]
+
+    def row(self, row):
+        data = dict(zip(self.fields, row))
+        for key, function, index in self._computed:
+            data[key] = function(row[index])
+        return data
+
+    def values(self, queryset):
+        return queryset.values_list(*self.fields)
+
+    def many(self, rows):
+        return list(map(self.row, rows))
+
+
+BOOK_ROWS = RowSerializer(
+    ('id', 'title', 'author', 'isbn', 'category', 'about', 'cover_urls', 'created_at', 'updated_at',
+     'total_copies', 'available_copies', 'on_loan_copies', 'pending_reservations'),
+    {'cover_image': (cover_image_url, 'cover_urls')},
+)
+COPY_ROWS = RowSerializer(('id', 'book_id', 'barcode', 'status', 'created_at', 'updated_at'))
+MEMBER_ROWS = RowSerializer(
+    ('id', 'user__username', 'library_id', 'max_active_loans', 'active_loan_count', 'outstanding_balance'),
+)
+LOAN_ROWS = RowSerializer(
+    ('id', 'copy__book__id', 'copy__book__title', 'copy__book__cover_urls', 'due_date', 'return_date', 'status'),
+    {'copy__book__cover_image': (cover_image_url, 'copy__book__cover_urls')},
+)
+# The member dashboard's loans also carry the copy and when it was lent.
+MEMBER_LOAN_ROWS = RowSerializer(
+    LOAN_ROWS.fields + ('copy__barcode', 'loan_date'),
+    LOAN_ROWS.computed,
+)
+# Loan history rows come from Loan and ArchivedLoan alike; the querysets
+# annotate status (always RETURNED once archived) and archived.
+LOAN_HISTORY_ROWS = RowSerializer(
+    MEMBER_LOAN_ROWS.fields + ('archived',),
+    LOAN_ROWS.computed,
+)
+RESERVATION_ROWS = RowSerializer(
+    ('id', 'book__id', 'book__title', 'book__cover_urls', 'member__library_id', 'reserved_at', 'expires_at', 'status',
+     'copy__barcode'),
+    {'book__cover_image': (cover_image_url, 'book__cover_urls')},
+)
+# A member's own holds also carry their place in the queue (annotated, see
+# holds.queue_position).
+MEMBER_RESERVATION_ROWS = RowSerializer(
+    RESERVATION_ROWS.fields + ('queue_position',),
+    RESERVATION_ROWS.computed,
+)
+PENALTY_ROWS = RowSerializer(('id', 'loan_id', 'archived_loan_id', 'amount', 'reason', 'accruing', 'created_at'))
@@ -0,0 +1,236 @@
+import uuid
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import availability, holds, loan_counts
+from .models import BookCopy, Member, Loan
+from .penalties import settle_penalties
+
+LOAN_PERIOD = timezone.timedelta(minutes=30)
+CLAIM_CANDIDATES = 5
+COPY_BATCH_SIZE = 500
+MAX_BARCODE_RETRIES = 5
+HOLD_CHANGED = 'Hold changed during checkout, please retry'
+
+
+class CirculationError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def claim_available_copy(book_id):
+    # Must run inside a transaction. On backends with SKIP LOCKED, concurrent
+    # desks each lock a different AVAILABLE row instead of queueing on the
+    # first one. Elsewhere a conditional UPDATE acts as compare-and-set: it
+    # only succeeds if the copy is still AVAILABLE, so two requests can never
+    # claim the same copy.
+    available = BookCopy.objects.filter(book_id=book_id, status='AVAILABLE')
+    if connection.features.has_select_for_update_skip_locked:
+        copy = available.select_for_update(skip_locked=True).first()
+        if copy is not None:
+            BookCopy.objects.filter(id=copy.id).update(status='ON_LOAN', updated_at=timezone.now())
+            copy.status = 'ON_LOAN'
+        return copy
+
+    while True:
+        candidates = list(available.values_list('id', flat=True)[:CLAIM_CANDIDATES])
+        if not candidates:
+            return None
+        for copy_id in candidates:
+            if BookCopy.objects.filter(id=copy_id, status='AVAILABLE').update(status='ON_LOAN', updated_at=timezone.now()):
+                return BookCopy.objects.get(id=copy_id)
+
+
+def generate_barcode():
+    return f"COPY-{uuid.uuid4().hex[:8].upper()}"
+
+
+def insert_copies(copies):
+    # Inserts (book_id, barcode) pairs under a savepoint. If a barcode collides
+    # with an existing copy, only the colliding barcodes are regenerated and
+    # the batch is retried. Returns the barcodes actually inserted.
+    for _ in range(MAX_BARCODE_RETRIES):
+        try:
+            with transaction.atomic():
+                BookCopy.objects.bulk_create([BookCopy(book_id=book_id, barcode=barcode) for book_id, barcode in copies])
+            return [barcode for _, barcode in copies]
+        except IntegrityError:
+            taken = set(BookCopy.objects.filter(barcode__in=[barcode for _, barcode in copies]).values_list('barcode', flat=True))
+            if not taken:
+                raise
+            copies = [(book_id, generate_barcode() if barcode in taken else barcode) for book_id, barcode in copies]
+    raise CirculationError('Could not generate unique barcodes')
+
+
+def create_copies(book_id, count, batch_size=COPY_BATCH_SIZE):
+    with transaction.atomic():
+        barcodes = set()
+        while len(barcodes) < count:
+            barcodes.add(generate_barcode())
+        copies = [(book_id, barcode) for barcode in barcodes]
+
+        created = []
+        for start in range(0, count, batch_size):
+            created.extend(insert_copies(copies[start:start + batch_size]))
+        availability.adjust(book_id, total_copies=count, available_copies=count)
+        holds.serve_queue(book_id)
+    return created
+
+
+def lock_members(library_ids):
+    # Locking member rows serializes concurrent work for the same members, as
+    # a loan batch that checks max_active_loans in memory needs. SQLite has no
+    # row locks, and a transaction that starts with a read fails instead of
+    # waiting when it later tries to write, so a no-op UPDATE takes the write
+    # lock first.
+    members = Member.objects.filter(library_id__in=library_ids)
+    if connection.features.has_select_for_update:
+        members = members.select_for_update().order_by('id')
+    else:
+        members.update(max_active_loans=F('max_active_loans'))
+    return {member.library_id: member for member in members}
+
+
+def claim_loan_slot(library_id):
+    # Takes one of the member's max_active_loans with a conditional increment
+    # (see loan_counts.claim) instead of locking the member and counting their
+    # open loans. Being a write, it also takes SQLite's write lock up front.
+    if not loan_counts.claim(library_id):
+        if not Member.objects.filter(library_id=library_id).exists():
+            raise CirculationError('Member not found', status=404)
+        raise CirculationError('Member has reached maximum active loans')
+    return Member.objects.get(library_id=library_id)
+
+
+def checkout(library_id, book_id):
+    with transaction.atomic():
+        # The slot is given back with the transaction if no copy is available.
+        member = claim_loan_slot(library_id)
+        hold = holds.open_hold(member.id, book_id)
+
+        if hold and hold.status == 'READY' and hold.copy_id:
+            # The copy set aside for this member goes out, unless the hold
+            # expired or was cancelled since it was read.
+            copy_id, previous_status = hold.copy_id, 'RESERVED'
+            if not BookCopy.objects.filter(id=copy_id, status='RESERVED').update(
+                status='ON_LOAN', updated_at=timezone.now(),
+            ):
+                raise CirculationError(HOLD_CHANGED, status=409)
+        else:
+            copy = claim_available_copy(book_id)
+            if not copy:
+                raise CirculationError('No available copies of this book')
+            copy_id, previous_status = copy.id, 'AVAILABLE'
+
+        loan = Loan.objects.create(
+            copy_id=copy_id,
+            member=member,
+            due_date=timezone.now() + LOAN_PERIOD
+        )
+        availability.copy_status_changed(book_id, previous_status, 'ON_LOAN')
+
+        # The member's hold on this book, waiting or ready, is fulfilled.
+        if hold and not holds.close(hold, 'FULFILLED', keep_copy=hold.copy_id == copy_id):
+            raise CirculationError(HOLD_CHANGED, status=409)
+
+    return loan, hold
+
+
+def lock_open_loan(library_id, book_id):
+    # Finds and locks the member's open loan of the book (on SQLite, taking
+    # the write lock up front as lock_copy does, so concurrent returns wait
+    # for each other instead of failing).
+    loans = Loan.objects.filter(copy__book_id=book_id, member__library_id=library_id, status__in=Loan.OPEN_STATUSES)
+    if connection.features.has_select_for_update:
+        loans = loans.select_for_update(of=('self',))
+    else:
+        loans.update(status=F('status'))
+    return loans.first()
+
+
+def return_loan(library_id, book_id):
+    with transaction.atomic():
+        loan = lock_open_loan(library_id, book_id)
+        if not loan:
+            if not Member.objects.filter(library_id=library_id).exists():
+                raise CirculationError('Member not found', status=404)
+            raise CirculationError('No active loan found for this book and member', status=404)
+
+        copy = loan.copy
+
+        loan.return_date = timezone.now()
+        loan.status = 'RETURNED'
+        loan.save()
+
+        # The copy goes to the next hold in the queue, if anyone is waiting.
+        hold = holds.shelve(copy.book_id, copy.id, copy.status, loan.return_date)
+        loan_counts.release(loan.member_id)
+
+        penalty = settle_penalties([loan]).get(loan.id)
+
+    return loan, penalty, hold
+
+
+def lock_copy(barcode):
+    # Resolves a scanned copy through the unique barcode index, locking the
+    # row (or, on SQLite, taking the write lock up front as lock_members does).
+    copies = BookCopy.objects.filter(barcode=barcode).only('id', 'book_id', 'status')
+    if connection.features.has_select_for_update:
+        copies = copies.select_for_update()
+    else:
+        copies.update(status=F('status'))
+    return copies.first()
+
+
+def checkout_by_barcode(library_id, barcode):
+    # Checks out the exact copy that was scanned instead of any copy of the
+    # book; a RESERVED copy only to the member it is set aside for.
+    with transaction.atomic():
+        member = claim_loan_slot(library_id)
+        copy = lock_copy(barcode)
+        if not copy:
+            raise CirculationError('Copy not found', status=404)
+        hold = holds.open_hold(member.id, copy.book_id)
+        if copy.status == 'RESERVED' and not (hold and hold.copy_id == copy.id):
+            raise CirculationError('Copy is reserved for another member', status=409)
+        if copy.status not in ('AVAILABLE', 'RESERVED'):
+            raise CirculationError(f'Copy is not available (status {copy.status})', status=409)
+
+        now = timezone.now()
+        if not BookCopy.objects.filter(id=copy.id, status=copy.status).update(status='ON_LOAN', updated_at=now):
+            raise CirculationError('Copy changed during checkout, please retry', status=409)
+        loan = Loan.objects.create(copy_id=copy.id, member=member, due_date=now + LOAN_PERIOD)
+        availability.copy_status_changed(copy.book_id, copy.status, 'ON_LOAN')
+        if hold and not holds.close(hold, 'FULFILLED', now, keep_copy=hold.copy_id == copy.id):
+            raise CirculationError(HOLD_CHANGED, status=409)
+
+    return loan, hold
+
+
+def return_by_barcode(barcode):
+    # The copy and its open loan are each found through a single-table index
+    # lookup (barcode, then copy + status); no member lookup or join is needed.
+    with transaction.atomic():
+        copy = lock_copy(barcode)
+        if not copy:
+            raise CirculationError('Copy not found', status=404)
+
+        loan = Loan.objects.filter(copy_id=copy.id, status__in=Loan.OPEN_STATUSES).only(
+            'id', 'member_id', 'copy_id', 'due_date'
+        ).first()
+        if not loan:
+            raise CirculationError('No active loan found for this copy', status=404)
+
+        now = timezone.now()
+        loan.return_date = now
+        loan.status = 'RETURNED'
+        Loan.objects.filter(id=loan.id).update(status='RETURNED', return_date=now, updated_at=now)
+        hold = holds.shelve(copy.book_id, copy.id, copy.status, now)
+        loan_counts.release(loan.member_id)
+
+        penalty = settle_penalties([loan]).get(loan.id)
+
+    return loan, penalty, hold
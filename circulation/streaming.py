@@ -0,0 +1,88 @@
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .serializers import dumps
+
+
+def get_chunk_size():
+    return getattr(settings, 'API_STREAM_CHUNK_SIZE', 2000)
+
+
+def _encode_group(group, first):
+    # Encodes a group of elements as one array and strips its brackets, so
+    # the JSON backend is called once per flush rather than once per row.
+    body = dumps(group)[1:-1]
+    return body if first else b',' + body
+
+
+def iter_json_array(rows, serialize=None, flush_every=None):
+    # Emits a JSON array one buffered group of elements at a time, so only
+    # ``flush_every`` serialized rows are ever held in memory.
+    flush_every = flush_every or get_chunk_size()
+    yield b'['
+    group = []
+    first = True
+    for row in rows:
+        group.append(row if serialize is None else serialize(row))
+        if len(group) >= flush_every:
+            yield _encode_group(group, first)
+            group = []
+            first = False
+    if group:
+        yield _encode_group(group, first)
+    yield b']'
+
+
+async def aiter_json_array(rows, serialize=None, flush_every=None):
+    # Async counterpart of iter_json_array for rows from an async iterator.
+    flush_every = flush_every or get_chunk_size()
+    yield b'['
+    group = []
+    first = True
+    async for row in rows:
+        group.append(row if serialize is None else serialize(row))
+        if len(group) >= flush_every:
+            yield _encode_group(group, first)
+            group = []
+            first = False
+    if group:
+        yield _encode_group(group, first)
+    yield b']'
+
+
+def streaming_json_response(queryset, serialize=None):
+    chunk_size = get_chunk_size()
+    rows = queryset.iterator(chunk_size=chunk_size)
+    return StreamingHttpResponse(
+        iter_json_array(rows, serialize, flush_every=chunk_size),
+        content_type='application/json',
+    )
+
+
+def wants_stream(request):
+    return request.GET.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def astreaming_json_response(queryset, serialize=None):
+    # Streams with the async ORM; only use this from async views under ASGI.
+    chunk_size = get_chunk_size()
+    return StreamingHttpResponse(
+        aiter_json_array(_aiter_queryset(queryset, chunk_size), serialize, flush_every=chunk_size),
+        content_type='application/json',
+    )
+
+
+async def _aiter_queryset(queryset, chunk_size):
+    # Stands in for QuerySet.aiterator(), which on Django 4.2 runs
+    # values_list() queries on the event loop thread. The sync iterator is
+    # lazy, so both the query and each fetch happen in the worker thread.
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = await sync_to_async(lambda: list(islice(rows, chunk_size)))()
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            break
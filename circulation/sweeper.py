@@ -0,0 +1,152 @@
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import availability, events, holds
+from .models import Loan, Penalty, Reservation
+from .penalties import ZERO, adjust_balances, outstanding, overdue_charge, overdue_reason, update_amounts
+
+
+def expire_reservations(now=None, batch_size=500):
+    # Expires open holds past expires_at, oldest first, one bounded batch per
+    # transaction (served by the (status, expires_at) index). Waiting holds
+    # are expired in bulk per book; a READY hold's copy passes on to the next
+    # hold in its book's queue.
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        batch = list(
+            Reservation.objects.filter(status__in=Reservation.OPEN_STATUSES, expires_at__lt=now)
+            .order_by('expires_at')
+            .only('id', 'book_id', 'status', 'copy_id')[:batch_size]
+        )
+        if not batch:
+            return expired
+        by_book = {}
+        for reservation in batch:
+            if reservation.status == 'PENDING':
+                by_book.setdefault(reservation.book_id, []).append(reservation.id)
+        with transaction.atomic():
+            # Only holds this sweep actually expired are announced; one picked
+            # up or cancelled in the meantime is left alone.
+            expired_ids = []
+            for book_id, reservation_ids in by_book.items():
+                count = Reservation.objects.filter(id__in=reservation_ids, status='PENDING').update(status='EXPIRED')
+                availability.adjust(book_id, pending_reservations=-count)
+                if count == len(reservation_ids):
+                    expired_ids.extend(reservation_ids)
+                elif count:
+                    expired_ids.extend(
+                        Reservation.objects.filter(id__in=reservation_ids, status='EXPIRED').values_list('id', flat=True)
+                    )
+            # After the waiting holds, so a released copy never goes to one of them.
+            for reservation in batch:
+                if reservation.status == 'READY' and holds.close(reservation, 'EXPIRED', now):
+                    expired_ids.append(reservation.id)
+            expired += len(expired_ids)
+            if expired_ids:
+                events.publish('reservation.expired', {'reservation_ids': expired_ids})
+
+
+def mark_overdue_loans(now=None, batch_size=500):
+    # Moves ACTIVE loans past due_date to OVERDUE using the partial index on
+    # ACTIVE loans' due_date.
+    now = now or timezone.now()
+    marked = 0
+    while True:
+        loan_ids = list(
+            Loan.objects.filter(status='ACTIVE', due_date__lt=now)
+            .order_by('due_date')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not loan_ids:
+            return marked
+        marked += Loan.objects.filter(id__in=loan_ids, status='ACTIVE').update(status='OVERDUE', updated_at=now)
+
+
+def lock_overdue_loans(loan_ids):
+    # Locks the loans (SQLite: takes the write lock, as lock_members does) so
+    # a concurrent return waits for the batch and then settles the penalty
+    # written here. Returns the ids still overdue.
+    loans = Loan.objects.filter(id__in=loan_ids, status='OVERDUE')
+    if connection.features.has_select_for_update:
+        loans = loans.select_for_update()
+    else:
+        loans.update(status=F('status'))
+    return set(loans.values_list('id', flat=True))
+
+
+def accruing_penalties(loan_ids):
+    # {loan_id: (penalty_id, amount, resolved)} of the loans' accruing
+    # penalties. A librarian may resolve one while it still accrues; its
+    # amount keeps tracking the loan but no longer counts toward the balance.
+    return {
+        loan_id: (penalty_id, amount, resolved)
+        for penalty_id, loan_id, amount, resolved in Penalty.objects.filter(loan_id__in=loan_ids, accruing=True)
+        .values_list('id', 'loan_id', 'amount', 'resolved')
+    }
+
+
+def accrue_penalties(now=None, batch_size=500):
+    # Brings one accruing Penalty per OVERDUE loan up to what it owes at now,
+    # a batch of loans at a time. Amounts change once an hour, so a batch
+    # whose penalties are current costs two reads (the loans, keyset on the
+    # partial OVERDUE index, and their penalties). Otherwise the stale loans
+    # are locked and fixed with one bulk insert, one UPDATE of the changed
+    # amounts and one UPDATE of the members' balances.
+    now = now or timezone.now()
+    result = {'created': 0, 'updated': 0}
+    last_id = 0
+    while True:
+        batch = list(
+            Loan.objects.filter(status='OVERDUE', id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'member_id', 'due_date')[:batch_size]
+        )
+        if not batch:
+            return result
+        last_id = batch[-1][0]
+        current = accruing_penalties([loan_id for loan_id, _, _ in batch])
+        stale = [
+            (loan_id, member_id, due_date) for loan_id, member_id, due_date in batch
+            if overdue_charge(due_date, now)[1] != current.get(loan_id, (None, ZERO, False))[1]
+        ]
+        if not stale:
+            continue
+        with transaction.atomic():
+            open_ids = lock_overdue_loans([loan_id for loan_id, _, _ in stale])
+            # Read again under the lock; a return may have settled some.
+            current = accruing_penalties(open_ids)
+            created, updated, deltas = [], [], {}
+            for loan_id, member_id, due_date in stale:
+                if loan_id not in open_ids:
+                    continue
+                hours, amount = overdue_charge(due_date, now)
+                penalty_id, previous, resolved = current.get(loan_id, (None, ZERO, False))
+                if amount == previous:
+                    continue
+                penalty = Penalty(id=penalty_id, member_id=member_id, loan_id=loan_id, amount=amount,
+                                  reason=overdue_reason(hours), accruing=True)
+                (updated if penalty_id else created).append(penalty)
+                deltas[member_id] = (
+                    deltas.get(member_id, ZERO) + outstanding(amount, resolved) - outstanding(previous, resolved)
+                )
+            Penalty.objects.bulk_create(created)
+            update_amounts(updated)
+            adjust_balances(deltas)
+        result['created'] += len(created)
+        result['updated'] += len(updated)
+
+
+def sweep(batch_size=500, now=None):
+    now = now or timezone.now()
+    result = {
+        'reservations_expired': expire_reservations(now, batch_size),
+        'loans_overdue': mark_overdue_loans(now, batch_size),
+    }
+    # Runs after mark_overdue_loans so loans that just fell due accrue too.
+    accrued = accrue_penalties(now, batch_size)
+    result['penalties_created'] = accrued['created']
+    result['penalties_updated'] = accrued['updated']
+    events.prune()
+    return result
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from circulation import archival
+from circulation.models import ArchivedLoan, Book, BookCopy, Loan, Member, Penalty
+
+
+@override_settings(LOAN_ARCHIVE_AFTER_DAYS=365)
+class ArchivalTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.member = Member.objects.create(user=User.objects.create_user('reader'), library_id='LIB-1')
+        book = Book.objects.create(title='T', author='A', isbn='9780000000001', category='C')
+        # Loans 0, 2 and 3 were returned long ago, 1 recently, and 4 is still out.
+        returned = [now - timedelta(days=days) for days in (400, 5, 500, 450)] + [None]
+        self.loans = []
+        for i, return_date in enumerate(returned):
+            copy = BookCopy.objects.create(book=book, barcode=f'B-{i}')
+            self.loans.append(Loan.objects.create(
+                copy=copy, member=self.member, due_date=now - timedelta(days=600),
+                status='RETURNED' if return_date else 'ACTIVE', return_date=return_date,
+            ))
+        self.old_penalty = Penalty.objects.create(
+            member=self.member, loan=self.loans[0], amount=Decimal('10.00'), reason='Overdue by 1 hours',
+        )
+        self.recent_penalty = Penalty.objects.create(
+            member=self.member, loan=self.loans[1], amount=Decimal('20.00'), reason='Overdue by 2 hours',
+        )
+        self.old_ids = [self.loans[i].id for i in (0, 2, 3)]
+
+    def command(self, *args):
+        out = StringIO()
+        call_command('archive_loans', *args, stdout=out)
+        return out.getvalue()
+
+    def test_old_returned_loans_move_to_the_archive(self):
+        self.assertEqual(archival.archive_loans(batch_size=2), (3, 1))
+
+        self.assertEqual(sorted(ArchivedLoan.objects.values_list('id', flat=True)), sorted(self.old_ids))
+        self.assertEqual(
+            sorted(Loan.objects.values_list('id', flat=True)), [self.loans[1].id, self.loans[4].id],
+        )
+        archived = ArchivedLoan.objects.get(id=self.loans[0].id)
+        self.assertEqual(
+            (archived.copy_id, archived.member_id, archived.return_date),
+            (self.loans[0].copy_id, self.member.id, self.loans[0].return_date),
+        )
+        # Nothing is left to archive on a second run.
+        self.assertEqual(archival.archive_loans(), (0, 0))
+
+    def test_penalties_follow_their_loan_into_the_archive(self):
+        archival.archive_loans()
+
+        self.assertEqual(
+            Penalty.objects.filter(id=self.old_penalty.id).values_list('loan_id', 'archived_loan_id').get(),
+            (None, self.loans[0].id),
+        )
+        self.assertEqual(
+            Penalty.objects.filter(id=self.recent_penalty.id).values_list('loan_id', 'archived_loan_id').get(),
+            (self.loans[1].id, None),
+        )
+        self.assertEqual(Penalty.objects.count(), 2)
+
+    def test_dry_run_only_counts(self):
+        self.assertIn('3 loans returned before', self.command('--dry-run'))
+        self.assertIn('4 loans returned before', self.command('--dry-run', '--older-than-days', '1'))
+
+        self.assertFalse(ArchivedLoan.objects.exists())
+        self.assertEqual(Loan.objects.count(), 5)
+
+    def test_command_archives_past_the_cutoff(self):
+        self.assertIn('Archived 2 loans and moved 0 penalty references.', self.command('--older-than-days', '420'))
+        self.assertIn('Archived 1 loans and moved 1 penalty references.', self.command('--batch-size', '1'))
+
+        self.assertEqual(sorted(ArchivedLoan.objects.values_list('id', flat=True)), sorted(self.old_ids))
+
+    def test_negative_age_is_rejected(self):
+        with self.assertRaisesMessage(CommandError, '--older-than-days must not be negative.'):
+            self.command('--older-than-days', '-1')
+
+    def test_history_cursor_spans_live_and_archived_loans(self):
+        first = self.client.get('/api/loans/history/', {'member_id': self.member.id, 'page_size': 2}).json()
+        # A cursor issued before the archive run stays valid after it.
+        archival.archive_loans()
+
+        rows = list(first['results'])
+        cursor = first['next']
+        while cursor:
+            page = self.client.get(
+                '/api/loans/history/', {'member_id': self.member.id, 'page_size': 2, 'cursor': cursor},
+            ).json()
+            rows += page['results']
+            cursor = page['next']
+
+        self.assertEqual([row['id'] for row in rows], [loan.id for loan in self.loans])
+        self.assertEqual([row['archived'] for row in rows[2:]], [True, True, False])
+        self.assertEqual([row['status'] for row in rows[2:]], ['RETURNED', 'RETURNED', 'ACTIVE'])
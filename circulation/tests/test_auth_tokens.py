@@ -0,0 +1,83 @@
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from circulation import auth_tokens
+from circulation.models import Member, UserProfile
+
+
+@override_settings(AUTH_TOKENS_ENABLED=True, AUTH_TOKEN_LIFETIME=600)
+class AuthTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='secret')
+        UserProfile.objects.create(user=self.user, user_type='MEMBER')
+        self.member = Member.objects.create(user=self.user, library_id='LIB-1')
+
+    def signin(self):
+        response = self.client.post(
+            '/api/signin/', json.dumps({'username': 'reader', 'password': 'secret'}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def me(self, token):
+        return self.client.get('/api/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_signin_issues_a_token_instead_of_a_session(self):
+        response = self.signin()
+
+        body = response.json()
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertIn('token_expires_at', body)
+        claims = auth_tokens.verify_token(body['token'])
+        self.assertEqual(
+            (claims['uid'], claims['mid'], claims['typ']), (self.user.id, self.member.id, 'MEMBER'),
+        )
+
+    def test_token_authenticates_me(self):
+        token = self.signin().json()['token']
+        self.assertEqual(self.client.get('/api/me/').status_code, 401)
+
+        response = self.me(token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['user']['id'], response.json()['member']['id']), (self.user.id, self.member.id))
+
+    def test_expired_token_is_rejected(self):
+        token = self.signin().json()['token']
+        later = time.time() + 601
+
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            with self.assertRaisesMessage(auth_tokens.InvalidToken, 'Token has expired'):
+                auth_tokens.verify_token(token)
+            self.assertEqual(self.me(token).status_code, 401)
+
+    def test_tampered_token_is_rejected(self):
+        token = self.signin().json()['token']
+        payload, timestamp, signature = token.rsplit(':', 2)
+        other, _ = auth_tokens.issue_token(self.user.id + 1, None, 'LIBRARIAN')
+        tampered = [
+            f'{payload}:{timestamp}:{signature[:-1]}{"A" if signature[-1] != "A" else "B"}',
+            # Another token's claims under this token's signature.
+            f'{other.rsplit(":", 2)[0]}:{timestamp}:{signature}',
+        ]
+
+        for token in tampered:
+            with self.subTest(token=token):
+                with self.assertRaisesMessage(auth_tokens.InvalidToken, 'Invalid token'):
+                    auth_tokens.verify_token(token)
+                self.assertEqual(self.me(token).status_code, 401)
+
+    def test_signout_revokes_the_token(self):
+        token = self.signin().json()['token']
+
+        response = self.client.post('/api/signout/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(auth_tokens.is_revoked(auth_tokens.verify_token(token)))
+        self.assertEqual(self.me(token).status_code, 401)
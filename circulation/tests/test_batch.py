@@ -0,0 +1,101 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from circulation import availability, batch, loan_counts
+from circulation.models import Book, BookCopy, Loan, Member
+
+
+class LoanBatchTestCase(TestCase):
+    def setUp(self):
+        self.books = []
+        for i in range(8):
+            book = Book.objects.create(title=f'Book {i}', author='A', isbn=f'97800000000{i:02d}', category='C')
+            BookCopy.objects.create(book=book, barcode=f'B-{i}-1')
+            BookCopy.objects.create(book=book, barcode=f'B-{i}-2')
+            self.books.append(book)
+        availability.refresh([book.id for book in self.books])
+        self.members = [
+            Member.objects.create(user=User.objects.create_user(f'member{i}'), library_id=f'LIB-{i}') for i in range(8)
+        ]
+
+    def post(self, operations):
+        return self.client.post('/api/loans/batch/', json.dumps({'operations': operations}), content_type='application/json')
+
+    def assertConsistent(self):
+        self.assertEqual(list(availability.find_drift()), [])
+        self.assertEqual(list(loan_counts.find_drift()), [])
+
+
+class LoanBatchTests(LoanBatchTestCase):
+    def test_each_item_succeeds_or_fails_on_its_own(self):
+        self.post([{'op': 'checkout', 'library_id': 'LIB-1', 'book_id': self.books[0].id}])
+        Member.objects.filter(library_id='LIB-2').update(max_active_loans=0)
+
+        response = self.post([
+            {'op': 'checkout', 'library_id': 'LIB-0', 'book_id': self.books[0].id},
+            {'op': 'checkout', 'library_id': 'LIB-0', 'book_id': self.books[0].id},
+            {'op': 'return', 'library_id': 'LIB-1', 'book_id': self.books[0].id},
+            {'op': 'return', 'library_id': 'LIB-0', 'book_id': self.books[1].id},
+            {'op': 'checkout', 'library_id': 'LIB-2', 'book_id': self.books[1].id},
+            {'op': 'checkout', 'library_id': 'LIB-404', 'book_id': self.books[1].id},
+            {'op': 'renew', 'library_id': 'LIB-0', 'book_id': self.books[1].id},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([(result['status'], result.get('error')) for result in body['results']], [
+            ('ok', None),
+            # The book's other copy went to LIB-1 in the earlier batch.
+            ('error', 'No available copies of this book'),
+            ('ok', None),
+            ('error', 'No active loan found for this book and member'),
+            ('error', 'Member has reached maximum active loans'),
+            ('error', 'Member not found'),
+            ('error', 'op must be one of: checkout, return'),
+        ])
+        self.assertEqual((body['succeeded'], body['failed']), (2, 5))
+        self.assertEqual(list(Loan.objects.filter(status='ACTIVE').values_list('member__library_id', flat=True)), ['LIB-0'])
+        self.assertConsistent()
+
+    def test_conflicting_write_fails_the_whole_batch(self):
+        self.post([{'op': 'checkout', 'library_id': 'LIB-0', 'book_id': self.books[0].id}])
+        loan = Loan.objects.get()
+        status_deltas = availability.status_deltas
+
+        def return_concurrently(*args):
+            # Another desk returns the loan after the batch has read it.
+            Loan.objects.filter(id=loan.id).update(status='RETURNED')
+            return status_deltas(*args)
+
+        with mock.patch.object(batch.availability, 'status_deltas', side_effect=return_concurrently):
+            response = self.post([
+                {'op': 'checkout', 'library_id': 'LIB-1', 'book_id': self.books[1].id},
+                {'op': 'return', 'library_id': 'LIB-0', 'book_id': self.books[0].id},
+            ])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {'error': 'Loans changed during the batch, please retry'})
+        self.assertEqual(list(Loan.objects.values_list('id', 'status')), [(loan.id, 'ACTIVE')])
+        self.assertConsistent()
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def queries(size):
+            operations = [
+                {'op': 'checkout', 'library_id': f'LIB-{i}', 'book_id': self.books[i].id} for i in range(size)
+            ]
+            self.post(operations)
+            operations = [
+                {'op': 'return', 'library_id': f'LIB-{i}', 'book_id': self.books[i].id} for i in range(size)
+            ] + operations
+            with CaptureQueriesContext(connection) as captured:
+                response = self.post(operations)
+            self.assertEqual(response.json()['succeeded'], 2 * size)
+            return len(captured)
+
+        self.assertEqual(queries(2), queries(8))
+        self.assertConsistent()
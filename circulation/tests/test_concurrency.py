@@ -0,0 +1,117 @@
+import random
+import threading
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Count
+from django.test import TransactionTestCase
+
+from circulation import availability, loan_counts
+from circulation.models import Book, BookCopy, Loan, Member
+from circulation.services import CirculationError, checkout, return_loan
+
+
+def run_concurrently(calls):
+    # Runs each call on its own thread, released together, and returns
+    # (results, errors) in call order.
+    barrier = threading.Barrier(len(calls))
+    results, errors = [None] * len(calls), [None] * len(calls)
+
+    def run(index, call):
+        try:
+            barrier.wait()
+            results[index] = call()
+        except Exception as e:
+            errors[index] = e
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=item) for item in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    # Checkouts from several threads against a shared database; on SQLite
+    # this needs the file-backed test database configured in settings.
+
+    def make_members(self, count, max_active_loans=5):
+        return [
+            Member.objects.create(
+                user=User.objects.create_user(f'member{i}'), library_id=f'LIB-{i}', max_active_loans=max_active_loans,
+            )
+            for i in range(count)
+        ]
+
+    def make_book(self, copies, name='Book'):
+        book = Book.objects.create(title=name, author='A', isbn=name[-13:].rjust(13, '0'), category='C')
+        BookCopy.objects.bulk_create([BookCopy(book=book, barcode=f'{name}-{n}') for n in range(copies)])
+        availability.adjust(book.id, total_copies=copies, available_copies=copies)
+        return book
+
+    def assertConsistent(self):
+        open_loans = Loan.objects.filter(status__in=Loan.OPEN_STATUSES)
+        self.assertFalse(open_loans.values('copy').annotate(n=Count('id')).filter(n__gt=1).exists())
+        self.assertEqual(open_loans.count(), BookCopy.objects.filter(status='ON_LOAN').count())
+        self.assertEqual(list(availability.find_drift()), [])
+        self.assertEqual(list(loan_counts.find_drift()), [])
+
+    def test_one_copy_goes_to_exactly_one_member(self):
+        members = self.make_members(8)
+        book = self.make_book(1)
+
+        results, errors = run_concurrently([
+            lambda library_id=member.library_id: checkout(library_id, book.id) for member in members
+        ])
+
+        self.assertEqual(sum(result is not None for result in results), 1)
+        self.assertTrue(all(isinstance(error, CirculationError) for error in errors if error is not None))
+        self.assertEqual(Loan.objects.count(), 1)
+        self.assertEqual(Book.objects.get(id=book.id).available_copies, 0)
+        self.assertConsistent()
+
+    def test_loan_limit_holds_under_concurrent_checkouts(self):
+        member, = self.make_members(1, max_active_loans=2)
+        books = [self.make_book(2, name=f'Book {i}') for i in range(6)]
+
+        results, errors = run_concurrently([lambda book_id=book.id: checkout(member.library_id, book_id) for book in books])
+
+        self.assertEqual(sum(result is not None for result in results), 2)
+        self.assertEqual(
+            {str(error) for error in errors if error is not None}, {'Member has reached maximum active loans'},
+        )
+        self.assertEqual(Member.objects.get(id=member.id).active_loan_count, 2)
+        self.assertConsistent()
+
+    def test_concurrent_claims_stop_at_the_limit(self):
+        member, = self.make_members(1, max_active_loans=3)
+
+        results, errors = run_concurrently([lambda: loan_counts.claim(member.library_id) for _ in range(8)])
+
+        self.assertEqual(errors, [None] * 8)
+        self.assertEqual(results.count(True), 3)
+        self.assertEqual(Member.objects.get(id=member.id).active_loan_count, 3)
+
+    def test_mixed_checkouts_and_returns_keep_counters_in_step(self):
+        members = self.make_members(6, max_active_loans=3)
+        books = [self.make_book(2, name=f'Book {i}') for i in range(4)]
+
+        def desk(seed):
+            rng = random.Random(seed)
+            for _ in range(15):
+                member, book = rng.choice(members), rng.choice(books)
+                try:
+                    if rng.random() < 0.6:
+                        checkout(member.library_id, book.id)
+                    else:
+                        return_loan(member.library_id, book.id)
+                except CirculationError:
+                    pass
+
+        _, errors = run_concurrently([lambda seed=seed: desk(seed) for seed in range(6)])
+
+        self.assertEqual(errors, [None] * 6)
+        self.assertConsistent()
@@ -0,0 +1,154 @@
+import importlib
+import io
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+import cloudinary
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from circulation import covers
+from circulation.models import Book
+
+SIZES = {'small': (64, 96), 'large': (320, 480)}
+
+
+def png_upload(size=(600, 900)):
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, (200, 40, 40, 255)).save(buffer, 'PNG')
+    return SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+
+
+class CoverTestCase(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Covered', author='A', isbn='9780000000001', category='C')
+
+    def use_cloud(self, name):
+        previous = cloudinary.config().cloud_name
+        cloudinary.config(cloud_name=name)
+        self.addCleanup(cloudinary.config, cloud_name=previous)
+
+
+@override_settings(COVER_STORAGE='local', COVER_THUMBNAIL_SIZES=SIZES, MEDIA_URL='/media/')
+class LocalCoverTests(CoverTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def test_thumbnails_are_resized_within_their_bounds(self):
+        urls = covers.save_cover(self.book, png_upload())
+
+        self.assertEqual(set(urls), {'original', 'small', 'large'})
+        self.assertEqual(Book.objects.get(id=self.book.id).cover_urls, urls)
+        for name, (width, height) in SIZES.items():
+            with self.subTest(name):
+                self.assertNotEqual(urls[name], urls['original'])
+                path = os.path.join(self.media_root, urls[name].removeprefix('/media/'))
+                with Image.open(path) as image:
+                    self.assertEqual((image.format, image.size), ('JPEG', (width, height)))
+
+    def test_variants_fall_back_to_the_original_without_pillow(self):
+        with mock.patch.object(covers, 'Image', None):
+            urls = covers.save_cover(self.book, png_upload())
+
+        self.assertTrue(urls['original'].startswith('/media/covers/'))
+        self.assertEqual({urls[name] for name in SIZES}, {urls['original']})
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.media_root) for name in names]
+
+    def test_invalid_image_is_rejected_before_anything_is_written(self):
+        upload = SimpleUploadedFile('cover.png', b'not an image', content_type='image/png')
+
+        response = self.client.post('/api/books/', {
+            'title': 'T', 'author': 'A', 'isbn': '9780000000002', 'category': 'C', 'cover_image': upload,
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(Book.objects.filter(isbn='9780000000002').exists())
+
+    def test_failed_thumbnail_removes_the_files_already_written(self):
+        with mock.patch.object(Image.Image, 'thumbnail', side_effect=[None, OSError('disk full')]):
+            with self.assertRaises(OSError):
+                covers.store_local_cover(png_upload())
+
+        self.assertEqual(self.stored_files(), [])
+
+    def test_admin_upload_fills_the_stored_urls(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        book = {'title': 'Covered', 'author': 'A', 'isbn': '9780000000001', 'category': 'C', 'about': ''}
+
+        response = self.client.post(f'/admin/circulation/book/{self.book.id}/change/', {**book, 'cover_image': png_upload()})
+        self.assertEqual(response.status_code, 302)
+        urls = Book.objects.get(id=self.book.id).cover_urls
+        self.assertEqual(set(urls), {'original', 'small', 'large'})
+        self.assertTrue(urls['original'].startswith('/media/covers/'))
+
+        self.client.post(f'/admin/circulation/book/{self.book.id}/change/', {**book, 'cover_image-clear': 'on'})
+        self.assertEqual(Book.objects.get(id=self.book.id).cover_urls, {})
+
+    def test_list_endpoints_serve_the_stored_urls(self):
+        urls = covers.save_cover(self.book, png_upload())
+        row, = self.client.get('/api/books/').json()
+        self.assertEqual((row['cover_urls'], row['cover_image']), (urls, urls['original']))
+
+
+@override_settings(COVER_THUMBNAIL_SIZES=SIZES)
+class CloudinaryCoverTests(CoverTestCase):
+    def test_variants_are_url_transformations(self):
+        self.use_cloud('demo')
+        urls = covers.cloudinary_urls(cloudinary.CloudinaryImage('covers/abc'))
+        self.assertEqual(urls, {
+            'original': 'https://res.cloudinary.com/demo/image/upload/v1/covers/abc',
+            'small': 'https://res.cloudinary.com/demo/image/upload/c_fill,f_auto,h_96,q_auto,w_64/v1/covers/abc',
+            'large': 'https://res.cloudinary.com/demo/image/upload/c_fill,f_auto,h_480,q_auto,w_320/v1/covers/abc',
+        })
+
+    def test_migration_backfills_existing_covers_without_the_live_module(self):
+        Book.objects.filter(id=self.book.id).update(cover_image='covers/abc')
+        migration = importlib.import_module('circulation.migrations.0009_book_cover_urls')
+        apps = MigrationExecutor(connection).loader.project_state(('circulation', '0009_book_cover_urls')).apps
+        self.use_cloud('demo')
+
+        with override_settings(CLOUDINARY_STORAGE={'CLOUD_NAME': 'demo'}), \
+                mock.patch.object(covers, 'cloudinary_urls', side_effect=AssertionError('live module used')):
+            migration.backfill_cover_urls(apps, None)
+
+        self.assertEqual(
+            Book.objects.get(id=self.book.id).cover_urls['small'],
+            'https://res.cloudinary.com/demo/image/upload/c_fill,f_auto,h_96,q_auto,w_64/v1/covers/abc',
+        )
+
+    def test_backfill_command_fills_only_missing_urls(self):
+        Book.objects.filter(id=self.book.id).update(cover_image='covers/abc')
+        kept = Book.objects.create(
+            title='Kept', author='A', isbn='9780000000002', category='C', cover_image='covers/def',
+            cover_urls={'original': 'kept'},
+        )
+        self.use_cloud('demo')
+
+        with override_settings(CLOUDINARY_STORAGE={'CLOUD_NAME': 'demo'}):
+            call_command('backfill_cover_urls', stdout=StringIO())
+
+        self.assertEqual(
+            Book.objects.get(id=self.book.id).cover_urls['original'],
+            'https://res.cloudinary.com/demo/image/upload/v1/covers/abc',
+        )
+        self.assertEqual(Book.objects.get(id=kept.id).cover_urls, {'original': 'kept'})
+
+    def test_backfill_command_needs_a_cloud_name(self):
+        with override_settings(CLOUDINARY_STORAGE={'CLOUD_NAME': ''}):
+            with self.assertRaisesMessage(CommandError, 'not configured'):
+                call_command('backfill_cover_urls', stdout=StringIO())
@@ -0,0 +1,109 @@
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+
+from circulation.db_routing import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from circulation.models import Book
+
+REPLICAS = ['replica1', 'replica2']
+
+
+def read_alias(request=None):
+    return ReplicaRouter().db_for_read(Book)
+
+
+def respond_with_read_alias(request):
+    return HttpResponse(read_alias())
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(respond_with_read_alias)
+
+    def served_by(self, request):
+        response = self.middleware(request)
+        return response.content.decode(), response
+
+    def pinned(self, request, expires):
+        request.COOKIES[PIN_COOKIE] = f'{expires:.3f}'
+        return request
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(read_alias(), 'default')
+
+    def test_writes_always_go_to_the_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(Book), 'default')
+        self.middleware = ReplicaRoutingMiddleware(lambda request: HttpResponse(router.db_for_write(Book)))
+        self.assertEqual(self.served_by(self.factory.get('/api/books/'))[0], 'default')
+
+    def test_safe_requests_read_from_a_replica(self):
+        for method in ('get', 'head', 'options'):
+            with self.subTest(method=method):
+                alias, response = self.served_by(getattr(self.factory, method)('/api/books/'))
+                if method != 'head':
+                    self.assertIn(alias, REPLICAS)
+                self.assertIn(response['X-DB-Alias'], REPLICAS)
+                self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(read_alias(), 'default')
+
+    def test_unsafe_requests_use_the_primary_and_pin_the_client(self):
+        before = time.time()
+        alias, response = self.served_by(self.factory.post('/api/loans/checkout/'))
+        self.assertEqual(alias, 'default')
+        pin = response.cookies[PIN_COOKIE]
+        self.assertEqual(pin['max-age'], 5)
+        self.assertTrue(pin['httponly'])
+        self.assertGreaterEqual(float(pin.value), round(before + 5, 3) - 0.001)
+
+    def test_pin_window(self):
+        cases = [
+            ('pinned', time.time() + 60, 'default'),
+            ('expired', time.time() - 1, 'replica'),
+        ]
+        for label, expires, expected in cases:
+            with self.subTest(label):
+                alias, _ = self.served_by(self.pinned(self.factory.get('/api/books/'), expires))
+                if expected == 'default':
+                    self.assertEqual(alias, 'default')
+                else:
+                    self.assertIn(alias, REPLICAS)
+
+    def test_malformed_pin_cookie_is_ignored(self):
+        request = self.factory.get('/api/books/')
+        request.COOKIES[PIN_COOKIE] = 'not-a-time'
+        self.assertIn(self.served_by(request)[0], REPLICAS)
+
+    def test_streamed_chunks_read_from_the_request_replica(self):
+        middleware = ReplicaRoutingMiddleware(
+            lambda request: StreamingHttpResponse(read_alias() for _ in range(3)),
+        )
+        response = middleware(self.factory.get('/api/loans/?stream=1'))
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(chunks, [response['X-DB-Alias']] * 3)
+        self.assertEqual(read_alias(), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_middleware_is_unused_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaRoutingMiddleware(respond_with_read_alias)
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRoutingTransactionTests(TransactionTestCase):
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        def view(request):
+            with transaction.atomic():
+                inside = read_alias()
+            return HttpResponse(f'{inside} {read_alias()}')
+
+        response = ReplicaRoutingMiddleware(view)(RequestFactory().get('/api/books/'))
+        inside, outside = response.content.decode().split()
+        self.assertEqual(inside, 'default')
+        self.assertEqual(outside, response['X-DB-Alias'])
+        self.assertIn(outside, REPLICAS)
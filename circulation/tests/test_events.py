@@ -0,0 +1,110 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from circulation import events, holds, views
+from circulation.models import Book, BookCopy, CirculationEvent, Member, Reservation
+from circulation.sweeper import expire_reservations
+
+
+def use_backend(backend):
+    events._backend = backend
+
+
+class EventTestMixin:
+    def setUp(self):
+        self.addCleanup(use_backend, None)
+        self.user = User.objects.create_user('reader')
+        self.member = Member.objects.create(user=self.user, library_id='LIB-1')
+        self.book = Book.objects.create(title='Book', author='A', isbn='0000000000001', category='C')
+        BookCopy.objects.create(book=self.book, barcode='B-1')
+
+
+class PublishTests(EventTestMixin, TestCase):
+    def test_ready_event_carries_the_updated_rows(self):
+        backend = events.InProcessBroadcast()
+        backend._served = True
+        use_backend(backend)
+        with self.captureOnCommitCallbacks(execute=True):
+            hold = holds.place(self.book.id, self.member.id)
+
+        (_, event_type, payload), = backend._buffer
+        payload = json.loads(payload)
+        self.assertEqual(event_type, 'reservation.ready')
+        self.assertEqual(payload['reservation_ids'], [hold.id])
+        row, = payload['reservations']
+        self.assertEqual((row['id'], row['status'], row['copy__barcode']), (hold.id, 'READY', 'B-1'))
+        self.assertEqual(row, self.client.get('/api/reservations/list/').json()[0])
+
+    def test_nothing_is_built_when_no_stream_can_receive_events(self):
+        use_backend(events.InProcessBroadcast())
+        with mock.patch.object(views.LOAN_ROWS, 'values') as build_rows, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/loans/checkout/', {'library_id': 'LIB-1', 'book_id': self.book.id}, content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 201)
+        build_rows.assert_not_called()
+        self.assertEqual(len(events.get_backend()._buffer), 0)
+
+    def test_expiry_announces_only_the_holds_it_expired(self):
+        backend = events.InProcessBroadcast()
+        backend._served = True
+        use_backend(backend)
+        past = timezone.now() - timezone.timedelta(minutes=1)
+        waiting = Reservation.objects.create(book=self.book, member=self.member, expires_at=past)
+        other = Member.objects.create(user=User.objects.create_user('other'), library_id='LIB-2')
+        Reservation.objects.create(
+            book=self.book, member=other, expires_at=past, status='READY', copy=BookCopy.objects.get(),
+        )
+
+        def picked_up_first(reservation, status, now=None):
+            # The READY hold is picked up before the sweep can close it.
+            Reservation.objects.filter(id=reservation.id).update(status='FULFILLED')
+            return False
+
+        with mock.patch('circulation.sweeper.holds.close', side_effect=picked_up_first), \
+                self.captureOnCommitCallbacks(execute=True):
+            expired = expire_reservations()
+
+        self.assertEqual(expired, 1)
+        (_, event_type, payload), = backend._buffer
+        self.assertEqual(event_type, 'reservation.expired')
+        self.assertEqual(json.loads(payload), {'reservation_ids': [waiting.id]})
+
+
+@override_settings(EVENTS_BACKEND='circulation.events.DatabaseEventLog', EVENTS_POLL_SECONDS=0.01, EVENTS_BUFFER_SIZE=3)
+class DatabaseEventLogTests(EventTestMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        use_backend(None)
+
+    def test_events_from_another_process_reach_streams(self):
+        # The sweeper's process: a fresh backend that never served a stream.
+        publisher = events.DatabaseEventLog()
+        subscriber = events.get_backend()
+
+        async def receive():
+            queue = subscriber.subscribe()
+            try:
+                await asyncio.sleep(0.05)
+                await asyncio.to_thread(publisher.publish, 'reservation.expired', '{"reservation_ids":[1]}')
+                return await asyncio.wait_for(queue.get(), 2)
+            finally:
+                subscriber.unsubscribe(queue)
+
+        event_id, event_type, payload = asyncio.run(receive())
+        self.assertEqual(event_type, 'reservation.expired')
+        self.assertEqual(event_id, str(CirculationEvent.objects.get().id))
+
+    def test_replay_and_prune(self):
+        backend = events.get_backend()
+        ids = [backend.publish('loan.returned', f'{{"n":{n}}}')[0] for n in range(5)]
+        self.assertEqual([event[0] for event in backend.replay(ids[1])], ids[2:])
+        self.assertIsNone(backend.replay('not-an-id'))
+        self.assertEqual(events.prune(), 2)
+        self.assertIsNone(backend.replay(ids[0]))
+        self.assertEqual([event[0] for event in backend.replay(ids[1])], ids[2:])
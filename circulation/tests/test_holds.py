@@ -0,0 +1,92 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from circulation import availability, holds
+from circulation.models import Book, BookCopy, Loan, Member, Reservation
+from circulation.services import checkout, return_loan
+from circulation.sweeper import expire_reservations
+
+
+class HoldQueueTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Wanted', author='A', isbn='9780000000001', category='C')
+        BookCopy.objects.create(book=self.book, barcode='B-1')
+        availability.refresh([self.book.id])
+        self.members = [
+            Member.objects.create(user=User.objects.create_user(f'member{i}'), library_id=f'LIB-{i}') for i in range(4)
+        ]
+        # The first member has the only copy out; everyone else queues.
+        checkout(self.members[0].library_id, self.book.id)
+        self.holds = [holds.place(self.book.id, member.id) for member in self.members[1:]]
+
+    def statuses(self):
+        return list(Reservation.objects.order_by('id').values_list('status', flat=True))
+
+    def assertConsistent(self):
+        self.assertEqual(list(availability.find_drift()), [])
+
+    def test_returned_copy_goes_to_the_oldest_hold(self):
+        self.assertEqual([holds.position(hold) for hold in self.holds], [1, 2, 3])
+
+        return_loan(self.members[0].library_id, self.book.id)
+
+        self.assertEqual(self.statuses(), ['READY', 'PENDING', 'PENDING'])
+        self.assertEqual(Reservation.objects.get(id=self.holds[0].id).copy.barcode, 'B-1')
+        self.assertEqual(BookCopy.objects.get().status, 'RESERVED')
+        self.assertEqual([holds.position(Reservation.objects.get(id=hold.id)) for hold in self.holds], [None, 1, 2])
+        self.assertConsistent()
+
+    def test_expired_head_is_skipped_before_the_sweep(self):
+        Reservation.objects.filter(id=self.holds[0].id).update(expires_at=timezone.now() - timezone.timedelta(minutes=1))
+
+        return_loan(self.members[0].library_id, self.book.id)
+
+        self.assertEqual(self.statuses(), ['PENDING', 'READY', 'PENDING'])
+        self.assertEqual(expire_reservations(), 1)
+        self.assertEqual(self.statuses(), ['EXPIRED', 'READY', 'PENDING'])
+        self.assertConsistent()
+
+    def test_cancelling_a_ready_hold_passes_the_copy_on(self):
+        return_loan(self.members[0].library_id, self.book.id)
+
+        response = self.client.post(f'/api/reservations/{self.holds[0].id}/cancel/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses(), ['CANCELLED', 'READY', 'PENDING'])
+        self.assertEqual(Reservation.objects.get(id=self.holds[1].id).copy.barcode, 'B-1')
+        self.assertEqual(BookCopy.objects.get().status, 'RESERVED')
+        self.assertConsistent()
+
+    def test_expired_ready_hold_skips_waiting_holds_that_expired_too(self):
+        return_loan(self.members[0].library_id, self.book.id)
+        now = timezone.now()
+        Reservation.objects.filter(id=self.holds[0].id).update(expires_at=now - timezone.timedelta(minutes=2))
+        # Expires later than the READY hold, so a later sweep batch would
+        # reach it only after the READY hold had released its copy.
+        Reservation.objects.filter(id=self.holds[1].id).update(expires_at=now - timezone.timedelta(minutes=1))
+
+        self.assertEqual(expire_reservations(now, batch_size=1), 2)
+
+        self.assertEqual(self.statuses(), ['EXPIRED', 'EXPIRED', 'READY'])
+        self.assertEqual(Reservation.objects.get(id=self.holds[2].id).copy.barcode, 'B-1')
+        self.assertConsistent()
+
+    def test_ready_hold_is_picked_up_by_its_member(self):
+        return_loan(self.members[0].library_id, self.book.id)
+
+        checkout(self.members[1].library_id, self.book.id)
+
+        self.assertEqual(self.statuses(), ['FULFILLED', 'PENDING', 'PENDING'])
+        self.assertEqual(Loan.objects.get(status='ACTIVE').member_id, self.members[1].id)
+        self.assertConsistent()
+
+    def test_queue_positions_leave_out_expired_holds(self):
+        Reservation.objects.filter(id=self.holds[0].id).update(expires_at=timezone.now() - timezone.timedelta(minutes=1))
+
+        positions = [row['queue_position'] for row in self.client.get(
+            '/api/me/', {'member_id': self.members[2].id},
+        ).json()['reservations']]
+
+        self.assertEqual(positions, [1])
+        self.assertEqual(holds.position(Reservation.objects.get(id=self.holds[2].id)), 2)
@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from circulation import availability, holds, importer
+from circulation.models import Book, BookCopy, Member, Reservation
+
+
+class ImportChunkTests(TestCase):
+    def row(self, isbn='9780000000001', copies=0, barcodes=()):
+        return importer.normalize({'isbn': isbn, 'title': 'Title', 'copies': copies, 'barcodes': list(barcodes)})
+
+    def test_new_copies_serve_the_hold_queue(self):
+        importer.import_chunk([self.row()])
+        book = Book.objects.get()
+        members = [
+            Member.objects.create(user=User.objects.create_user(f'member{i}'), library_id=f'LIB-{i}') for i in range(3)
+        ]
+        with self.captureOnCommitCallbacks():
+            for member in members:
+                holds.place(book.id, member.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.import_chunk([self.row(copies=2)])
+
+        self.assertEqual(
+            list(Reservation.objects.order_by('id').values_list('status', flat=True)), ['READY', 'READY', 'PENDING'],
+        )
+        self.assertEqual(BookCopy.objects.filter(status='RESERVED').count(), 2)
+        book.refresh_from_db()
+        self.assertEqual((book.available_copies, book.pending_reservations), (0, 1))
+        self.assertEqual(list(availability.find_drift()), [])
+
+    def test_barcodes_of_other_books_are_rejected_not_replaced(self):
+        importer.import_chunk([self.row(isbn='9780000000001', barcodes=['B-1', 'B-2'])])
+
+        stats = importer.import_chunk([
+            self.row(isbn='9780000000002', barcodes=['B-2', 'B-3']),
+            self.row(isbn='9780000000003', barcodes=['B-3']),
+        ])
+
+        self.assertEqual(stats['copies_created'], 1)
+        self.assertEqual(stats['barcodes_rejected'], [
+            "barcode 'B-2' for isbn '9780000000002' already belongs to isbn '9780000000001'",
+            "barcode 'B-3' for isbn '9780000000003' already belongs to isbn '9780000000002'",
+        ])
+        self.assertEqual(
+            dict(BookCopy.objects.values_list('barcode', 'book__isbn')),
+            {'B-1': '9780000000001', 'B-2': '9780000000001', 'B-3': '9780000000002'},
+        )
+        self.assertEqual(list(availability.find_drift()), [])
+
+    def test_reimporting_listed_barcodes_is_idempotent(self):
+        row = self.row(copies=3, barcodes=['B-1', 'B-1', 'B-2'])
+        importer.import_chunk([row])
+        stats = importer.import_chunk([row])
+
+        self.assertEqual((stats['copies_created'], stats['barcodes_rejected']), (0, []))
+        self.assertEqual(BookCopy.objects.count(), 3)
+        self.assertEqual(BookCopy.objects.filter(barcode__in=['B-1', 'B-2']).count(), 2)
+
+
+class NormalizeTests(TestCase):
+    def test_every_char_field_is_checked_against_its_max_length(self):
+        record = {'isbn': '9780000000001', 'title': 'Title', 'author': 'A', 'category': 'C'}
+        for field, max_length in importer.MAX_LENGTHS.items():
+            with self.subTest(field):
+                importer.normalize({**record, field: 'x' * max_length})
+                with self.assertRaisesMessage(importer.InvalidRecord, f'{field} is longer than {max_length}'):
+                    importer.normalize({**record, field: 'x' * (max_length + 1)})
+
+    def test_long_barcodes_are_invalid(self):
+        with self.assertRaisesMessage(importer.InvalidRecord, 'is longer than'):
+            importer.normalize({'isbn': '9780000000001', 'title': 'Title', 'barcodes': ['B' * 101]})
+
+
+class ImportDuplicateIsbnTests(TestCase):
+    def test_repeated_isbn_in_a_chunk_is_rejected(self):
+        rows = [
+            importer.normalize({'isbn': '9780000000001', 'title': 'First'}),
+            importer.normalize({'isbn': '9780000000001', 'title': 'Second'}),
+        ]
+
+        stats = importer.import_chunk(rows)
+
+        self.assertEqual(stats['books_created'], 1)
+        self.assertEqual(stats['records_rejected'], ["record for isbn '9780000000001': isbn repeats an earlier record"])
+        self.assertEqual(Book.objects.get().title, 'First')
+
+
+class ImportCatalogCommandTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.paths = []
+        for name in ('a.jsonl', 'b.jsonl'):
+            path = os.path.join(directory.name, name)
+            with open(path, 'w') as f:
+                f.write(json.dumps({'isbn': name, 'title': name, 'copies': 1}) + '\n')
+            self.paths.append(path)
+
+    def test_resume_rejects_a_checkpoint_for_another_file(self):
+        first, second = self.paths
+        with open(f'{second}.checkpoint', 'w') as f:
+            json.dump({'path': first, 'records': 1}, f)
+
+        with self.assertRaisesMessage(CommandError, 'is for'):
+            call_command('import_catalog', second, '--resume', '--checkpoint', f'{second}.checkpoint', stdout=StringIO())
+        self.assertFalse(Book.objects.exists())
+
+    def test_resume_skips_committed_records_of_the_same_file(self):
+        path = self.paths[0]
+        with open(f'{path}.checkpoint', 'w') as f:
+            json.dump({'path': path, 'records': 1}, f)
+
+        call_command('import_catalog', path, '--resume', stdout=StringIO())
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_invalid_and_repeated_records_are_counted(self):
+        path = self.paths[0]
+        with open(path, 'w') as f:
+            for record in (
+                {'isbn': '9780000000001', 'title': 'Kept'},
+                {'isbn': '9780000000001', 'title': 'Repeat'},
+                {'isbn': '9780000000002', 'title': 'T', 'category': 'c' * 101},
+            ):
+                f.write(json.dumps(record) + '\n')
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command('import_catalog', path, stdout=stdout, stderr=stderr)
+
+        self.assertEqual(list(Book.objects.values_list('isbn', 'title')), [('9780000000001', 'Kept')])
+        self.assertIn('2 invalid', stdout.getvalue())
+        self.assertIn('Skipping record 3: category is longer than 100', stderr.getvalue())
+        self.assertIn("Skipping record for isbn '9780000000001'", stderr.getvalue())
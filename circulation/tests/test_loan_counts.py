@@ -0,0 +1,69 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from circulation import availability, loan_counts
+from circulation.models import Book, BookCopy, Loan, Member
+from circulation.services import checkout, checkout_by_barcode, return_loan
+from circulation.sweeper import sweep
+
+
+class LoanCountTests(TestCase):
+    def setUp(self):
+        self.books = []
+        for i in range(3):
+            book = Book.objects.create(title=f'Book {i}', author='A', isbn=f'97800000000{i:02d}', category='C')
+            BookCopy.objects.create(book=book, barcode=f'B-{i}')
+            self.books.append(book)
+        availability.refresh([book.id for book in self.books])
+        self.member = Member.objects.create(user=User.objects.create_user('reader'), library_id='LIB-1')
+
+    def assertCountMatchesOpenLoans(self, expected):
+        open_loans = Loan.objects.filter(member=self.member, status__in=Loan.OPEN_STATUSES).count()
+        self.assertEqual((Member.objects.get(id=self.member.id).active_loan_count, open_loans), (expected, expected))
+        self.assertEqual(list(loan_counts.find_drift()), [])
+
+    def test_checkout_and_return(self):
+        checkout('LIB-1', self.books[0].id)
+        checkout_by_barcode('LIB-1', 'B-1')
+        self.assertCountMatchesOpenLoans(2)
+
+        return_loan('LIB-1', self.books[0].id)
+
+        self.assertCountMatchesOpenLoans(1)
+
+    def test_batch(self):
+        checkout('LIB-1', self.books[0].id)
+
+        response = self.client.post('/api/loans/batch/', json.dumps({'operations': [
+            {'op': 'return', 'library_id': 'LIB-1', 'book_id': self.books[0].id},
+            {'op': 'checkout', 'library_id': 'LIB-1', 'book_id': self.books[1].id},
+            {'op': 'checkout', 'library_id': 'LIB-1', 'book_id': self.books[2].id},
+        ]}), content_type='application/json')
+
+        self.assertEqual(response.json()['succeeded'], 3)
+        self.assertCountMatchesOpenLoans(2)
+
+    def test_overdue_loans_still_count_after_the_sweep(self):
+        checkout('LIB-1', self.books[0].id)
+        checkout('LIB-1', self.books[1].id)
+        Loan.objects.update(due_date=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(sweep()['loans_overdue'], 2)
+        self.assertCountMatchesOpenLoans(2)
+
+        return_loan('LIB-1', self.books[0].id)
+
+        self.assertCountMatchesOpenLoans(1)
+
+    def test_counts_never_go_below_zero(self):
+        Member.objects.filter(id=self.member.id).update(active_loan_count=1)
+
+        loan_counts.adjust_many({self.member.id: -3})
+        self.assertEqual(Member.objects.get(id=self.member.id).active_loan_count, 0)
+
+        loan_counts.release(self.member.id)
+        self.assertEqual(Member.objects.get(id=self.member.id).active_loan_count, 0)
@@ -0,0 +1,90 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase
+from django.utils import timezone
+
+from circulation import availability, penalties, sweeper
+from circulation.admin import PenaltyAdmin
+from circulation.models import Book, BookCopy, Loan, Member, Penalty
+from circulation.services import checkout, return_loan
+
+SWEEP_RESULT = {'reservations_expired': 1, 'loans_overdue': 0, 'penalties_created': 0, 'penalties_updated': 0}
+
+
+class RebuildBalancesTests(TestCase):
+    def setUp(self):
+        self.member = Member.objects.create(user=User.objects.create_user('reader'), library_id='LIB-1')
+        Penalty.objects.create(member=self.member, amount=Decimal('30.00'), reason='Overdue by 3 hours')
+
+    def balance(self):
+        return Member.objects.get(id=self.member.id).outstanding_balance
+
+    def test_drifted_balance_is_rebuilt(self):
+        self.assertEqual(penalties.rebuild_balances(), 1)
+        self.assertEqual(self.balance(), Decimal('30.00'))
+        self.assertEqual(list(penalties.find_balance_drift()), [])
+
+    def test_balance_changed_after_the_read_is_left_alone(self):
+        drift = list(penalties.find_balance_drift())
+        # A penalty settled between the drift scan and the rebuild.
+        penalties.adjust_balances({self.member.id: Decimal('10.00')})
+
+        with mock.patch.object(penalties, 'find_balance_drift', return_value=drift):
+            self.assertEqual(penalties.rebuild_balances(), 0)
+        self.assertEqual(self.balance(), Decimal('10.00'))
+
+
+@mock.patch('circulation.management.commands.sweep_circulation.time.sleep', side_effect=[None, KeyboardInterrupt])
+class SweepLoopTests(TestCase):
+    def test_loop_logs_a_failed_sweep_and_keeps_going(self, sleep):
+        stdout = StringIO()
+        with mock.patch(
+            'circulation.management.commands.sweep_circulation.sweep',
+            side_effect=[OperationalError('database is locked'), SWEEP_RESULT],
+        ) as sweep, self.assertLogs('circulation.sweeper', 'ERROR') as logs:
+            call_command('sweep_circulation', '--loop', '--interval', '0', stdout=stdout)
+
+        self.assertEqual(sweep.call_count, 2)
+        self.assertIn('database is locked', logs.output[0])
+        self.assertIn('Expired 1 reservations', stdout.getvalue())
+
+    def test_single_sweep_raises(self, sleep):
+        with mock.patch(
+            'circulation.management.commands.sweep_circulation.sweep', side_effect=OperationalError('database is locked'),
+        ):
+            with self.assertRaises(OperationalError):
+                call_command('sweep_circulation', stdout=StringIO())
+
+
+class ResolvedAccruingPenaltyTests(TestCase):
+    def test_resolving_mid_accrual_keeps_the_balance_in_step(self):
+        member = Member.objects.create(user=User.objects.create_user('reader'), library_id='LIB-1')
+        book = Book.objects.create(title='Late', author='A', isbn='9780000000001', category='C')
+        BookCopy.objects.create(book=book, barcode='B-1')
+        availability.refresh([book.id])
+        checkout(member.library_id, book.id)
+        now = timezone.now()
+        Loan.objects.update(due_date=now - timezone.timedelta(hours=3))
+
+        sweeper.mark_overdue_loans(now)
+        sweeper.accrue_penalties(now)
+        penalty = Penalty.objects.get()
+        self.assertEqual((penalty.amount, Member.objects.get(id=member.id).outstanding_balance), (Decimal('30.00'), 30))
+
+        penalty.resolved = True
+        PenaltyAdmin(Penalty, admin.site).save_model(None, penalty, None, change=True)
+        sweeper.accrue_penalties(now + timezone.timedelta(hours=2))
+        self.assertEqual(Penalty.objects.get().amount, Decimal('50.00'))
+        self.assertEqual(list(penalties.find_balance_drift()), [])
+
+        return_loan(member.library_id, book.id)
+        penalty = Penalty.objects.get()
+        self.assertFalse(penalty.accruing)
+        self.assertEqual(Member.objects.get(id=member.id).outstanding_balance, 0)
+        self.assertEqual(list(penalties.find_balance_drift()), [])
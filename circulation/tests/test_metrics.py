@@ -0,0 +1,75 @@
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from circulation import metrics
+from circulation.models import Book, BookCopy, Loan, Member
+
+SERVER_TIMING = re.compile(r'^db;dur=[\d.]+;desc="(\d+) queries", view;dur=[\d.]+$')
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def sample(self, name, route):
+        # The value of one series in the /api/metrics/ output.
+        pattern = re.compile(rf'^{name}{{route="{re.escape(route)}",method="GET"}} (\S+)$', re.MULTILINE)
+        match = pattern.search(self.client.get('/api/metrics/').content.decode())
+        return float(match.group(1)) if match else None
+
+    def test_server_timing_counts_the_requests_queries(self):
+        Book.objects.create(title='T', author='A', isbn='9780000000001', category='C')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/books/', {'page_size': 10})
+        # Read now: the next request clears the connection's query log.
+        count = len(queries)
+
+        match = SERVER_TIMING.match(response['Server-Timing'])
+        self.assertIsNotNone(match, response['Server-Timing'])
+        self.assertEqual(int(match.group(1)), count)
+        self.assertEqual(self.sample('library_request_queries_sum', 'api/books/'), count)
+        self.assertEqual(self.sample('library_request_queries_count', 'api/books/'), 1)
+
+    def test_streamed_body_queries_are_recorded_once_the_response_closes(self):
+        book = Book.objects.create(title='T', author='A', isbn='9780000000001', category='C')
+        copy = BookCopy.objects.create(book=book, barcode='B-1')
+        member = Member.objects.create(user=User.objects.create_user('reader'), library_id='LIB-1')
+        Loan.objects.create(copy=copy, member=member, due_date=copy.created_at)
+
+        response = self.client.get('/api/loans/', {'stream': '1'})
+        self.assertEqual(SERVER_TIMING.match(response['Server-Timing']).group(1), '0')
+        self.assertIsNone(self.sample('library_request_queries_sum', 'api/loans/'))
+
+        with CaptureQueriesContext(connection) as queries:
+            body = b''.join(response.streaming_content)
+
+        self.assertEqual((len(queries), body.count(b'"id"')), (1, 1))
+        self.assertEqual(self.sample('library_request_queries_sum', 'api/loans/'), 1)
+
+    def test_unmatched_routes_share_one_label(self):
+        self.client.get('/api/no-such-endpoint/')
+
+        self.assertIn(
+            'library_requests_total{route="unmatched",method="GET",status="404"} 1',
+            self.client.get('/api/metrics/').content.decode(),
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_requires_the_token_when_set(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('# TYPE library_request_duration_seconds histogram', response.content.decode())
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_middleware_adds_no_header(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/health/'))
@@ -0,0 +1,133 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.test import TestCase
+
+from circulation import catalog_cache
+from circulation.models import Book, BookCopy, CatalogVersion, Loan, Member
+from circulation.pagination import encode_cursor
+from circulation.seeding import seed_dataset
+from circulation.services import checkout, return_loan
+
+
+class BookPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(books=60, members=5, loans=0, reservations=0)
+
+    def setUp(self):
+        catalog_cache.get_cache().clear()
+        catalog_cache.current_version()
+
+    def walk(self, ordering, page_size):
+        rows, cursor, pages = [], None, 0
+        while True:
+            url = f'/api/books/?ordering={ordering}&page_size={page_size}'
+            response = self.client.get(url + (f'&cursor={cursor}' if cursor else ''))
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertLessEqual(len(data['results']), page_size)
+            rows.extend(data['results'])
+            pages += 1
+            cursor = data['next']
+            if cursor is None:
+                return rows, pages
+
+    def test_pages_cover_the_catalog_once_in_order(self):
+        for ordering, key in (('id', lambda row: row['id']), ('title', lambda row: (row['title'], row['id']))):
+            with self.subTest(ordering=ordering):
+                rows, pages = self.walk(ordering, 25)
+                self.assertEqual(pages, 3)
+                self.assertEqual(len({row['id'] for row in rows}), Book.objects.count())
+                self.assertEqual(rows, sorted(rows, key=key))
+
+    def test_page_is_cached_with_live_counters(self):
+        # Both a miss and a hit read the catalog version; the miss builds the
+        # page, the hit only reads the counters of the books on it.
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/books/?ordering=id&page_size=10')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        book = response.json()['results'][0]
+
+        member = Member.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(member.library_id, book['id'])
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/books/?ordering=id&page_size=10')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        cached = response.json()['results'][0]
+        self.assertEqual(cached['available_copies'], book['available_copies'] - 1)
+        self.assertEqual(cached['on_loan_copies'], book['on_loan_copies'] + 1)
+
+        # The bare array is built per request rather than cached.
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/books/')
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(response.json()[0]['available_copies'], cached['available_copies'])
+
+    def test_version_bump_from_another_process_is_seen(self):
+        self.client.get('/api/books/?page_size=10')
+        # What a bump from the importer or another worker looks like here:
+        # the row changes, this process's cache does not.
+        CatalogVersion.objects.update(version=F('version') + 1)
+        self.assertEqual(self.client.get('/api/books/?page_size=10')['X-Cache'], 'MISS')
+
+    def test_page_size_is_capped(self):
+        with self.settings(API_MAX_PAGE_SIZE=7):
+            data = self.client.get('/api/books/?page_size=1000').json()
+        self.assertEqual(len(data['results']), 7)
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ('not-a-cursor', encode_cursor({'id': 1}), encode_cursor(['a', 1, 2])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/books/?ordering=title&cursor={cursor}')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+    def test_unknown_ordering_is_rejected(self):
+        self.assertEqual(self.client.get('/api/books/?ordering=isbn&page_size=5').status_code, 400)
+
+    def test_unpaginated_list_is_a_bare_array(self):
+        data = self.client.get('/api/books/').json()
+        self.assertIsInstance(data, list)
+        self.assertEqual(len(data), Book.objects.count())
+
+
+class DashboardQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pw')
+        self.member = Member.objects.create(user=self.user, library_id='LIB-1', max_active_loans=10)
+        for i in range(4):
+            book = Book.objects.create(title=f'Book {i}', author='A', isbn=f'{i:013d}', category='C')
+            BookCopy.objects.create(book=book, barcode=f'B-{i}')
+        self.client.force_login(self.user)
+
+    def test_me_query_count_does_not_grow_with_loans(self):
+        books = list(Book.objects.order_by('id'))
+        checkout(self.member.library_id, books[0].id)
+        with self.assertNumQueries(7):
+            self.assertEqual(len(self.client.get('/api/me/').json()['loans']), 1)
+        for book in books[1:]:
+            checkout(self.member.library_id, book.id)
+        with self.assertNumQueries(7):
+            self.assertEqual(len(self.client.get('/api/me/').json()['loans']), 4)
+        self.assertEqual(Loan.objects.filter(member=self.member).count(), 4)
+
+    def test_me_lists_returned_loans_as_history(self):
+        books = list(Book.objects.order_by('id'))
+        for book in books[:2]:
+            checkout(self.member.library_id, book.id)
+        return_loan(self.member.library_id, books[0].id)
+
+        data = self.client.get('/api/me/').json()
+        self.assertEqual([loan['copy__book__id'] for loan in data['loans']], [books[1].id])
+        self.assertEqual([(loan['copy__book__id'], loan['status']) for loan in data['history']], [(books[0].id, 'RETURNED')])
+
+    def test_me_without_a_session_takes_member_id(self):
+        # Cross-origin clients send no session cookie.
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/me/').status_code, 401)
+        with self.assertNumQueries(5):
+            data = self.client.get(f'/api/me/?member_id={self.member.id}').json()
+        self.assertEqual(data['member']['library_id'], 'LIB-1')
+        self.assertEqual(self.client.get('/api/me/?member_id=0').status_code, 404)
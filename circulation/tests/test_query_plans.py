@@ -0,0 +1,30 @@
+from django.db import connection
+from django.test import TestCase
+
+from circulation.management.commands.check_query_plans import FULL_SCAN_PATTERNS, full_scans, hot_query_plans
+from circulation.seeding import seed_dataset
+
+
+class HotQueryPlanTests(TestCase):
+    # The queries the hot circulation paths actually send must be served by
+    # indexes. Runs against whichever database the suite uses (SQLite, or
+    # PostgreSQL via DATABASE_URL).
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(books=2000, members=400, loans=8000, reservations=1500)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_no_full_table_scans(self):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            self.skipTest(f'Query plans are not checked on {connection.vendor}')
+        paths = set()
+        for name, sql, plan in hot_query_plans():
+            paths.add(name)
+            with self.subTest(path=name, sql=sql[:120]):
+                self.assertEqual(full_scans(plan, pattern), [], f'{name} plans a full table scan:\n{sql}\n{plan}')
+        # The plans cover the dashboard's queue positions, search, and the
+        # lock a return takes.
+        self.assertTrue({'me', 'search', 'return', 'archive_loans', 'sweep'} <= paths)
@@ -0,0 +1,92 @@
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.test import TestCase
+
+from circulation.models import Book
+from circulation.search import SQLITE_TRIGGERS, search_book_ids
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        self.python = Book.objects.create(
+            title='Learning Python', author='Mark Lutz', isbn='9780000000001', category='Technology',
+        )
+        self.snakes = Book.objects.create(
+            title='Snakes of the World', author='Ray Hoser', isbn='9780000000002', category='Science',
+            about='Includes the python and the boa.',
+        )
+        self.poems = Book.objects.create(title='Collected Poems', author='A', isbn='9780000000003', category='Poetry')
+
+    def search(self, query):
+        return search_book_ids(query, limit=10)
+
+
+class SearchEndpointTests(SearchTestCase):
+    def test_title_matches_rank_above_description_matches(self):
+        response = self.client.get('/api/books/search/', {'q': 'python'})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([row['id'] for row in body['results']], [self.python.id, self.snakes.id])
+        self.assertEqual((body['page'], body['next_page']), (1, None))
+        self.assertEqual(body['results'][0]['available_copies'], 0)
+
+    def test_pages(self):
+        response = self.client.get('/api/books/search/', {'q': 'python', 'page_size': 1})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.python.id])
+        self.assertEqual(response.json()['next_page'], 2)
+
+        response = self.client.get('/api/books/search/', {'q': 'python', 'page_size': 1, 'page': 2})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.snakes.id])
+        self.assertIsNone(response.json()['next_page'])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/books/search/', {'q': '  '}).status_code, 400)
+
+
+class SearchMatchingTests(SearchTestCase):
+    def test_terms_match_word_prefixes(self):
+        self.assertEqual(self.search('pyth'), [self.python.id, self.snakes.id])
+        self.assertEqual(self.search('learn pyth'), [self.python.id])
+        self.assertEqual(self.search('ython'), [])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search('python poems'), [])
+
+    def test_isbn_and_author(self):
+        self.assertEqual(self.search('9780000000003'), [self.poems.id])
+        self.assertEqual(self.search('lutz'), [self.python.id])
+
+    def test_punctuation_only_matches_nothing(self):
+        self.assertEqual(self.search('"*()'), [])
+
+
+class SearchIndexSyncTests(SearchTestCase):
+    def test_updated_book_is_found_by_its_new_title_only(self):
+        Book.objects.filter(id=self.poems.id).update(title='Selected Verse')
+
+        self.assertEqual(self.search('poems'), [])
+        self.assertEqual(self.search('verse'), [self.poems.id])
+
+    def test_deleted_book_is_not_found(self):
+        self.python.delete()
+
+        self.assertEqual(self.search('python'), [self.snakes.id])
+
+    def test_post_migrate_restores_dropped_triggers(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('The search index is kept in sync by triggers on SQLite only')
+        with connection.cursor() as cursor:
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {name}')
+        Book.objects.create(title='Missed While Dropped', author='A', isbn='9780000000004', category='C')
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'circulation_book_fts%'")
+            self.assertEqual({row[0] for row in cursor.fetchall()}, set(SQLITE_TRIGGERS))
+        # The index is rebuilt too, so rows written meanwhile are found.
+        self.assertEqual(len(self.search('missed')), 1)
+        Book.objects.create(title='Written Afterwards', author='A', isbn='9780000000005', category='C')
+        self.assertEqual(len(self.search('afterwards')), 1)
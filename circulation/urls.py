@@ -1,17 +1,35 @@
+from django.conf import settings
 from django.urls import path
-from .views import BookListCreateView, BookCopyListCreateView, MemberView, LoanCreateView, LoanReturnView, ReservationView, signup, signin, LoanListView, ReservationListView, cancel_reservation, health_check
+from .views import BookListCreateView, BookSearchView, BookCopyListCreateView, MemberView, LoanCreateView, LoanReturnView, LoanHistoryView, LoanBatchView, ReservationView, signup, signin, signout, LoanListView, ReservationListView, cancel_reservation, health_check, cache_stats, request_metrics, me, circulation_events
+
+if getattr(settings, 'ASYNC_READ_VIEWS', False):
+    # ASGI deployment profile: the read endpoints run on the async ORM.
+    from .async_views import (
+        AsyncBookListCreateView as BookListCreateView,
+        AsyncLoanListView as LoanListView,
+        AsyncMemberView as MemberView,
+        AsyncReservationListView as ReservationListView,
+    )
 
 urlpatterns = [
     path('health/', health_check, name='health-check'),
+    path('cache/stats/', cache_stats, name='cache-stats'),
+    path('metrics/', request_metrics, name='metrics'),
+    path('events/', circulation_events, name='circulation-events'),
     path('books/', BookListCreateView.as_view(), name='book-list-create'),
+    path('books/search/', BookSearchView.as_view(), name='book-search'),
     path('books/<int:book_id>/copies/', BookCopyListCreateView.as_view(), name='book-copy-list-create'),
     path('members/', MemberView.as_view(), name='member-list-create'),
+    path('me/', me, name='me'),
     path('loans/', LoanListView.as_view(), name='loan-list'),
+    path('loans/history/', LoanHistoryView.as_view(), name='loan-history'),
     path('loans/checkout/', LoanCreateView.as_view(), name='loan-checkout'),
     path('loans/return/', LoanReturnView.as_view(), name='loan-return'),
+    path('loans/batch/', LoanBatchView.as_view(), name='loan-batch'),
     path('reservations/', ReservationView.as_view(), name='reservation-create'),
     path('reservations/list/', ReservationListView.as_view(), name='reservation-list'),
     path('reservations/<int:reservation_id>/cancel/', cancel_reservation, name='reservation-cancel'),
     path('signup/', signup, name='signup'),
     path('signin/', signin, name='signin'),
+    path('signout/', signout, name='signout'),
 ]
@@ -1,4 +1,6 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 
 from django.views.decorators.csrf import csrf_exempt
 
@@ -7,37 +9,74 @@ from django.views.decorators.csrf import csrf_exempt
 def health_check(request):
     return JsonResponse({'status': 'ok', 'message': 'Server is running'}, status=200)
 from django.utils.decorators import method_decorator
-from django.utils import timezone
 from django.views import View
-from .models import Book, BookCopy, Member, Loan, Reservation, Penalty, UserProfile
+from .models import ArchivedLoan, Book, BookCopy, Member, Loan, Reservation, Penalty, UserProfile
+from . import auth_tokens, availability, catalog_cache, events, holds, metrics
+from .batch import apply_loan_batch
+from .covers import save_cover
+from .services import (
+    CirculationError, checkout, checkout_by_barcode, create_copies, return_by_barcode, return_loan,
+)
+from .pagination import InvalidCursor, get_page_size, paginate_keyset, paginate_keyset_merged, wants_pagination
+from .search import search_book_ids
+from .serializers import (
+    BOOK_ROWS, COPY_ROWS, LOAN_HISTORY_ROWS, LOAN_ROWS, MEMBER_LOAN_ROWS, MEMBER_RESERVATION_ROWS, MEMBER_ROWS, PENALTY_ROWS,
+    RESERVATION_ROWS,
+    cover_image_url, dumps, json_response,
+)
+from .streaming import streaming_json_response, wants_stream
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 import json
 import uuid
-import traceback
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import BooleanField, CharField, Value
+
+# Returned loans included in /api/me/.
+ME_HISTORY_LIMIT = 20
+
+BOOK_ORDERINGS = {
+    'id': ('id',),
+    'title': ('title', 'id'),
+}
+
+
+def cached_json_response(body, hit):
+    response = HttpResponse(body, content_type='application/json')
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class BookListCreateView(View):
     def get(self, request):
-        books = Book.objects.all()
-        books_data = []
-        for book in books:
-            book_dict = {
-                'id': book.id,
-                'title': book.title,
-                'author': book.author,
-                'isbn': book.isbn,
-                'category': book.category,
-                'isbn': book.isbn,
-                'category': book.category,
-                'about': book.about,
-                'cover_image': book.cover_image.url if book.cover_image else None,
-                'created_at': book.created_at,
-                'updated_at': book.updated_at,
-            }
-            books_data.append(book_dict)
-        return JsonResponse(books_data, safe=False)
+        books = BOOK_ROWS.values(Book.objects.all())
+
+        # Without cursor/page_size the full catalog is returned as a bare array
+        # for older clients. It is not cached: its availability counters are
+        # live, and reading those for every book would cost nearly as much as
+        # building the array.
+        if not wants_pagination(request):
+            return json_response(BOOK_ROWS.many(books.order_by('id').iterator()))
+
+        ordering_name = request.GET.get('ordering', 'title')
+        ordering = BOOK_ORDERINGS.get(ordering_name)
+        if ordering is None:
+            return JsonResponse({'error': 'ordering must be one of: ' + ', '.join(BOOK_ORDERINGS)}, status=400)
+
+        def build_page():
+            rows, next_cursor = paginate_keyset(books, ordering, request, BOOK_ROWS.row)
+            return {'results': rows, 'next': next_cursor}
+
+        cache_key = f"books:{ordering_name}:{get_page_size(request)}:{request.GET.get('cursor', '')}"
+        try:
+            page, hit = catalog_cache.get_or_build(cache_key, build_page)
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        if hit:
+            rows = page['results']
+            availability.with_counters(rows, availability.current_counters([row['id'] for row in rows]))
+        return cached_json_response(dumps(page), hit)
 
     def post(self, request):
         try:
@@ -50,14 +89,16 @@ class BookListCreateView(View):
                 about = request.POST.get('about')
                 cover_image = request.FILES.get('cover_image')
                 
-                book = Book.objects.create(
-                    title=title,
-                    author=author,
-                    isbn=isbn,
-                    category=category,
-                    about=about,
-                    cover_image=cover_image
-                )
+                with transaction.atomic():
+                    book = Book.objects.create(
+                        title=title,
+                        author=author,
+                        isbn=isbn,
+                        category=category,
+                        about=about
+                    )
+                    if cover_image:
+                        save_cover(book, cover_image)
             else:
                 # Handle JSON data (backward compatibility)
                 data = json.loads(request.body)
@@ -69,15 +110,52 @@ class BookListCreateView(View):
                     about=data.get('about')
                 )
             
+            catalog_cache.invalidate()
             return JsonResponse({
                 'id': book.id,
                 'title': book.title,
-                'cover_image': book.cover_image.url if book.cover_image else None,
+                'cover_image': cover_image_url(book.cover_urls),
+                'cover_urls': book.cover_urls,
                 'message': 'Book created successfully'
             }, status=201)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
 
+@method_decorator(csrf_exempt, name='dispatch')
+class BookSearchView(View):
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return JsonResponse({'error': 'q is required'}, status=400)
+        try:
+            page = max(1, int(request.GET.get('page', 1)))
+        except ValueError:
+            return JsonResponse({'error': 'page must be an integer'}, status=400)
+        page_size = get_page_size(request)
+
+        book_ids = search_book_ids(query, limit=page_size + 1, offset=(page - 1) * page_size)
+        has_next = len(book_ids) > page_size
+        book_ids = book_ids[:page_size]
+
+        books = catalog_cache.get_many_or_build('book', book_ids, lambda missing: {
+            row['id']: row for row in BOOK_ROWS.many(BOOK_ROWS.values(Book.objects.filter(id__in=missing)))
+        })
+        availability.with_counters(books.values(), availability.current_counters(list(books)))
+        return json_response({
+            'results': [books[book_id] for book_id in book_ids if book_id in books],
+            'page': page,
+            'next_page': page + 1 if has_next else None,
+        })
+
+def cache_stats(request):
+    return JsonResponse(catalog_cache.stats())
+
+def request_metrics(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @csrf_exempt
 def signup(request):
     if request.method == 'POST':
@@ -118,8 +196,6 @@ def signin(request):
             
             user = authenticate(request, username=username, password=password)
             if user is not None:
-                login(request, user)
-                
                 # Get user profile to determine user type
                 try:
                     profile = UserProfile.objects.get(user=user)
@@ -128,27 +204,50 @@ def signin(request):
                     # If no profile exists, create one with MEMBER type (for existing users)
                     profile = UserProfile.objects.create(user=user, user_type='MEMBER')
                     user_type = 'MEMBER'
-                
-                return JsonResponse({
+
+                member_id = Member.objects.filter(user=user).values_list('id', flat=True).first()
+                response_data = {
                     'message': 'Login successful',
                     'user_id': user.id,
                     'username': user.username,
-                    'user_type': user_type
-                }, status=200)
+                    'user_type': user_type,
+                    'member_id': member_id,
+                }
+                # Stateless mode: the token replaces the session entirely.
+                if auth_tokens.tokens_enabled():
+                    token, expires_at = auth_tokens.issue_token(user.id, member_id, user_type)
+                    response_data.update(token=token, token_expires_at=expires_at)
+                else:
+                    login(request, user)
+
+                return JsonResponse(response_data, status=200)
             else:
                 return JsonResponse({'error': 'Invalid credentials'}, status=401)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+@csrf_exempt
+def signout(request):
+    if request.method == 'POST':
+        token = auth_tokens.bearer_token(request) if auth_tokens.tokens_enabled() else None
+        if token:
+            try:
+                auth_tokens.revoke_token(auth_tokens.verify_token(token))
+            except auth_tokens.InvalidToken as e:
+                return JsonResponse({'error': str(e)}, status=401)
+        else:
+            logout(request)
+        return JsonResponse({'message': 'Logout successful'}, status=200)
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class BookCopyListCreateView(View):
     def get(self, request, book_id):
         try:
             if not Book.objects.filter(id=book_id).exists():
                 return JsonResponse({'error': 'Book not found'}, status=404)
-            copies = list(BookCopy.objects.filter(book_id=book_id).values())
-            return JsonResponse(copies, safe=False)
+            return json_response(COPY_ROWS.many(COPY_ROWS.values(BookCopy.objects.filter(book_id=book_id))))
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
 
@@ -160,16 +259,10 @@ class BookCopyListCreateView(View):
             data = json.loads(request.body)
             count = int(data.get('count', 1))
             
-            created_copies = []
-            for _ in range(count):
-                # Auto-generate internal barcode
-                internal_barcode = f"COPY-{uuid.uuid4().hex[:8].upper()}"
-                
-                copy = BookCopy.objects.create(
-                    book_id=book_id,
-                    barcode=internal_barcode
-                )
-                created_copies.append(copy.barcode)
+            if count < 1:
+                return JsonResponse({'error': 'count must be a positive integer'}, status=400)
+
+            created_copies = create_copies(book_id, count)
             
             return JsonResponse({
                 'message': f'{count} copies created successfully',
@@ -182,8 +275,7 @@ class BookCopyListCreateView(View):
 @method_decorator(csrf_exempt, name='dispatch')
 class MemberView(View):
     def get(self, request):
-        members = list(Member.objects.values('id', 'user__username', 'library_id', 'max_active_loans'))
-        return JsonResponse(members, safe=False)
+        return json_response(MEMBER_ROWS.many(MEMBER_ROWS.values(Member.objects.all())))
 
     def post(self, request):
         try:
@@ -214,38 +306,15 @@ class LoanCreateView(View):
             data = json.loads(request.body)
             book_id = data.get('book_id')
             library_id = data.get('library_id')
-            
-            member = Member.objects.filter(library_id=library_id).first()
-            if not member:
-                return JsonResponse({'error': 'Member not found'}, status=404)
+            barcode = data.get('barcode')
 
-            # Find an available copy of the book
-            copy = BookCopy.objects.filter(book_id=book_id, status='AVAILABLE').first()
-            if not copy:
-                return JsonResponse({'error': 'No available copies of this book'}, status=400)
-            
-            if Loan.objects.filter(member=member, status='ACTIVE').count() >= member.max_active_loans:
-                return JsonResponse({'error': 'Member has reached maximum active loans'}, status=400)
-            
-            due_date = timezone.now() + timezone.timedelta(minutes=30)
-            loan = Loan.objects.create(
-                copy=copy,
-                member=member,
-                due_date=due_date
-            )
-            copy.status = 'ON_LOAN'
-            copy.save()
-            
-            # Check if this member has a pending reservation for this book and fulfill it
-            pending_reservation = Reservation.objects.filter(
-                book_id=book_id,
-                member=member,
-                status='PENDING'
-            ).first()
-            
-            if pending_reservation:
-                pending_reservation.status = 'FULFILLED'
-                pending_reservation.save()
+            if barcode:
+                loan, pending_reservation = checkout_by_barcode(library_id, barcode)
+            else:
+                loan, pending_reservation = checkout(library_id, book_id)
+            publish_loan_events('loan.checked_out', {
+                loan.id: {'fulfilled_reservation_id': pending_reservation.id if pending_reservation else None},
+            })
             
             return JsonResponse({
                 'message': 'Book checked out successfully',
@@ -253,6 +322,8 @@ class LoanCreateView(View):
                 'due_date': loan.due_date,
                 'reservation_fulfilled': pending_reservation is not None
             }, status=201)
+        except CirculationError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
 
@@ -263,39 +334,17 @@ class LoanReturnView(View):
             data = json.loads(request.body)
             book_id = data.get('book_id')
             library_id = data.get('library_id')
-            
-            member = Member.objects.filter(library_id=library_id).first()
-            if not member:
-                return JsonResponse({'error': 'Member not found'}, status=404)
+            barcode = data.get('barcode')
+
+            # A scanned barcode identifies the exact copy and its loan.
+            if barcode:
+                loan, penalty, hold = return_by_barcode(barcode)
+            else:
+                loan, penalty, hold = return_loan(library_id, book_id)
+            publish_loan_events('loan.returned', {loan.id: {'reserved_for_reservation_id': hold.id if hold else None}})
 
-            # Find active loan for this book and member
-            loan = Loan.objects.filter(copy__book_id=book_id, member=member, status='ACTIVE').first()
-            if not loan:
-                return JsonResponse({'error': 'No active loan found for this book and member'}, status=404)
-            
-            copy = loan.copy
-            
-            loan.return_date = timezone.now()
-            loan.status = 'RETURNED'
-            loan.save()
-            
-            copy.status = 'AVAILABLE'
-            copy.save()
-            
             penalty_data = None
-            if loan.return_date > loan.due_date:
-                overdue_delta = loan.return_date - loan.due_date
-                overdue_seconds = overdue_delta.total_seconds()
-                import math
-                overdue_hours = math.ceil(overdue_seconds / 3600)
-                amount = overdue_hours * 10.00 # 10 rupees per hour
-                
-                penalty = Penalty.objects.create(
-                    member=loan.member,
-                    loan=loan,
-                    amount=amount,
-                    reason=f"Overdue by {overdue_hours} hours"
-                )
+            if penalty:
                 penalty_data = {
                     'penalty_id': penalty.id,
                     'amount': str(penalty.amount),
@@ -309,8 +358,38 @@ class LoanReturnView(View):
             if penalty_data:
                 response_data['penalty'] = penalty_data
                 response_data['message'] = 'Book returned with penalty'
+            if hold:
+                # The copy goes to the hold shelf rather than back into circulation.
+                response_data['hold'] = {'reservation_id': hold.id, 'expires_at': hold.expires_at}
                 
             return JsonResponse(response_data, status=200)
+        except CirculationError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LoanBatchView(View):
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            operations = data.get('operations')
+            if not isinstance(operations, list) or not operations:
+                return JsonResponse({'error': 'operations must be a non-empty list'}, status=400)
+
+            results = apply_loan_batch(operations, data.get('library_id'))
+            for op, event_type in (('checkout', 'loan.checked_out'), ('return', 'loan.returned')):
+                publish_loan_events(event_type, {
+                    result['loan_id']: {} for result in results if result['op'] == op and result['status'] == 'ok'
+                })
+
+            return JsonResponse({
+                'results': results,
+                'succeeded': sum(1 for result in results if result['status'] == 'ok'),
+                'failed': sum(1 for result in results if result['status'] == 'error'),
+            }, status=200)
+        except CirculationError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
 
@@ -330,28 +409,20 @@ class ReservationView(View):
             if not member:
                 return JsonResponse({'error': 'Member not found'}, status=404)
                 
-            # Check if member already has a pending reservation for this book
-            if Reservation.objects.filter(book=book, member=member, status='PENDING').exists():
+            # Check if member already has an open hold on this book
+            if Reservation.objects.filter(book=book, member=member, status__in=Reservation.OPEN_STATUSES).exists():
                 return JsonResponse({'error': 'Member already has a pending reservation for this book'}, status=400)
 
-            # Check availability
-            total_copies = BookCopy.objects.filter(book=book).count()
-            active_loans = Loan.objects.filter(copy__book=book, status='ACTIVE').count()
-            active_reservations = Reservation.objects.filter(book=book, status='PENDING').count()
-            
-            if active_loans + active_reservations >= total_copies:
-                 return JsonResponse({'error': 'No copies available for reservation'}, status=400)
-
-            expires_at = timezone.now() + timezone.timedelta(days=7)
-            reservation = Reservation.objects.create(
-                book=book,
-                member=member,
-                expires_at=expires_at
-            )
+            # The hold joins the book's queue, and is READY at once if a copy is on the shelf
+            with transaction.atomic():
+                reservation = holds.place(book.id, member.id)
+                publish_reservation_event('reservation.created', reservation.id)
             
             return JsonResponse({
                 'message': 'Book reserved successfully',
                 'reservation_id': reservation.id,
+                'status': reservation.status,
+                'queue_position': holds.position(reservation),
                 'expires_at': reservation.expires_at
             }, status=201)
         except Exception as e:
@@ -360,60 +431,157 @@ class ReservationView(View):
 
 
 
+def publish_loan_events(event_type, loans):
+    # loans maps loan id -> extra event fields. Rows match /api/loans/ so
+    # clients can upsert them by id. Skipped, query and all, when no stream
+    # can receive the events.
+    if not loans or not events.is_active():
+        return
+    for row in LOAN_ROWS.many(LOAN_ROWS.values(Loan.objects.filter(id__in=list(loans)))):
+        events.publish(event_type, {'loan': row, **loans[row['id']]})
+
+
+def publish_reservation_event(event_type, reservation_id):
+    if not events.is_active():
+        return
+    row = RESERVATION_ROWS.values(Reservation.objects.filter(id=reservation_id)).first()
+    if row:
+        events.publish(event_type, {'reservation': RESERVATION_ROWS.row(row)})
+
+
+async def circulation_events(request):
+    # Server-sent events for checkouts, returns and reservation changes.
+    # Each stream holds its connection open, so it is only served under ASGI
+    # where that doesn't pin a worker.
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'The event stream requires the ASGI deployment'}, status=503)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(events.stream(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class LoanListView(View):
     def get(self, request):
         member_id = request.GET.get('member_id')
         
-        loans_query = Loan.objects.all().select_related('copy__book')
+        loans_query = LOAN_ROWS.values(Loan.objects.order_by('id'))
         if member_id:
             loans_query = loans_query.filter(member_id=member_id)
-            
-        loans_data = []
-        for loan in loans_query:
-            loans_data.append({
-                'id': loan.id,
-                'copy__book__id': loan.copy.book.id,
-                'copy__book__title': loan.copy.book.title,
-                'copy__book__cover_image': loan.copy.book.cover_image.url if loan.copy.book.cover_image else None,
-                'due_date': loan.due_date,
-                'return_date': loan.return_date,
-                'status': loan.status
-            })
-            
-        return JsonResponse(loans_data, safe=False)
+
+        if wants_stream(request):
+            return streaming_json_response(loans_query, LOAN_ROWS.row)
+
+        return json_response(LOAN_ROWS.many(loans_query))
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LoanHistoryView(View):
+    # Pages through live and archived loans together, by id, so a member's
+    # whole history is reachable without Loan having to keep it.
+    def get(self, request):
+        member_id = request.GET.get('member_id')
+
+        live = Loan.objects.annotate(archived=Value(False, output_field=BooleanField()))
+        archived = ArchivedLoan.objects.annotate(
+            status=Value('RETURNED', output_field=CharField()),
+            archived=Value(True, output_field=BooleanField()),
+        )
+        if member_id:
+            live = live.filter(member_id=member_id)
+            archived = archived.filter(member_id=member_id)
+
+        try:
+            rows, next_cursor = paginate_keyset_merged(
+                [LOAN_HISTORY_ROWS.values(live), LOAN_HISTORY_ROWS.values(archived)],
+                ('id',), request, LOAN_HISTORY_ROWS.row,
+            )
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return json_response({'results': rows, 'next': next_cursor})
 
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ReservationListView(View):
     def get(self, request):
-        # First, update any expired reservations
-        now = timezone.now()
-        Reservation.objects.filter(
-            status='PENDING',
-            expires_at__lt=now
-        ).update(status='EXPIRED')
-        
         member_id = request.GET.get('member_id')
         
-        reservations_query = Reservation.objects.all().select_related('book', 'member')
+        reservations_query = RESERVATION_ROWS.values(Reservation.objects.order_by('id'))
         if member_id:
             reservations_query = reservations_query.filter(member_id=member_id)
-            
-        reservations_data = []
-        for res in reservations_query:
-            reservations_data.append({
-                'id': res.id,
-                'book__id': res.book.id,
-                'book__title': res.book.title,
-                'book__cover_image': res.book.cover_image.url if res.book.cover_image else None,
-                'member__library_id': res.member.library_id,
-                'reserved_at': res.reserved_at,
-                'expires_at': res.expires_at,
-                'status': res.status
-            })
-            
-        return JsonResponse(reservations_data, safe=False)
+
+        if wants_stream(request):
+            return streaming_json_response(reservations_query, RESERVATION_ROWS.row)
+
+        return json_response(RESERVATION_ROWS.many(reservations_query))
+
+
+def me(request):
+    # Everything the member dashboard needs in one response. The member row,
+    # user and profile come from one joined query and each list from one
+    # more, so the query count does not depend on how much the member has.
+    # The member is the signed-in (session or token) user's, or, for clients
+    # on another origin that carry neither, the one named by member_id like
+    # /api/loans/?member_id= does.
+    if request.user.is_authenticated:
+        members = Member.objects.filter(user_id=request.user.id)
+    elif request.GET.get('member_id', '').isdigit():
+        members = Member.objects.filter(id=request.GET['member_id'])
+    else:
+        return JsonResponse({'error': 'Authentication or member_id required'}, status=401)
+
+    member = (
+        members
+        .values_list(
+            'id', 'library_id', 'max_active_loans', 'active_loan_count', 'outstanding_balance',
+            'user__username', 'user__email', 'user__profile__user_type',
+        )
+        .first()
+    )
+    if member is None:
+        return JsonResponse({'error': 'Member profile not found'}, status=404)
+    member_id, library_id, max_active_loans, active_loan_count, balance, username, email, user_type = member
+
+    # Rows use the same keys as /api/loans/ and /api/reservations/list/.
+    loans = MEMBER_LOAN_ROWS.many(MEMBER_LOAN_ROWS.values(
+        Loan.objects.filter(member_id=member_id, status__in=Loan.OPEN_STATUSES).order_by('due_date', 'id')
+    ))
+    reservations = MEMBER_RESERVATION_ROWS.many(MEMBER_RESERVATION_ROWS.values(
+        Reservation.objects.filter(member_id=member_id, status__in=Reservation.OPEN_STATUSES)
+        .annotate(queue_position=holds.queue_position()).order_by('reserved_at', 'id')
+    ))
+    penalties = PENALTY_ROWS.many(PENALTY_ROWS.values(
+        Penalty.objects.filter(member_id=member_id, resolved=False).order_by('created_at', 'id')
+    ))
+    # The most recent returns; /api/loans/history/ pages through the rest.
+    history = MEMBER_LOAN_ROWS.many(MEMBER_LOAN_ROWS.values(
+        Loan.objects.filter(member_id=member_id, status='RETURNED').order_by('-return_date', '-id')[:ME_HISTORY_LIMIT]
+    ))
+
+    return json_response({
+        'user': {
+            'id': request.user.id,
+            'username': username,
+            'email': email,
+            'user_type': user_type or 'MEMBER',
+        },
+        'member': {
+            'id': member_id,
+            'user__username': username,
+            'library_id': library_id,
+            'max_active_loans': max_active_loans,
+            'active_loan_count': active_loan_count,
+            'outstanding_balance': balance,
+        },
+        'loans': loans,
+        'history': history,
+        'reservations': reservations,
+        'penalties': penalties,
+        # Includes fines still accruing on loans that are out past their due date.
+        'outstanding_balance': str(balance),
+    })
 
 
 @csrf_exempt
@@ -422,13 +590,19 @@ def cancel_reservation(request, reservation_id):
         try:
             reservation = Reservation.objects.get(id=reservation_id)
             
-            if reservation.status != 'PENDING':
+            if reservation.status not in Reservation.OPEN_STATUSES:
                 return JsonResponse({
                     'error': f'Cannot cancel reservation with status {reservation.status}'
                 }, status=400)
             
-            reservation.status = 'CANCELLED'
-            reservation.save()
+            # A READY hold's copy passes to the next hold in the queue.
+            with transaction.atomic():
+                if not holds.close(reservation, 'CANCELLED'):
+                    reservation.refresh_from_db()
+                    return JsonResponse({
+                        'error': f'Cannot cancel reservation with status {reservation.status}'
+                    }, status=400)
+                publish_reservation_event('reservation.cancelled', reservation.id)
             
             return JsonResponse({
                 'message': 'Reservation cancelled successfully',
@@ -6,6 +6,9 @@ import LibrarianPanel from './components/LibrarianPanel';
 
 // Configure Axios
 axios.defaults.baseURL = import.meta.env.VITE_API_URL || '';
+if (localStorage.getItem('library_token')) {
+  axios.defaults.headers.common.Authorization = `Bearer ${localStorage.getItem('library_token')}`;
+}
 
 function App() {
   const [user, setUser] = useState(JSON.parse(localStorage.getItem('library_user')) || null);
@@ -37,10 +40,13 @@ function App() {
   };
 
   const logout = () => {
+    axios.post('/api/signout/').catch(() => {});
+    delete axios.defaults.headers.common.Authorization;
     setUser(null);
     setMember(null);
     localStorage.removeItem('library_user');
     localStorage.removeItem('library_member');
+    localStorage.removeItem('library_token');
     showToast('Logged out successfully');
   };
 
@@ -51,21 +57,16 @@ function App() {
 
       // Only fetch member data if user is a MEMBER
       if (user && user.user_type === 'MEMBER') {
-        const membersRes = await axios.get('/api/members/');
-        const myMember = membersRes.data.find(m => m.user__username === user.username);
+        // The API is usually on another origin, so no session cookie is sent;
+        // member_id identifies the member unless a token does.
+        const memberId = user.member_id || member?.id;
+        const meRes = await axios.get('/api/me/', { params: memberId ? { member_id: memberId } : {} });
+        const myMember = meRes.data.member;
 
-        if (myMember) {
-          setMember(myMember);
-          localStorage.setItem('library_member', JSON.stringify(myMember));
-          
-          const [loansRes, reservationsRes] = await Promise.all([
-            axios.get(`/api/loans/?member_id=${myMember.id}`),
-            axios.get(`/api/reservations/list/?member_id=${myMember.id}`)
-          ]);
-          
-          setLoans(loansRes.data);
-          setReservations(reservationsRes.data);
-        }
+        setMember(myMember);
+        localStorage.setItem('library_member', JSON.stringify(myMember));
+        setLoans([...meRes.data.loans, ...meRes.data.history]);
+        setReservations(meRes.data.reservations);
       }
     } catch (err) {
       console.error('Failed to fetch data', err);
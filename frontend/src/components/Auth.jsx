@@ -12,16 +12,25 @@ function Auth({ onLogin, showToast }) {
     try {
       if (mode === 'login') {
         const res = await axios.post('/api/signin/', data);
+        // Servers running stateless auth return a token instead of a session
+        // Kept in localStorage so reloads and other tabs stay signed in; scripts on
+        // the page can read it too, which the token's short lifetime limits.
+        if (res.data.token) {
+          localStorage.setItem('library_token', res.data.token);
+          axios.defaults.headers.common.Authorization = `Bearer ${res.data.token}`;
+        }
         // Pass complete user object including user_type for routing
         onLogin({ 
           id: res.data.user_id, 
           username: res.data.username,
-          user_type: res.data.user_type 
+          user_type: res.data.user_type,
+          member_id: res.data.member_id
         });
         localStorage.setItem('library_user', JSON.stringify({ 
           id: res.data.user_id, 
           username: res.data.username,
-          user_type: res.data.user_type 
+          user_type: res.data.user_type,
+          member_id: res.data.member_id
         }));
         showToast('Login successful');
       } else {
@@ -47,11 +47,11 @@ function Dashboard({ user, member, books, loans, reservations, refreshData, show
         <div className="stats-grid">
           <div className="stat-card">
             <h3>Active Loans</h3>
-            <p>{loans.filter(l => l.status === 'ACTIVE').length}</p>
+            <p>{loans.filter(l => l.status === 'ACTIVE' || l.status === 'OVERDUE').length}</p>
           </div>
           <div className="stat-card">
             <h3>Reservations</h3>
-            <p>{reservations.filter(r => r.status === 'PENDING').length}</p>
+            <p>{reservations.filter(r => r.status === 'PENDING' || r.status === 'READY').length}</p>
           </div>
           <div className="stat-card">
             <h3>Library ID</h3>
@@ -81,7 +81,7 @@ function Dashboard({ user, member, books, loans, reservations, refreshData, show
               <div key={book.id} className="book-card">
                 <div className="book-image">
                   {book.cover_image ? (
-                    <img src={book.cover_image} alt={book.title} />
+                    <img src={book.cover_urls?.medium || book.cover_image} alt={book.title} loading="lazy" />
                   ) : (
                     <div className="placeholder-cover">
                       <span style={{ fontSize: '3rem' }}>📚</span>
@@ -117,7 +117,7 @@ function Dashboard({ user, member, books, loans, reservations, refreshData, show
                 <div key={loan.id} className="status-card">
                   <div className="card-image">
                     {loan.copy__book__cover_image ? (
-                      <img src={loan.copy__book__cover_image} alt={loan.copy__book__title} />
+                      <img src={loan.copy__book__cover_urls?.small || loan.copy__book__cover_image} alt={loan.copy__book__title} />
                     ) : (
                       <div className="placeholder-image">📚</div>
                     )}
@@ -145,7 +145,7 @@ function Dashboard({ user, member, books, loans, reservations, refreshData, show
                 <div key={res.id} className="status-card">
                   <div className="card-image">
                     {res.book__cover_image ? (
-                      <img src={res.book__cover_image} alt={res.book__title} />
+                      <img src={res.book__cover_urls?.small || res.book__cover_image} alt={res.book__title} />
                     ) : (
                       <div className="placeholder-image">📚</div>
                     )}
@@ -154,7 +154,13 @@ function Dashboard({ user, member, books, loans, reservations, refreshData, show
                   <div className="card-details">
                     <h4>{res.book__title}</h4>
                     <p className="card-date">Expires: {formatDate(res.expires_at)}</p>
-                    {res.status === 'PENDING' && (
+                    {res.status === 'PENDING' && res.queue_position && (
+                      <p className="card-date">Position in queue: {res.queue_position}</p>
+                    )}
+                    {res.status === 'READY' && (
+                      <p className="card-date">Ready for pickup ({res.copy__barcode})</p>
+                    )}
+                    {(res.status === 'PENDING' || res.status === 'READY') && (
                       <button 
                         className="btn cancel-btn" 
                         onClick={() => handleCancelReservation(res.id)}
@@ -178,7 +184,7 @@ function Dashboard({ user, member, books, loans, reservations, refreshData, show
             {selectedBook.cover_image && (
               <div style={{ textAlign: 'center', marginBottom: '1.5rem' }}>
                 <img 
-                  src={selectedBook.cover_image} 
+                  src={selectedBook.cover_urls?.large || selectedBook.cover_image} 
                   alt={selectedBook.title} 
                   style={{ maxWidth: '200px', maxHeight: '300px', borderRadius: '8px', boxShadow: '0 4px 6px rgba(0,0,0,0.1)' }} 
                 />
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 
 function LibrarianPanel({ showToast, refreshBooks }) {
@@ -8,21 +8,74 @@ function LibrarianPanel({ showToast, refreshBooks }) {
 
   /* Filter State */
   const [activeFilter, setActiveFilter] = useState('ALL');
+  const [live, setLive] = useState(false);
+  // Lists fetched since the stream last connected; the stream keeps them current.
+  const loaded = useRef({ loans: false, reservations: false });
 
-  // Fetch all reservations and loans when component mounts or tab changes
+  // Fetch reservations and loans when their tab opens, unless the event
+  // stream is already keeping a fetched list up to date
   useEffect(() => {
     setActiveFilter('ALL'); // Reset filter when tab changes
-    if (activeTab === 'reservations') {
+    if (activeTab === 'reservations' && !(live && loaded.current.reservations)) {
       fetchReservations();
-    } else if (activeTab === 'loans') {
+    } else if (activeTab === 'loans' && !(live && loaded.current.loans)) {
       fetchLoans();
     }
   }, [activeTab]);
 
+  // Apply circulation events from other desks as they happen. The stream is
+  // only served under ASGI; without it the lists are refetched as before.
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') return;
+    // The stream needs no cookies, so it connects cross-origin without CORS credentials.
+    const source = new EventSource(`${axios.defaults.baseURL}/api/events/`);
+    const upsert = (rows, row) => [row, ...rows.filter(r => r.id !== row.id)];
+
+    const onLoan = (e) => {
+      const data = JSON.parse(e.data);
+      setLoans(prev => upsert(prev, data.loan).sort((a, b) => b.id - a.id));
+      if (data.fulfilled_reservation_id) {
+        setReservations(prev => prev.map(r => r.id === data.fulfilled_reservation_id ? { ...r, status: 'FULFILLED' } : r));
+      }
+    };
+    const onReservation = (e) => {
+      const { reservation } = JSON.parse(e.data);
+      setReservations(prev => upsert(prev, reservation).sort((a, b) => new Date(b.reserved_at) - new Date(a.reserved_at)));
+    };
+    const onReady = (e) => {
+      // The rows carry the copy set aside and the pickup deadline.
+      const ready = new Map(JSON.parse(e.data).reservations.map(r => [r.id, r]));
+      setReservations(prev => prev.map(r => ready.get(r.id) || r));
+    };
+    const onExpired = (e) => {
+      const ids = new Set(JSON.parse(e.data).reservation_ids);
+      setReservations(prev => prev.map(r => ids.has(r.id) ? { ...r, status: 'EXPIRED' } : r));
+    };
+
+    source.onopen = () => setLive(true);
+    source.onerror = () => {
+      setLive(false);
+      loaded.current = { loans: false, reservations: false };
+    };
+    source.addEventListener('loan.checked_out', onLoan);
+    source.addEventListener('loan.returned', onLoan);
+    source.addEventListener('reservation.created', onReservation);
+    source.addEventListener('reservation.ready', onReady);
+    source.addEventListener('reservation.cancelled', onReservation);
+    source.addEventListener('reservation.expired', onExpired);
+    // Sent when missed events can't be replayed after a reconnect.
+    source.addEventListener('reset', () => {
+      fetchLoans();
+      fetchReservations();
+    });
+    return () => source.close();
+  }, []);
+
   const fetchReservations = async () => {
     try {
       const res = await axios.get('/api/reservations/list/');
       setReservations(res.data.sort((a, b) => new Date(b.reserved_at) - new Date(a.reserved_at)));
+      loaded.current.reservations = true;
     } catch (err) {
       showToast('Failed to fetch reservations', 'error');
     }
@@ -32,6 +85,7 @@ function LibrarianPanel({ showToast, refreshBooks }) {
     try {
       const res = await axios.get('/api/loans/');
       setLoans(res.data.sort((a, b) => b.id - a.id));
+      loaded.current.loans = true;
     } catch (err) {
       showToast('Failed to fetch loans', 'error');
     }
@@ -104,7 +158,7 @@ function LibrarianPanel({ showToast, refreshBooks }) {
     try {
       await axios.post(`/api/reservations/${reservationId}/cancel/`);
       showToast('Reservation cancelled successfully');
-      fetchReservations(); // Refresh the list
+      if (!live) fetchReservations(); // The event stream delivers the change otherwise
     } catch (err) {
       showToast(err.response?.data?.error || 'Cancellation failed', 'error');
     }
@@ -222,7 +276,7 @@ function LibrarianPanel({ showToast, refreshBooks }) {
             <div style={{ marginBottom: '1.5rem' }}>
                 <h3 style={{ marginBottom: '1rem' }}>All Reservations</h3>
                 <div className="filter-chips" style={{ display: 'flex', gap: '0.5rem', flexWrap: 'wrap' }}>
-                    {['ALL', 'PENDING', 'FULFILLED', 'EXPIRED', 'CANCELLED'].map(status => (
+                    {['ALL', 'PENDING', 'READY', 'FULFILLED', 'EXPIRED', 'CANCELLED'].map(status => (
                         <button
                             key={status}
                             onClick={() => setActiveFilter(status)}
@@ -269,7 +323,7 @@ function LibrarianPanel({ showToast, refreshBooks }) {
                         <td style={{ padding: '0.75rem' }}>{formatDate(res.reserved_at)}</td>
                         <td style={{ padding: '0.75rem' }}>{formatDate(res.expires_at)}</td>
                         <td style={{ padding: '0.75rem' }}>
-                          {res.status === 'PENDING' && (
+                          {(res.status === 'PENDING' || res.status === 'READY') && (
                             <button 
                               className="btn" 
                               style={{ padding: '0.5rem 1rem', fontSize: '0.8rem', background: 'var(--danger)' }}
@@ -3,14 +3,37 @@ ASGI config for library_checkout project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+ASGI deployment profile (see README): install requirements-asgi.txt, set
+ASYNC_READ_VIEWS=True and DB_CONN_MAX_AGE=0, and run
+
+    gunicorn library_checkout.asgi:application -k uvicorn.workers.UvicornWorker
+
+Static files are served by WhiteNoise next to Django rather than from its
+sync-only middleware, so API requests stay on the event loop.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
 
+from asgiref.wsgi import WsgiToAsgi
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from whitenoise import WhiteNoise
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_checkout.settings')
+os.environ.setdefault('SERVE_STATIC_IN_MIDDLEWARE', 'False')
+
+django_application = get_asgi_application()
+static_application = WsgiToAsgi(WhiteNoise(
+    get_wsgi_application(), root=settings.STATIC_ROOT, prefix=settings.STATIC_URL, autorefresh=settings.DEBUG,
+))
+
 
-application = get_asgi_application()
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(settings.STATIC_URL):
+        await static_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
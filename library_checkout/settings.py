@@ -49,17 +49,28 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'circulation.metrics.RequestMetricsMiddleware',  # Server-Timing header and /api/metrics/
+    'circulation.db_routing.ReplicaRoutingMiddleware',  # Only active with DATABASE_REPLICA_URLS
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'circulation.auth_tokens.TokenAuthenticationMiddleware',  # Only active with AUTH_TOKENS_ENABLED
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# WhiteNoise serves static files from the middleware stack under WSGI. Its
+# middleware is sync-only, so under ASGI it would push every request through
+# a thread; library_checkout/asgi.py turns this off and serves static files
+# beside Django instead.
+SERVE_STATIC_IN_MIDDLEWARE = config('SERVE_STATIC_IN_MIDDLEWARE', default=True, cast=bool)
+if SERVE_STATIC_IN_MIDDLEWARE:
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+                      'whitenoise.middleware.WhiteNoiseMiddleware')
+
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS',
     default='http://localhost:5173,http://127.0.0.1:5173',
@@ -95,7 +106,9 @@ if config('DATABASE_URL', default=None):
     DATABASES = {
         'default': dj_database_url.config(
             default=config('DATABASE_URL'),
-            conn_max_age=600,
+            # Set DB_CONN_MAX_AGE=0 under ASGI, where each request runs its
+            # queries on a fresh thread and persistent connections are never reused.
+            conn_max_age=config('DB_CONN_MAX_AGE', default=600, cast=int),
             conn_health_checks=True,
         )
     }
@@ -107,6 +120,87 @@ else:
         }
     }
 
+# SQLite's in-memory test database fails concurrent writers instead of making
+# them wait, so the tests that run checkouts from several threads get a file.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('TEST', {}).setdefault('NAME', str(BASE_DIR / 'test_db.sqlite3'))
+
+# Read replicas: comma-separated database URLs (two SQLite files work for
+# trying it locally). Safe-method requests read from one of them; writes, and
+# a client's requests for REPLICA_PIN_SECONDS after it sent a write, use the
+# primary. See circulation.db_routing.
+DATABASE_REPLICAS = []
+for _index, _url in enumerate(config('DATABASE_REPLICA_URLS', default='', cast=Csv())):
+    DATABASES[f'replica{_index + 1}'] = dj_database_url.parse(
+        _url,
+        conn_max_age=config('DB_CONN_MAX_AGE', default=600, cast=int),
+        conn_health_checks=True,
+        # Test databases (and throwaway benchmark databases) read from the primary.
+        test_options={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(f'replica{_index + 1}')
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['circulation.db_routing.ReplicaRouter']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
+
+# Caching
+# The default local-memory cache is per process; point CACHE_BACKEND at
+# django.core.cache.backends.filebased.FileBasedCache (with CACHE_LOCATION set
+# to a directory) to share the catalog cache between gunicorn workers. Its
+# invalidation goes through the database, so either backend stays current.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='library-checkout'),
+    }
+}
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
+
+# API pagination
+API_PAGE_SIZE = config('API_PAGE_SIZE', default=50, cast=int)
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=500, cast=int)
+API_STREAM_CHUNK_SIZE = config('API_STREAM_CHUNK_SIZE', default=2000, cast=int)
+# JSON encoder for list payloads: orjson when installed, otherwise the stdlib
+# encoder (set to "json" to force it).
+JSON_BACKEND = config('JSON_BACKEND', default='orjson')
+# Serve the book, member, loan and reservation lists from async views. Only
+# worth enabling under an ASGI server (see library_checkout/asgi.py).
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+# Server-sent circulation events (/api/events/, ASGI only). The in-process
+# backend only reaches streams served by the same process; set
+# circulation.events.DatabaseEventLog to share events between processes
+# (several web processes, or expiries from the sweeper worker), polled every
+# EVENTS_POLL_SECONDS.
+EVENTS_BACKEND = config('EVENTS_BACKEND', default='circulation.events.InProcessBroadcast')
+EVENTS_BUFFER_SIZE = config('EVENTS_BUFFER_SIZE', default=1000, cast=int)
+EVENTS_POLL_SECONDS = config('EVENTS_POLL_SECONDS', default=1, cast=float)
+EVENTS_HEARTBEAT_SECONDS = config('EVENTS_HEARTBEAT_SECONDS', default=15, cast=int)
+EVENTS_MAX_STREAM_SECONDS = config('EVENTS_MAX_STREAM_SECONDS', default=300, cast=int)
+# Per-request query/timing instrumentation. Set METRICS_TOKEN to require
+# "Authorization: Bearer <token>" on /api/metrics/.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Stateless API auth: signin returns a signed token (sent back as
+# "Authorization: Bearer <token>") instead of creating a session. Revoked
+# tokens are listed in the cache, so use a cache shared by all workers.
+AUTH_TOKENS_ENABLED = config('AUTH_TOKENS_ENABLED', default=False, cast=bool)
+AUTH_TOKEN_LIFETIME = config('AUTH_TOKEN_LIFETIME', default=3600, cast=int)
+LOAN_BATCH_MAX_OPERATIONS = config('LOAN_BATCH_MAX_OPERATIONS', default=100, cast=int)
+# Holds wait in their book's queue for HOLD_PERIOD_DAYS; a copy set aside for
+# a hold stays on the hold shelf for HOLD_PICKUP_DAYS.
+HOLD_PERIOD_DAYS = config('HOLD_PERIOD_DAYS', default=7, cast=int)
+HOLD_PICKUP_DAYS = config('HOLD_PICKUP_DAYS', default=3, cast=int)
+# Returned loans move to the loan archive (manage.py archive_loans) this long
+# after they come back; /api/loans/history/ reads both.
+LOAN_ARCHIVE_AFTER_DAYS = config('LOAN_ARCHIVE_AFTER_DAYS', default=365, cast=int)
+
+
+# Circulation sweeper (manage.py sweep_circulation)
+SWEEPER_INTERVAL = config('SWEEPER_INTERVAL', default=60, cast=int)
+SWEEPER_BATCH_SIZE = config('SWEEPER_BATCH_SIZE', default=500, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -171,5 +265,10 @@ CLOUDINARY_STORAGE = {
 
 # Media files configuration
 MEDIA_URL = '/media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Where book covers and their thumbnails are stored: 'cloudinary', or 'local'
+# to write them under MEDIA_ROOT (the default when Cloudinary isn't configured).
+COVER_STORAGE = config('COVER_STORAGE', default='cloudinary' if CLOUDINARY_STORAGE['CLOUD_NAME'] else 'local')
+